@@ -1,8 +1,11 @@
 import logging
+import sys
 import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # for cftools
 
 import cflib.crtp       # Used for for scanning for Crazyflies instances.
-from cflib.crazyflie import Crazyflie # Used to easily connect/send/receive data from a Crazyflie.
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie # Wrapper around the “normal” Crazyflie class. It handles the asynchronous nature of the Crazyflie API and turns it into blocking function.
 from cflib.utils import uri_helper
 
@@ -11,6 +14,9 @@ from cflib.crazyflie.log import LogConfig
 from cflib.crazyflie.syncLogger import SyncLogger
 #The SyncLogger class provides synchronous access to log data from the Crazyflie.
 
+from cftools.params import write_params # confirmed parameter writes
+from cftools.toccache import make_crazyflie # Crazyflie sharing one TOC cache with every script
+
 # URI to the Crazyflie to connect to
 uri = uri_helper.uri_from_env(default='radio://0/80/2M/E7E7E7E7E7')
 
@@ -26,16 +32,14 @@ def simple_param_async(scf, groupstr, namestr):
     full_name = groupstr+ "." +namestr
     cf.param.add_update_callback(group=groupstr, name=namestr,
                                            cb=param_stab_est_callback) # Read params
-    time.sleep(1) # give script a bit more time to wait for CF response & not lose connection immediately
-    cf.param.set_value(full_name,2) # Set params
-    time.sleep(1)
-    cf.param.set_value(full_name,1) # Reset to original
-    time.sleep(1)
+    # Each write returns once the CF has echoed the new value (no sleeping and hoping)
+    print(write_params(cf, {full_name: 2}).summary()) # Set params
+    print(write_params(cf, {full_name: 1}).summary()) # Reset to original
 """
 ^ What it can’t do is to set a Read Only (RO) parameter, only Read Write (RW) parameters, which can be checked by the parameter TOC in the CFclient. 
-You can check this by changing the parameter name to group 'CPU' and name flash'. Then you will get the following error:
+You can check this by changing the parameter name to group 'CPU' and name flash'. Then the write report says:
 
-AttributeError: cpu.flash is read-only!
+  cpu.flash                        = 2        FAILED (read-only)
 """
 
 def log_stab_callback(timestamp, data, logconf):
@@ -86,7 +90,7 @@ if __name__ == '__main__':
     group = "stabilizer"
     name = "estimator"
 
-    with SyncCrazyflie(uri, cf=Crazyflie(rw_cache='./cache')) as scf:
+    with SyncCrazyflie(uri, cf=make_crazyflie()) as scf:
 
         #simple_connect()
         #simple_log(scf, lg_stab)
@@ -1,15 +1,19 @@
 import logging
 import sys
 import time
+from pathlib import Path
 from threading import Event
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # for cftools
+
 import cflib.crtp
-from cflib.crazyflie import Crazyflie
 from cflib.crazyflie.log import LogConfig
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.positioning.motion_commander import MotionCommander
 from cflib.utils import uri_helper
 
+from cftools.toccache import make_crazyflie
+
 
 URI = uri_helper.uri_from_env(default='radio://0/80/2M/E7E7E7E7E7')
 
@@ -83,7 +87,7 @@ def param_deck_flow(_, value_str):
 if __name__ == '__main__':
     cflib.crtp.init_drivers()
 
-    with SyncCrazyflie(URI, cf=Crazyflie(rw_cache='./cache')) as scf:
+    with SyncCrazyflie(URI, cf=make_crazyflie()) as scf:
 
         scf.cf.param.add_update_callback(group="deck", name="bcFlow2",
                                 cb=param_deck_flow)
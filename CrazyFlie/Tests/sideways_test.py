@@ -1,15 +1,38 @@
 """
 Crazyflie trajectory control for pendulum ball catching.
-Uses MotionCommander for smooth relative movements.
+
+Two execution modes:
+- 'waypoints' : MotionCommander relative moves between the knots kept by an
+                error-bounded simplification (--tol_mm); each move blocks
+                for distance / velocity, so timing is lost
+- 'stream'    : timed absolute position setpoints sampled from the
+                trajectory on the optimizer's time base, paced by a
+                DeadlineScheduler
+
+Both report how far the execution time drifts from the nominal duration.
+
+    python sideways_test.py --mode stream --length 0.35
 """
+import argparse
 import logging
+import sys
 import time
+from pathlib import Path
 #import pandas 
 
 import cflib.crtp
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.positioning.motion_commander import MotionCommander
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # for cftools
+from cftools.estimator import reset_estimator
+from cftools.matimport import N_OPT, T_OPT, load_trajectory, to_sequence_mm
+from cftools.params import write_params
+from cftools.scheduler import OVERRUN_POLICIES, DeadlineScheduler
+from cftools.simplify import simplify
+from cftools.toccache import make_crazyflie
+from cftools.trajectory import Trajectory
+
 URI = 'radio://0/80/2M'
 
 # Only output errors from the logging framework
@@ -125,64 +148,148 @@ sequence_mm = [
     (0.0, -0.000424, 1000.000832, 0),
 ]
 
-# Subsample every 5th point and convert to meters
-def subsample_trajectory(sequence, step=5):
-    subsampled = sequence[::step]
-    # Convert from mm to meters
-    return [(x/1000.0, y/1000.0, z/1000.0, yaw) for x, y, z, yaw in subsampled]
+def sequence_to_trajectory(sequence_mm, dt=T_OPT / N_OPT):
+    # Optimizer knots are dt apart (4 s / 100 intervals): the proper time base
+    x, y, z, yaw = zip(*sequence_mm)
+    t = [k * dt for k in range(len(sequence_mm))]
+    return Trajectory(t, [v / 1000.0 for v in x], [v / 1000.0 for v in y],
+                      [v / 1000.0 for v in z], yaw)
+
+
+def fly_waypoints(scf, sequence):
+    """Blocking MotionCommander moves between the waypoints; returns the trajectory time (s)."""
+    with MotionCommander(scf) as mc:
+        print('Taking off!')
+
+        # Start at first waypoint position (should be around 1.0m)
+        first_z = sequence[0][2]
+        print(f'Moving to starting height: {first_z}m')
+        mc.up(first_z - 0.3)  # Assuming default takeoff is ~0.3m
+        time.sleep(1)
+
+        # Execute trajectory
+        prev_x, prev_y, prev_z, prev_yaw = sequence[0]
+        t_start = time.monotonic()
+
+        for i, (x, y, z, yaw) in enumerate(sequence[1:], 1):
+            # Calculate relative movements
+            delta_x = x - prev_x
+            delta_y = y - prev_y
+            delta_z = z - prev_z
+
+            # Execute movements
+            if abs(delta_y) > 0.001:  # More than 1mm movement
+                if delta_y > 0:
+                    print(f'Step {i}: Moving right {abs(delta_y):.3f}m')
+                    mc.right(abs(delta_y))
+                else:
+                    print(f'Step {i}: Moving left {abs(delta_y):.3f}m')
+                    mc.left(abs(delta_y))
+
+            if abs(delta_z) > 0.001:  # More than 1mm movement
+                if delta_z > 0:
+                    mc.up(abs(delta_z))
+                else:
+                    mc.down(abs(delta_z))
+
+            # Small pause between movements
+            time.sleep(0.1)
+
+            # Update previous position
+            prev_x, prev_y, prev_z, prev_yaw = x, y, z, yaw
+
+        elapsed = time.monotonic() - t_start
+        print('Trajectory complete! Landing...')
+    return elapsed
+
+
+def fly_streamed(scf, traj, rate_hz, hold_s=1.0, overrun='skip'):
+    """
+    Climb to the first knot, then send one absolute position setpoint per
+    scheduler tick. Each setpoint is sampled at the tick's scheduled time
+    (not its wake-up time), so the trajectory keeps its own time base even
+    when a tick is late. Returns (trajectory time in s, TickStats).
+    """
+    cf = scf.cf
+    write_params(cf, {'commander.enHighLevel': 0, 'flightmode.posSet': 1}).check()
+    print(reset_estimator(cf).summary())       # waits for the Kalman filter to converge
+
+    p0, p1 = traj[0], traj[-1]
+    n_ramp = max(1, int(2.0 * rate_hz))
+    pre = DeadlineScheduler(rate_hz, overrun=overrun, name='takeoff')
+    pre.start()
+    print('Taking off!')
+    for k in pre.ticks(n_ramp + int(hold_s * rate_hz)):
+        z = p0['z'] * min(1.0, (k + 1) / n_ramp)
+        cf.commander.send_position_setpoint(p0['x'], p0['y'], z, p0['yaw'])
+
+    print(f'Streaming {len(traj)} knots over {traj.duration:.2f} s at {rate_hz:g} Hz')
+    traj.reset()
+    sched = DeadlineScheduler(rate_hz, overrun=overrun, name='trajectory')
+    t0 = sched.start()
+    t = 0.0
+    while True:
+        s = traj.sample(t)
+        cf.commander.send_position_setpoint(s['x'], s['y'], s['z'], s['yaw'])
+        if t >= traj.t_end:
+            break
+        t = sched.wait()
+    elapsed = time.monotonic() - t0
+
+    print('Trajectory complete! Landing...')
+    land = DeadlineScheduler(rate_hz, overrun=overrun, name='land')
+    land.start()
+    for k in land.ticks(n_ramp):
+        z = p1['z'] * (1.0 - (k + 1) / n_ramp)
+        cf.commander.send_position_setpoint(p1['x'], p1['y'], z, p1['yaw'])
+    cf.commander.send_stop_setpoint()
+    cf.commander.send_notify_setpoint_stop()
+    return elapsed, sched.stats
 
 
 if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--uri', default=URI)
+    ap.add_argument('--mode', choices=['waypoints', 'stream'], default='waypoints')
+    ap.add_argument('--length', type=float, default=None,
+                    help='pendulum length (m): fly the MATLAB optimal trajectory for it')
+    ap.add_argument('--angle', type=float, default=None,
+                    help='target pendulum angle (deg) instead of / with --length')
+    ap.add_argument('--tol_mm', type=float, default=5.0,
+                    help='waypoint mode: max position deviation of the simplified path (mm)')
+    ap.add_argument('--rate_hz', type=float, default=N_OPT / T_OPT,
+                    help='stream mode setpoint rate (default: the optimizer rate, 25 Hz)')
+    ap.add_argument('--overrun', choices=OVERRUN_POLICIES, default='skip',
+                    help='what stream mode does with missed setpoint deadlines')
+    args = ap.parse_args()
+
     # Initialize the low-level drivers
     cflib.crtp.init_drivers(enable_debug_driver=False)
 
-    # Subsample the trajectory
-    sequence = subsample_trajectory(sequence_mm, step=5)
-    
-    print(f'Trajectory has {len(sequence)} waypoints')
+    # Optimizer knots (25 Hz) from the compiled .mat import, else the pasted 0.35 m run
+    if args.length is not None or args.angle is not None:
+        sequence_mm = to_sequence_mm(load_trajectory(length=args.length, angle_deg=args.angle,
+                                                     rate_hz=N_OPT / T_OPT))
+    traj = sequence_to_trajectory(sequence_mm)
 
-    with SyncCrazyflie(URI) as scf:
+    if args.mode == 'waypoints':
+        # Fewer knots where the path is straight, more near the catch
+        coarse, simp_stats = simplify(traj, pos_tol=args.tol_mm / 1000.0)
+        sequence = list(zip(coarse.x.tolist(), coarse.y.tolist(), coarse.z.tolist(), coarse.yaw.tolist()))
+        print(simp_stats.summary())
+        print(f'Trajectory has {len(sequence)} waypoints')
+
+    with SyncCrazyflie(args.uri, cf=make_crazyflie()) as scf:
         # Arm the Crazyflie
         scf.cf.platform.send_arming_request(True)
         time.sleep(1.0)
 
-        with MotionCommander(scf) as mc:
-            print('Taking off!')
-            
-            # Start at first waypoint position (should be around 1.0m)
-            first_z = sequence[0][2]
-            print(f'Moving to starting height: {first_z}m')
-            mc.up(first_z - 0.3)  # Assuming default takeoff is ~0.3m
-            time.sleep(1)
-
-            # Execute trajectory
-            prev_x, prev_y, prev_z, prev_yaw = sequence[0]
-            
-            for i, (x, y, z, yaw) in enumerate(sequence[1:], 1):
-                # Calculate relative movements
-                delta_x = x - prev_x
-                delta_y = y - prev_y
-                delta_z = z - prev_z
-                
-                # Execute movements
-                if abs(delta_y) > 0.001:  # More than 1mm movement
-                    if delta_y > 0:
-                        print(f'Step {i}: Moving right {abs(delta_y):.3f}m')
-                        mc.right(abs(delta_y))
-                    else:
-                        print(f'Step {i}: Moving left {abs(delta_y):.3f}m')
-                        mc.left(abs(delta_y))
-                
-                if abs(delta_z) > 0.001:  # More than 1mm movement
-                    if delta_z > 0:
-                        mc.up(abs(delta_z))
-                    else:
-                        mc.down(abs(delta_z))
-                
-                # Small pause between movements
-                time.sleep(0.1)
-                
-                # Update previous position
-                prev_x, prev_y, prev_z, prev_yaw = x, y, z, yaw
-
-            print('Trajectory complete! Landing...')
\ No newline at end of file
+        if args.mode == 'stream':
+            elapsed, stats = fly_streamed(scf, traj, args.rate_hz, overrun=args.overrun)
+            print(stats.summary())
+        else:
+            elapsed = fly_waypoints(scf, sequence)
+
+    drift = elapsed - traj.duration
+    print(f'Execution took {elapsed:.3f} s for a nominal {traj.duration:.3f} s '
+          f'(drift {drift:+.3f} s, {100.0 * drift / traj.duration:+.1f}%)')
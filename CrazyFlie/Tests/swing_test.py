@@ -3,12 +3,17 @@ import argparse, csv, sys, time
 from pathlib import Path
 from threading import Event, Lock
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # for cftools
+
 import cflib.crtp
-from cflib.crazyflie import Crazyflie
 from cflib.crazyflie.log import LogConfig
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.positioning.motion_commander import MotionCommander
 
+from cftools.binlog import BINLOG_SUFFIX, BinLogWriter
+from cftools.logsink import SINK_POLICIES, LogSink
+from cftools.toccache import make_crazyflie
+
 DEFAULT_URI = "radio://0/80/2M/E7E7E7E7E7"
 
 
@@ -49,6 +54,8 @@ def main():
     ap.add_argument('--hover_s', type=float, default=15.0)
     ap.add_argument('--warmup_s', type=float, default=2.0)
     ap.add_argument('--land_extra_s', type=float, default=1.5)
+    ap.add_argument('--log_policy', choices=SINK_POLICIES, default='drop',
+                    help='what the log sink does when its buffer is full')
     args = ap.parse_args()
 
     period_ms = max(10, int(1000.0 / args.rate_hz))  # cap silly values
@@ -58,93 +65,104 @@ def main():
     headers = ['t_sec','label','x','y','z','vx','vy','vz','ax','ay','az']
     outfile = Path(args.outfile)
 
-    with SyncCrazyflie(args.uri, cf=Crazyflie(rw_cache='./cache')) as scf, \
-         open(outfile, 'w', newline='') as f_csv:
+    # A .cflog outfile gets the compact binary format (label/uri/rate stored once in the header)
+    if outfile.suffix == BINLOG_SUFFIX:
+        f_out = BinLogWriter(outfile, [h for h in headers if h != 'label'],
+                             meta={'label': args.label, 'uri': args.uri, 'rate_hz': 1000.0 / period_ms})
+        writer, format_row = f_out, None
+    else:
+        f_out = open(outfile, 'w', newline='')
+        writer = csv.writer(f_out); writer.writerow(headers)
+        format_row = lambda r: [f'{r[0]:.6f}', args.label, *r[1:]]
+
+    # f_out is entered first so it is closed (a .cflog finalized) even if connecting fails,
+    # and the LogSink block inside drains the ring into it before that
+    with f_out, SyncCrazyflie(args.uri, cf=make_crazyflie()) as scf:
 
         cf = scf.cf
-        writer = csv.writer(f_csv); writer.writerow(headers)
-
-        lg_est, lg_imu = make_log_configs(period_ms)
-
-        # Shared state for merging packets from both log blocks
-        t0 = time.monotonic()
-        latest = {'x': float('nan'),'y': float('nan'),'z': float('nan'),
-                  'vx': float('nan'),'vy': float('nan'),'vz': float('nan'),
-                  'ax': float('nan'),'ay': float('nan'),'az': float('nan')}
-        lock = Lock()
-
-        def write_row():
-            t = time.monotonic() - t0
-            writer.writerow([f'{t:.6f}', args.label,
-                             latest['x'], latest['y'], latest['z'],
-                             latest['vx'], latest['vy'], latest['vz'],
-                             latest['ax'], latest['ay'], latest['az']])
-
-        def on_est(ts, data, name):
-            with lock:
-                latest['x']  = data.get('stateEstimate.x', latest['x'])
-                latest['y']  = data.get('stateEstimate.y', latest['y'])
-                latest['z']  = data.get('stateEstimate.z', latest['z'])
-                latest['vx'] = data.get('stateEstimate.vx', latest['vx'])
-                latest['vy'] = data.get('stateEstimate.vy', latest['vy'])
-                latest['vz'] = data.get('stateEstimate.vz', latest['vz'])
-                write_row()
-
-        def on_imu(ts, data, name):
-            with lock:
-                latest['ax'] = data.get('acc.x', latest['ax'])
-                latest['ay'] = data.get('acc.y', latest['ay'])
-                latest['az'] = data.get('acc.z', latest['az'])
-                write_row()
-
-        def on_err(lc, msg):
-            print(f'[log error:{lc.name}] {msg}', file=sys.stderr)
-
-        try:
-            cf.log.add_config(lg_est)
-            cf.log.add_config(lg_imu)
-        except KeyError as e:
-            print("A variable wasn’t found. Ensure firmware exposes stateEstimate.* and acc.*", e)
-            sys.exit(1)
-
-        lg_est.data_received_cb.add_callback(on_est)
-        lg_imu.data_received_cb.add_callback(on_imu)
-        lg_est.error_cb.add_callback(on_err)
-        lg_imu.error_cb.add_callback(on_err)
-
-        print(f'Start logging at ~{1000/period_ms:.1f} Hz (split across two blocks)…')
-        lg_est.start(); lg_imu.start()
-        time.sleep(max(0.0, args.warmup_s))
-
-        with MotionCommander(scf, default_height=args.height) as mc:
-                # We are already airborne at ~args.height here.
-                print(f"Hovering at ~{args.height:.2f} m …")
-                time.sleep(1)
-
-                print('Moving up 0.2m')
-                mc.up(0.2)
-                # Wait a bit
-                time.sleep(1)
-                
-        for position in sequence:
-            print('Setting position {}'.format(position))
-            for i in range(5):
-                cf.commander.send_position_setpoint(position[0],
-                                                    position[1],
-                                                    position[2],
-                                                    position[3])
-                time.sleep(0.1)
-
-
-        else:
-            print('Logging only. Ctrl+C to stop.')
-            try:
-                while True: time.sleep(0.2)
-            except KeyboardInterrupt:
-                pass
+        # Rows are formatted and written on a background thread, not in the callbacks
+        with LogSink(writer, fileobj=f_out, policy=args.log_policy, format_row=format_row) as sink:
+            lg_est, lg_imu = make_log_configs(period_ms)
+
+            # Shared state for merging packets from both log blocks
+            t0 = time.monotonic()
+            latest = {'x': float('nan'),'y': float('nan'),'z': float('nan'),
+                      'vx': float('nan'),'vy': float('nan'),'vz': float('nan'),
+                      'ax': float('nan'),'ay': float('nan'),'az': float('nan')}
+            lock = Lock()
+
+            def write_row():
+                t = time.monotonic() - t0
+                sink.put((t, latest['x'], latest['y'], latest['z'],
+                          latest['vx'], latest['vy'], latest['vz'],
+                          latest['ax'], latest['ay'], latest['az']))
+
+            def on_est(ts, data, name):
+                with lock:
+                    latest['x']  = data.get('stateEstimate.x', latest['x'])
+                    latest['y']  = data.get('stateEstimate.y', latest['y'])
+                    latest['z']  = data.get('stateEstimate.z', latest['z'])
+                    latest['vx'] = data.get('stateEstimate.vx', latest['vx'])
+                    latest['vy'] = data.get('stateEstimate.vy', latest['vy'])
+                    latest['vz'] = data.get('stateEstimate.vz', latest['vz'])
+                    write_row()
+
+            def on_imu(ts, data, name):
+                with lock:
+                    latest['ax'] = data.get('acc.x', latest['ax'])
+                    latest['ay'] = data.get('acc.y', latest['ay'])
+                    latest['az'] = data.get('acc.z', latest['az'])
+                    write_row()
+
+            def on_err(lc, msg):
+                print(f'[log error:{lc.name}] {msg}', file=sys.stderr)
 
-        print('Stopping logs…')
-        lg_imu.stop(); lg_est.stop()
+            try:
+                cf.log.add_config(lg_est)
+                cf.log.add_config(lg_imu)
+            except KeyError as e:
+                print("A variable wasn’t found. Ensure firmware exposes stateEstimate.* and acc.*", e)
+                sys.exit(1)
+
+            lg_est.data_received_cb.add_callback(on_est)
+            lg_imu.data_received_cb.add_callback(on_imu)
+            lg_est.error_cb.add_callback(on_err)
+            lg_imu.error_cb.add_callback(on_err)
+
+            print(f'Start logging at ~{1000/period_ms:.1f} Hz (split across two blocks)…')
+            lg_est.start(); lg_imu.start()
+            time.sleep(max(0.0, args.warmup_s))
+
+            with MotionCommander(scf, default_height=args.height) as mc:
+                    # We are already airborne at ~args.height here.
+                    print(f"Hovering at ~{args.height:.2f} m …")
+                    time.sleep(1)
+
+                    print('Moving up 0.2m')
+                    mc.up(0.2)
+                    # Wait a bit
+                    time.sleep(1)
+                
+            for position in sequence:
+                print('Setting position {}'.format(position))
+                for i in range(5):
+                    cf.commander.send_position_setpoint(position[0],
+                                                        position[1],
+                                                        position[2],
+                                                        position[3])
+                    time.sleep(0.1)
+
+
+            else:
+                print('Logging only. Ctrl+C to stop.')
+                try:
+                    while True: time.sleep(0.2)
+                except KeyboardInterrupt:
+                    pass
+
+            print('Stopping logs…')
+            lg_imu.stop(); lg_est.stop()
+        print(sink.summary())
 
     print(f'Saved: {outfile.resolve()}')
 
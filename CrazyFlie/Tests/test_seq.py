@@ -5,7 +5,17 @@ Fly a world-frame (x, y, z, yaw_deg) trajectory on Crazyflie using low-level pos
 - Uses cf.commander.send_position_setpoint(x, y, z, yaw_deg)  [WORLD FRAME]
 - Requires: commander.enHighLevel = 0  and  flightmode.posSet = 1
 - Smooth takeoff and landing ramps
-- Optional y-velocity feed-forward if CSV has a 'vy' column (meters/second)
+- Runs on the asyncio flight executive (cftools.executive): the phases share
+  one setpoint clock, and a geofence and battery monitor run alongside them
+  and land the vehicle from wherever it is when they trip
+- --dashboard: live plots of the estimate and the setpoints (cftools.dashboard)
+- prints where the startup time went before the first setpoint (imports,
+  connect, TOC cache, configure); --profile saves it as JSON (cftools.startup)
+- Optional y-velocity feed-forward if CSV has a 'vy' column (meters/second);
+  --vy_ff auto uses the y lag measured from setpoint/estimate logs (cftools.latency)
+- --setpoints fullstate: fit a C2 cubic spline through the knots and stream
+  cf.commander.send_full_state_setpoint with its analytic velocity and
+  acceleration on every axis (replaces the --vy_ff look-ahead)
 
 CSV format (header required):
 time_s,x,y,z,yaw_deg[,vy]
@@ -24,68 +34,37 @@ Example:
 """
 
 import argparse
-import csv
-import math
-import time
+import asyncio
+import sys
+import threading
 from pathlib import Path
 
-import cflib.crtp
-from cflib.crazyflie import Crazyflie
-from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # for cftools
 
-# ---------- Utilities ----------
+from cftools.startup import StartupProfiler
 
-def set_param(scf, name, value):
-    try:
-        scf.cf.param.set_value(name, str(value))
-    except Exception:
-        pass
-
-def ensure_low_level_world_pos_mode(scf):
-    # World-frame position setpoints require HighLevel OFF and posSet ON
-    set_param(scf, 'commander.enHighLevel', 0)
-    set_param(scf, 'flightmode.posSet', 1)
-
-def reset_kalman(scf, settle_s=1.0):
-    set_param(scf, 'stabilizer.estimator', 2)           # 2 = Kalman
-    set_param(scf, 'kalman.resetEstimation', 1)
-    time.sleep(0.1)
-    set_param(scf, 'kalman.resetEstimation', 0)
-    time.sleep(settle_s)
-
-def arm(cf):
-    try:
-        cf.platform.send_arming_request(True)
-        time.sleep(0.4)
-    except Exception:
-        pass
+prof = StartupProfiler('startup')   # created first so the imports below are timed
 
-def clamp(v, lo, hi):
-    return max(lo, min(hi, v))
+with prof.phase('import cflib'):
+    import cflib.crtp
+    from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 
-def lerp(a, b, u):
-    return a + u * (b - a)
+with prof.phase('import cftools'):
+    from cftools.dashboard import Dashboard
+    from cftools.executive import FlightExecutive, LogStream, battery, geofence, watch_caller
+    from cftools.latency import LAG_LOGS, ff_arg, measured_feedforward
+    from cftools.scheduler import OVERRUN_POLICIES
+    from cftools.spline import SplineTrajectory
+    from cftools.toccache import make_crazyflie, shared_cache
+    from cftools.trajectory import Trajectory
+
+SETPOINT_MODES = ('position', 'fullstate')
+MONITOR_VARS = ('stateEstimate.x', 'stateEstimate.y', 'stateEstimate.z', 'pm.vbat')
+
+# ---------- Utilities ----------
 
 def load_csv(csv_path):
-    csv_path = Path("Traj.csv")
-    rows = []
-    with open(csv_path, 'r', newline='') as f:
-        r = csv.DictReader(f)
-        need = {'time_s', 'x', 'y', 'z', 'yaw_deg'}
-        if not need.issubset(set(r.fieldnames or [])):
-            raise ValueError(f"CSV must contain columns: {sorted(need)}")
-        has_vy = 'vy' in r.fieldnames
-        for d in r:
-            rows.append({
-                't': float(d['time_s']),
-                'x': float(d['x']),
-                'y': float(d['y']),
-                'z': float(d['z']),
-                'yaw': float(d['yaw_deg']),
-                'vy': float(d['vy']) if has_vy and d['vy'] != '' else 0.0
-            })
-    rows.sort(key=lambda k: k['t'])
-    return rows
+    return Trajectory.from_csv(csv_path, vy_mode='step')
 
 def build_default_traj():
     # 5-second “└─┘” demo at z=0.5
@@ -97,86 +76,36 @@ def build_default_traj():
         (4.0,  0.00, 0.00, 0.50, 0.0),
         (5.0,  0.00, 0.00, 0.50, 0.0),
     ]
-    return [{'t':t,'x':x,'y':y,'z':z,'yaw':yaw,'vy':0.0} for (t,x,y,z,yaw) in pts]
-
-def interp_sample(pts, t_now):
-    """Linear interpolation in time over x,y,z,yaw and step for vy."""
-    if t_now <= pts[0]['t']:
-        return pts[0]
-    if t_now >= pts[-1]['t']:
-        return pts[-1]
-    # find segment
-    for i in range(len(pts)-1):
-        a, b = pts[i], pts[i+1]
-        if a['t'] <= t_now <= b['t']:
-            u = (t_now - a['t']) / max(1e-9, (b['t'] - a['t']))
-            yaw = lerp(a['yaw'], b['yaw'], u)
-            # unwrap yaw for shortest interpolation
-            dyaw = ((b['yaw'] - a['yaw'] + 180) % 360) - 180
-            yaw = a['yaw'] + u * dyaw
-            return {
-                't': t_now,
-                'x': lerp(a['x'], b['x'], u),
-                'y': lerp(a['y'], b['y'], u),
-                'z': lerp(a['z'], b['z'], u),
-                'yaw': yaw,
-                'vy': a['vy'] if u < 0.5 else b['vy'],  # simple step-hold
-            }
-    return pts[-1]
-
-# ---------- Flight routines ----------
-
-def ramp_takeoff(cf, z_target, seconds, rate_hz):
-    if z_target <= 0.0 or seconds <= 0.0:
-        return
-    dt = 1.0 / rate_hz
-    steps = max(1, int(seconds * rate_hz))
-    for k in range(steps):
-        u = (k + 1) / steps
-        z = u * z_target
-        cf.commander.send_position_setpoint(0.0, 0.0, z, 0.0)
-        time.sleep(dt)
-
-def ramp_land(cf, z_start, seconds, rate_hz):
-    if z_start <= 0.0 or seconds <= 0.0:
-        return
-    dt = 1.0 / rate_hz
-    steps = max(1, int(seconds * rate_hz))
-    for k in range(steps):
-        u = (k + 1) / steps
-        z = (1.0 - u) * z_start
-        cf.commander.send_position_setpoint(0.0, 0.0, z, 0.0)
-        time.sleep(dt)
-    # final settle on ground
-    cf.commander.send_stop_setpoint()
-
-def follow_trajectory_lowlevel(cf, traj, rate_hz=50.0, vy_ff=0.0):
-    """
-    Stream world-frame position setpoints at 'rate_hz'.
-    If vy_ff > 0 and traj contains 'vy', apply a small feed-forward on y:
-        y_cmd = y + vy * vy_ff
-    vy_ff has units of seconds (e.g., 0.08..0.20 works as a “look-ahead”).
-    """
-    dt = 1.0 / rate_hz
-    t0 = time.monotonic()
-    T_end = traj[-1]['t']
-    while True:
-        t = time.monotonic() - t0
-        if t > T_end:
-            samp = traj[-1]
+    return Trajectory(*zip(*pts))
+
+# ---------- Flight ----------
+
+async def fly(cf, traj, args, on_setpoint=None):
+    ex = FlightExecutive(cf, rate_hz=args.rate_hz, overrun=args.overrun, on_setpoint=on_setpoint)
+    spline = SplineTrajectory.from_trajectory(traj) if args.setpoints == 'fullstate' else None
+
+    # Monitors start logging while the estimator settles
+    mon = LogStream(cf, 'monitor', MONITOR_VARS, period_ms=50).start()
+    await ex.configure(reset_estimator=not args.no_reset)
+
+    async def mission():
+        await ex.ramp_takeoff(max(0.2, args.takeoff_z), args.takeoff_s)
+        if spline is not None:
+            await ex.follow_trajectory_fullstate(spline)
         else:
-            samp = interp_sample(traj, t)
-
-        y_cmd = samp['y'] + samp['vy'] * vy_ff
-        cf.commander.send_position_setpoint(
-            float(samp['x']),
-            float(y_cmd),
-            float(samp['z']),
-            float(samp['yaw'])
-        )
-        if t > T_end + 0.05:
-            break
-        time.sleep(dt)
+            await ex.follow_trajectory_lowlevel(traj, vy_ff=args.vy_ff)
+        await ex.ramp_land(args.land_s)
+
+    f = args.fence_m
+    monitors = [geofence(mon, (-f, -f, -0.2), (f, f, args.fence_z)),
+                watch_caller(cf.connection_lost, 'link lost')]
+    if args.vbat_min > 0:
+        monitors.append(battery(mon, args.vbat_min))
+    try:
+        await ex.run(mission(), monitors=monitors, land_s=args.land_s)
+    finally:
+        mon.stop()
+    return ex
 
 # ---------- Main ----------
 
@@ -188,35 +117,99 @@ def main():
     p.add_argument('--takeoff_z', type=float, default=1.0)
     p.add_argument('--takeoff_s', type=float, default=1.5)
     p.add_argument('--land_s', type=float, default=1.5)
-    p.add_argument('--vy_ff', type=float, default=0.0, help='y-velocity feed-forward time [s], e.g., 0.1')
+    p.add_argument('--setpoints', choices=SETPOINT_MODES, default='position',
+                   help='position: linear interpolation; fullstate: spline with vel/acc feed-forward')
+    p.add_argument('--vy_ff', type=ff_arg, default=0.0,
+                   help="position mode only: y-velocity feed-forward time [s], e.g., 0.1, "
+                        "or 'auto': measured y lag (--lag_from)")
+    p.add_argument('--lag_from', default=str(LAG_LOGS),
+                   help='setpoint/estimate logs for --vy_ff auto (cftools.latency)')
+    p.add_argument('--fence_m', type=float, default=2.0, help='abort and land beyond +-x/y [m]')
+    p.add_argument('--fence_z', type=float, default=2.0, help='abort and land above z [m]')
+    p.add_argument('--vbat_min', type=float, default=3.2, help='abort below this voltage (0: off)')
     p.add_argument('--no_reset', action='store_true', help='skip Kalman reset if you prefer')
+    p.add_argument('--dashboard', action='store_true', help='live plots while flying')
+    p.add_argument('--overrun', choices=OVERRUN_POLICIES, default='skip',
+                   help='what to do with missed setpoint deadlines')
+    p.add_argument('--profile', default='', help='save the startup waterfall as JSON here')
     args = p.parse_args()
 
-    cflib.crtp.init_drivers(enable_debug_driver=False)
-
-    if args.csv:
-        traj = load_csv(args.csv)
-    else:
-        traj = build_default_traj()
-
-    with SyncCrazyflie(args.uri, cf=Crazyflie(rw_cache='./cache')) as scf:
-        cf = scf.cf
+    with prof.phase('init_drivers'):
+        cflib.crtp.init_drivers(enable_debug_driver=False)
 
-        ensure_low_level_world_pos_mode(scf)
-        if not args.no_reset:
-            reset_kalman(scf, settle_s=1.0)
-
-        arm(cf)
-
-        # Takeoff to a safe height
-        ramp_takeoff(cf, z_target=max(0.2, args.takeoff_z), seconds=args.takeoff_s, rate_hz=args.rate_hz)
+    with prof.phase('load trajectory'):
+        if args.csv:
+            traj = load_csv(args.csv)
+        else:
+            traj = build_default_traj()
+    if args.setpoints == 'fullstate' and args.vy_ff:
+        print('--vy_ff is ignored with --setpoints fullstate')
+    elif args.vy_ff == 'auto':
+        with prof.phase('measure lag'):
+            try:
+                args.vy_ff, n = measured_feedforward(args.lag_from, axis='y')
+            except ValueError as e:
+                sys.exit(f'--vy_ff auto: {e}')
+        print(f'vy_ff = {args.vy_ff:.3f} s (median y lag of {n} runs in {args.lag_from})')
+
+    cf = make_crazyflie()
+    prof.watch_connection(cf)           # link / TOC / parameter values from the connect callbacks
+    with SyncCrazyflie(args.uri, cf=cf) as scf:
+        if args.dashboard:
+            # The window needs the main thread: fly in a worker, close the window to stop watching
+            dash = Dashboard(title=f'test_seq: {args.csv or "default trajectory"}').attach(scf.cf)
+            # Ctrl-C lands in this thread, so it is handed to the flight's own loop as a
+            # cancellation (the executive then lands); the link stays open until it has.
+            # Waits are on an Event: an interrupted Thread.join() can report the thread dead.
+            result, flight = [], {}
+            stop, done = threading.Event(), threading.Event()
+
+            async def fly_in_worker():
+                flight['loop'], flight['task'] = asyncio.get_running_loop(), asyncio.current_task()
+                if stop.is_set():
+                    raise asyncio.CancelledError
+                return await fly(scf.cf, traj, args, dash.on_setpoint)
+
+            def run_flight():
+                try:
+                    result.append(asyncio.run(fly_in_worker()))
+                finally:
+                    done.set()
+
+            worker = threading.Thread(target=run_flight)
+            worker.start()
+            try:
+                dash.show()
+                while not done.wait(0.2):
+                    pass
+            except KeyboardInterrupt:
+                print('Ctrl-C -> cancelling the flight')
+                stop.set()
+                if 'task' in flight:
+                    flight['loop'].call_soon_threadsafe(flight['task'].cancel)
+            while not done.is_set():
+                try:
+                    done.wait(0.2)
+                except KeyboardInterrupt:
+                    print('still landing, waiting for the flight thread')
+            worker.join()
+            dash.detach()
+            print(dash.summary())
+            if not result:
+                sys.exit(1)             # the flight thread failed (traceback above)
+            ex = result[0]
+        else:
+            ex = asyncio.run(fly(scf.cf, traj, args))
 
-        # Follow trajectory (world frame)
-        follow_trajectory_lowlevel(cf, traj, rate_hz=args.rate_hz, vy_ff=args.vy_ff)
+    # Setpoint timing (achieved rate, jitter, overruns) and the phase waterfall
+    print(ex.summary())
 
-        # Land
-        z_last = traj[-1]['z'] if traj else args.takeoff_z
-        ramp_land(cf, z_start=max(0.0, z_last), seconds=args.land_s, rate_hz=args.rate_hz)
+    # Where the time before the first setpoint went (executive phases up to takeoff)
+    prof.add_toc_events(shared_cache())
+    prof.add_phases(ex.phases, origin=ex.t_origin, until='takeoff')
+    print(prof.waterfall())
+    if args.profile:
+        print(f'Saved: {prof.save_json(args.profile)}')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
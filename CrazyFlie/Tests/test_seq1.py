@@ -6,7 +6,8 @@ Fly a world-frame (x, y, z, yaw_deg) trajectory on Crazyflie using low-level pos
 - HighLevel OFF (commander.enHighLevel = 0), low-level position ON (flightmode.posSet = 1)
 - Smooth takeoff to 1.0 m and smooth landing
 - CSV MUST contain columns: time_s, x, y, z, yaw_deg, vy
-- Optional y-velocity feed-forward via --vy_ff (seconds of look-ahead)
+- Optional y-velocity feed-forward via --vy_ff (seconds of look-ahead); --vy_ff auto
+  uses the y lag measured from setpoint/estimate logs (cftools.latency)
 
 Example CSV (header required):
 time_s,x,y,z,yaw_deg,vy
@@ -18,33 +19,39 @@ time_s,x,y,z,yaw_deg,vy
 """
 
 import argparse
-import csv
+import sys
 import time
 from pathlib import Path
 
-import cflib.crtp
-from cflib.crazyflie import Crazyflie
-from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # for cftools
 
-# ---------- Utilities ----------
+from cftools.startup import StartupProfiler
 
-def set_param(scf, name, value):
-    try:
-        scf.cf.param.set_value(name, str(value))
-    except Exception:
-        pass
+prof = StartupProfiler('startup')   # created first so the imports below are timed
+
+with prof.phase('import cflib'):
+    import cflib.crtp
+    from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+
+with prof.phase('import cftools'):
+    from cftools.estimator import reset_estimator
+    from cftools.latency import LAG_LOGS, ff_arg, measured_feedforward
+    from cftools.params import write_params
+    from cftools.scheduler import OVERRUN_POLICIES, DeadlineScheduler
+    from cftools.toccache import make_crazyflie, shared_cache
+    from cftools.trajectory import Trajectory
+
+# ---------- Utilities ----------
 
 def ensure_low_level_world_pos_mode(scf):
     # World-frame position setpoints require HighLevel OFF and posSet ON
-    set_param(scf, 'commander.enHighLevel', 0)
-    set_param(scf, 'flightmode.posSet', 1)
+    write_params(scf.cf, {'commander.enHighLevel': 0, 'flightmode.posSet': 1}).check()
 
-def reset_kalman(scf, settle_s=1.0):
-    set_param(scf, 'stabilizer.estimator', 2)           # 2 = Kalman
-    set_param(scf, 'kalman.resetEstimation', 1)
-    time.sleep(0.1)
-    set_param(scf, 'kalman.resetEstimation', 0)
-    time.sleep(settle_s)
+def reset_kalman(scf):
+    # Kalman reset, then wait until varPX/Y/Z and the estimate have settled (not a fixed sleep)
+    report = reset_estimator(scf.cf)
+    print(report.summary())
+    return report
 
 def arm(cf):
     try:
@@ -53,28 +60,8 @@ def arm(cf):
     except Exception:
         pass
 
-def lerp(a, b, u):
-    return a + u * (b - a)
-
 def load_csv(csv_path):
-    csv_path = Path("Traj.csv")
-    rows = []
-    with open(csv_path, 'r', newline='') as f:
-        r = csv.DictReader(f)
-        need = {'time_s', 'x', 'y', 'z', 'yaw_deg', 'vy'}
-        if not need.issubset(set(r.fieldnames or [])):
-            raise ValueError(f"CSV must contain columns: {sorted(need)}")
-        for d in r:
-            rows.append({
-                't': float(d['time_s']),
-                'x': float(d['x']),
-                'y': float(d['y']),
-                'z': float(d['z']),
-                'yaw': float(d['yaw_deg']),
-                'vy': float(d['vy']),
-            })
-    rows.sort(key=lambda k: k['t'])
-    return rows
+    return Trajectory.from_csv(csv_path, vy_mode='step', require_vy=True)
 
 def build_default_traj():
     # 5-second demo at z=1.0 with vy present
@@ -86,68 +73,52 @@ def build_default_traj():
         (4.0, 0.00, 0.00, 1.00, 0.0, -0.10),
         (5.0, 0.00, 0.00, 1.00, 0.0, 0.00),
     ]
-    return [{'t':t,'x':x,'y':y,'z':z,'yaw':yaw,'vy':vy} for (t,x,y,z,yaw,vy) in pts]
-
-def interp_sample(pts, t_now):
-    """Linear interpolation in time over x,y,z,yaw; step for vy."""
-    if t_now <= pts[0]['t']:
-        return pts[0]
-    if t_now >= pts[-1]['t']:
-        return pts[-1]
-    for i in range(len(pts)-1):
-        a, b = pts[i], pts[i+1]
-        if a['t'] <= t_now <= b['t']:
-            u = (t_now - a['t']) / max(1e-9, (b['t'] - a['t']))
-            # shortest-path yaw interpolation in degrees
-            dyaw = ((b['yaw'] - a['yaw'] + 180) % 360) - 180
-            yaw = a['yaw'] + u * dyaw
-            return {
-                't': t_now,
-                'x': lerp(a['x'], b['x'], u),
-                'y': lerp(a['y'], b['y'], u),
-                'z': lerp(a['z'], b['z'], u),
-                'yaw': yaw,
-                'vy': a['vy'] if u < 0.5 else b['vy'],
-            }
-    return pts[-1]
+    return Trajectory(*zip(*pts))
 
 # ---------- Flight routines ----------
 
-def ramp_takeoff(cf, z_target, seconds, rate_hz):
+def ramp_takeoff(cf, z_target, seconds, rate_hz, overrun='skip'):
     if z_target <= 0.0 or seconds <= 0.0:
-        return
-    dt = 1.0 / rate_hz
+        return None
+    sched = DeadlineScheduler(rate_hz, overrun=overrun, name='takeoff')
+    sched.start()
     steps = max(1, int(seconds * rate_hz))
     for k in range(steps):
         u = (k + 1) / steps
         z = u * z_target
         cf.commander.send_position_setpoint(0.0, 0.0, z, 0.0)
-        time.sleep(dt)
+        sched.wait()
+    return sched.stats
 
-def ramp_land(cf, z_start, seconds, rate_hz):
+def ramp_land(cf, z_start, seconds, rate_hz, overrun='skip'):
     if z_start <= 0.0 or seconds <= 0.0:
         cf.commander.send_stop_setpoint()
-        return
-    dt = 1.0 / rate_hz
+        return None
+    sched = DeadlineScheduler(rate_hz, overrun=overrun, name='land')
+    sched.start()
     steps = max(1, int(seconds * rate_hz))
     for k in range(steps):
         u = (k + 1) / steps
         z = (1.0 - u) * z_start
         cf.commander.send_position_setpoint(0.0, 0.0, z, 0.0)
-        time.sleep(dt)
+        sched.wait()
     cf.commander.send_stop_setpoint()
+    return sched.stats
 
-def follow_trajectory_lowlevel(cf, traj, rate_hz=25.0, vy_ff=0.0):
+def follow_trajectory_lowlevel(cf, traj, rate_hz=25.0, vy_ff=0.0, overrun='skip'):
     """
     Stream world-frame position setpoints at 'rate_hz'.
     y_cmd = y + vy * vy_ff   (vy_ff in seconds; simple look-ahead feed-forward)
     """
-    dt = 1.0 / rate_hz
-    t0 = time.monotonic()
-    T_end = traj[-1]['t']
+    if not isinstance(traj, Trajectory):
+        traj = Trajectory.from_points(traj)
+    traj.reset()
+    sched = DeadlineScheduler(rate_hz, overrun=overrun, name='trajectory')
+    t0 = sched.start()
+    T_end = traj.t_end
     while True:
         t = time.monotonic() - t0
-        samp = traj[-1] if t > T_end else interp_sample(traj, t)
+        samp = traj.sample(t)
         y_cmd = samp['y'] + samp['vy'] * vy_ff
         cf.commander.send_position_setpoint(
             float(samp['x']),
@@ -157,7 +128,8 @@ def follow_trajectory_lowlevel(cf, traj, rate_hz=25.0, vy_ff=0.0):
         )
         if t > T_end + 0.05:
             break
-        time.sleep(dt)
+        sched.wait()
+    return sched.stats
 
 # ---------- Main ----------
 
@@ -169,33 +141,68 @@ def main():
     p.add_argument('--takeoff_z', type=float, default=1.0)  # takeoff to 1 m
     p.add_argument('--takeoff_s', type=float, default=1.5)
     p.add_argument('--land_s', type=float, default=1.5)
-    p.add_argument('--vy_ff', type=float, default=0.0, help='y-velocity feed-forward time [s], e.g., 0.1')
+    p.add_argument('--vy_ff', type=ff_arg, default=0.0,
+                   help="y-velocity feed-forward time [s], e.g., 0.1, or 'auto': measured y lag (--lag_from)")
+    p.add_argument('--lag_from', default=str(LAG_LOGS),
+                   help='setpoint/estimate logs for --vy_ff auto (cftools.latency)')
     p.add_argument('--no_reset', action='store_true', help='skip Kalman reset')
+    p.add_argument('--overrun', choices=OVERRUN_POLICIES, default='skip',
+                   help='what to do with missed setpoint deadlines')
+    p.add_argument('--profile', default='', help='save the startup waterfall as JSON here')
     args = p.parse_args()
 
-    cflib.crtp.init_drivers(enable_debug_driver=False)
-
-    traj = load_csv(args.csv) #if args.csv #else build_default_traj()
-
-    with SyncCrazyflie(args.uri, cf=Crazyflie(rw_cache='./cache')) as scf:
-        cf = scf.cf
-
-        ensure_low_level_world_pos_mode(scf)   # HL OFF, posSet ON
-        if not args.no_reset:
-            reset_kalman(scf, settle_s=1.0)
-
-        # Explicit arming (harmless if redundant)
-        arm(cf)
+    with prof.phase('init_drivers'):
+        cflib.crtp.init_drivers(enable_debug_driver=False)
+
+    with prof.phase('load trajectory'):
+        traj = load_csv(args.csv) #if args.csv #else build_default_traj()
+
+    if args.vy_ff == 'auto':
+        with prof.phase('measure lag'):
+            try:
+                args.vy_ff, n = measured_feedforward(args.lag_from, axis='y')
+            except ValueError as e:
+                sys.exit(f'--vy_ff auto: {e}')
+        print(f'vy_ff = {args.vy_ff:.3f} s (median y lag of {n} runs in {args.lag_from})')
+
+    cf = make_crazyflie()
+    prof.watch_connection(cf)           # link / TOC / parameter values from the connect callbacks
+    with SyncCrazyflie(args.uri, cf=cf) as scf:
+        with prof.phase('configure'):
+            with prof.phase('set params'):
+                ensure_low_level_world_pos_mode(scf)   # HL OFF, posSet ON
+            if not args.no_reset:
+                with prof.phase('kalman reset'):
+                    reset_kalman(scf)
+
+            # Explicit arming (harmless if redundant)
+            with prof.phase('arm'):
+                arm(cf)
+        prof.mark('first setpoint')
 
         # Takeoff
-        ramp_takeoff(cf, z_target=max(0.2, args.takeoff_z), seconds=args.takeoff_s, rate_hz=args.rate_hz)
+        stats = [ramp_takeoff(cf, z_target=max(0.2, args.takeoff_z), seconds=args.takeoff_s,
+                              rate_hz=args.rate_hz, overrun=args.overrun)]
 
         # Follow trajectory (world frame)
-        follow_trajectory_lowlevel(cf, traj, rate_hz=args.rate_hz, vy_ff=args.vy_ff)
+        stats.append(follow_trajectory_lowlevel(cf, traj, rate_hz=args.rate_hz,
+                                                vy_ff=args.vy_ff, overrun=args.overrun))
 
         # Land
         z_last = traj[-1]['z'] if traj else args.takeoff_z
-        ramp_land(cf, z_start=max(0.0, z_last), seconds=args.land_s, rate_hz=args.rate_hz)
+        stats.append(ramp_land(cf, z_start=max(0.0, z_last), seconds=args.land_s,
+                               rate_hz=args.rate_hz, overrun=args.overrun))
+
+    # Setpoint timing per phase (achieved rate, jitter, overruns)
+    for st in stats:
+        if st is not None:
+            print(st.summary())
+
+    # Where the time before the first setpoint went
+    prof.add_toc_events(shared_cache())
+    print(prof.waterfall())
+    if args.profile:
+        print(f'Saved: {prof.save_json(args.profile)}')
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
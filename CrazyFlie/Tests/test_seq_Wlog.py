@@ -1,35 +1,36 @@
 #!/usr/bin/env python3
 """
 World-frame trajectory follower (x,y,z,yaw) with Y logging only.
-Logs EKF-estimated y-position (observer) and Flowdeck-measured y while flying.
+Logs EKF-estimated y-position (observer) and Flowdeck-measured y while flying,
+next to the commanded setpoint, streamed to the CSV as the flight goes
+(cftools.recorder: bounded buffer, periodic fsync, footer on close).
 CSV MUST have: time_s, x, y, z, yaw_deg, vy
 """
 
-import argparse, csv, time
+import argparse, sys, time
 from pathlib import Path
 from threading import Lock
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # for cftools
 import cflib.crtp
-from cflib.crazyflie import Crazyflie
 from cflib.crazyflie.log import LogConfig
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+from cftools.estimator import reset_estimator
+from cftools.latency import LAG_LOGS
+from cftools.params import write_params
+from cftools.recorder import TelemetryRecorder
+from cftools.scheduler import DeadlineScheduler
+from cftools.toccache import make_crazyflie
+from cftools.trajectory import Trajectory
 
 # ---------- helpers ----------
-def set_param(scf, name, value):
-    try:
-        scf.cf.param.set_value(name, str(value))
-    except Exception:
-        pass
-
 def ensure_low_level_world_pos_mode(scf):
-    set_param(scf, "commander.enHighLevel", 0)
-    set_param(scf, "flightmode.posSet", 1)
+    write_params(scf.cf, {"commander.enHighLevel": 0, "flightmode.posSet": 1}).check()
 
-def reset_kalman(scf, settle_s=1.0):
-    set_param(scf, "stabilizer.estimator", 2)
-    set_param(scf, "kalman.resetEstimation", 1)
-    time.sleep(0.1)
-    set_param(scf, "kalman.resetEstimation", 0)
-    time.sleep(settle_s)
+def reset_kalman(scf):
+    # Kalman reset, then wait until varPX/Y/Z and the estimate have settled (not a fixed sleep)
+    report = reset_estimator(scf.cf)
+    print(report.summary())
+    return report
 
 def arm(cf):
     try:
@@ -38,53 +39,19 @@ def arm(cf):
     except Exception:
         pass
 
-def lerp(a,b,u): return a + u*(b-a)
-
 def load_csv(csv_path):
-    csv_path = Path("Traj.csv")
-    rows = []
-    with open(csv_path, 'r', newline='') as f:
-        r = csv.DictReader(f)
-        need = {'\ufefftime_s', 'x', 'y', 'z', 'yaw_deg', 'vy'}
-        if not need.issubset(set(r.fieldnames or [])):
-            raise ValueError(f"CSV must contain columns: {sorted(need)}")
-        for d in r:
-            rows.append({
-                't': float(d['\ufefftime_s']),
-                'x': float(d['x']),
-                'y': float(d['y']),
-                'z': float(d['z']),
-                'yaw': float(d['yaw_deg']),
-                'vy': float(d['vy']),
-            })
-    rows.sort(key=lambda k: k['t'])
-    return rows
-
-def interp_sample(pts,t):
-    if t<=pts[0]['t']: return pts[0]
-    if t>=pts[-1]['t']: return pts[-1]
-    for i in range(len(pts)-1):
-        a,b=pts[i],pts[i+1]
-        if a['t']<=t<=b['t']:
-            u=(t-a['t'])/max(1e-9,(b['t']-a['t']))
-            dyaw=((b['yaw']-a['yaw']+180)%360)-180
-            return {
-                'x':lerp(a['x'],b['x'],u),
-                'y':lerp(a['y'],b['y'],u),
-                'z':lerp(a['z'],b['z'],u),
-                'yaw':a['yaw']+u*dyaw,
-                'vy':lerp(a['vy'],b['vy'],u)
-            }
-    return pts[-1]
+    return Trajectory.from_csv(csv_path, vy_mode='linear', require_vy=True)
 
 # ---------- main ----------
 def main():
     ap=argparse.ArgumentParser()
     ap.add_argument('--uri',default='radio://0/80/2M')
     ap.add_argument('--csv',default="Traj.csv")
-    ap.add_argument('--outfile',default='y_log.csv')
+    ap.add_argument('--outfile',default=str(LAG_LOGS/'y_log.csv'),
+                    help='default: Logs/, where --vy_ff auto looks (cftools.latency)')
     ap.add_argument('--rate_hz',type=float,default=25.0)
     ap.add_argument('--takeoff_z',type=float,default=1.0)
+    ap.add_argument('--fsync_s',type=float,default=1.0,help='max seconds of log lost on a crash')
     args=ap.parse_args()
 
     cflib.crtp.init_drivers(enable_debug_driver=False)
@@ -92,9 +59,8 @@ def main():
 
     est={'y':float('nan'),'y_flow':float('nan')}
     lock=Lock()
-    rows=[]
 
-    with SyncCrazyflie(args.uri,cf=Crazyflie(rw_cache='./cache')) as scf:
+    with SyncCrazyflie(args.uri,cf=make_crazyflie()) as scf:
         cf=scf.cf
         ensure_low_level_world_pos_mode(scf)
         reset_kalman(scf)
@@ -118,35 +84,41 @@ def main():
         lg.start()
 
         # Takeoff ramp
-        dt=1/args.rate_hz
         steps=int(args.rate_hz*1.5)
+        sched=DeadlineScheduler(args.rate_hz,name='takeoff'); sched.start()
         for k in range(steps):
             cf.commander.send_position_setpoint(0,0,(k+1)/steps*args.takeoff_z,0)
-            time.sleep(dt)
-
-        # Follow trajectory
-        t0=time.monotonic(); T_end=traj[-1]['t']
-        while True:
-            t=time.monotonic()-t0
-            s=interp_sample(traj,t)
-            cf.commander.send_position_setpoint(s['x'],s['y'],s['z'],s['yaw'])
-            with lock:
-                rows.append([f'{t:.3f}',est['y'],est['y_flow']])
-            if t>T_end+0.05: break
-            time.sleep(dt)
+            sched.wait()
+        stats=[sched.stats]
+
+        # Follow trajectory, streaming commanded and estimated y to the CSV
+        columns=['t_sec','x_cmd','y_cmd','z_cmd','y_est','y_flow']
+        with TelemetryRecorder(args.outfile,columns,fsync_s=args.fsync_s) as rec:
+            sched=DeadlineScheduler(args.rate_hz,name='trajectory')
+            t0=sched.start(); T_end=traj.t_end
+            while True:
+                t=time.monotonic()-t0
+                s=traj.sample(t)
+                cf.commander.send_position_setpoint(s['x'],s['y'],s['z'],s['yaw'])
+                with lock:
+                    y_est,y_flow=est['y'],est['y_flow']
+                rec.record(t,s['x'],s['y'],s['z'],y_est,y_flow)
+                if t>T_end+0.05: break
+                sched.wait()
+        stats.append(sched.stats)
 
         # Land
+        sched=DeadlineScheduler(args.rate_hz,name='land'); sched.start()
         for k in range(steps):
             z=(1-(k+1)/steps)*args.takeoff_z
             cf.commander.send_position_setpoint(0,0,z,0)
-            time.sleep(dt)
+            sched.wait()
+        stats.append(sched.stats)
         cf.commander.send_stop_setpoint()
         lg.stop()
 
-    with open(args.outfile,'w',newline='') as f:
-        w=csv.writer(f)
-        w.writerow(['t_sec','y_est','y_flow'])
-        w.writerows(rows)
+    for st in stats: print(st.summary())
+    print(rec.summary())
     print(f"Saved: {Path(args.outfile).resolve()}")
 
 if __name__=='__main__':
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Fly a world-frame trajectory from the Crazyflie's trajectory memory (high-level commander).
+
+Same trajectories as test_seq.py (Traj.csv or a MATLAB optimal run), but
+instead of streaming send_position_setpoint at 25 Hz the trajectory is
+fitted to 7th-order polynomial pieces, uploaded once and started with one
+start_trajectory command. Timing comes from the onboard clock; the host
+only logs the estimate against the onboard target (ctrltarget.*).
+
+- Requires: commander.enHighLevel = 1
+- --dry_run fits, packs and decodes against a local stand-in memory only
+
+Examples:
+    python test_seq_hl.py --csv Traj.csv
+    python test_seq_hl.py --length 0.35 --format poly4d
+    python test_seq_hl.py --csv Traj.csv --dry_run
+"""
+
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # for cftools
+
+import numpy as np
+
+import cflib.crtp
+from cflib.crazyflie.log import LogConfig
+from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+
+from cftools.estimator import reset_estimator
+from cftools.matimport import load_trajectory
+from cftools.params import write_params
+from cftools.polytraj import FORMATS, LocalTrajectoryMemory, fit, upload
+from cftools.toccache import make_crazyflie
+from cftools.trajectory import Trajectory
+
+TRAJECTORY_ID = 1
+MONITOR_VARS = ('stateEstimate.x', 'stateEstimate.y', 'stateEstimate.z',
+                'ctrltarget.x', 'ctrltarget.y', 'ctrltarget.z')
+
+
+def reset_kalman(scf):
+    # Kalman reset, then wait until varPX/Y/Z and the estimate have settled (not a fixed sleep)
+    report = reset_estimator(scf.cf)
+    print(report.summary())
+    return report
+
+
+def arm(cf):
+    try:
+        cf.platform.send_arming_request(True)
+        time.sleep(0.4)
+    except Exception:
+        pass
+
+
+def check_decoded(pp, fmt):
+    """Pack into a stand-in memory, decode like the firmware and return the worst deviation (m)."""
+    mem = LocalTrajectoryMemory()
+    nbytes = upload(None, pp, fmt=fmt, mem=mem)
+    onboard = mem.read_trajectory(len(pp), fmt)
+    ts = np.linspace(0.0, pp.duration, 2000)
+    err = np.abs(onboard.evaluate(ts)[0][:, :3] - pp.evaluate(ts)[0][:, :3]).max()
+    return nbytes, float(err)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--uri', default='radio://0/80/2M')
+    p.add_argument('--csv', default='', help='time_s,x,y,z,yaw_deg CSV (default: MATLAB run)')
+    p.add_argument('--length', type=float, default=None, help='MATLAB optimal run: pendulum length (m)')
+    p.add_argument('--angle', type=float, default=None, help='MATLAB optimal run: target angle (deg)')
+    p.add_argument('--format', choices=FORMATS, default='compressed')
+    p.add_argument('--pos_tol_mm', type=float, default=5.0, help='max fit deviation from the trajectory')
+    p.add_argument('--max_pieces', type=int, default=30)
+    p.add_argument('--time_scale', type=float, default=1.0, help='>1 flies slower')
+    p.add_argument('--takeoff_s', type=float, default=2.0)
+    p.add_argument('--goto_s', type=float, default=2.0)
+    p.add_argument('--land_s', type=float, default=2.0)
+    p.add_argument('--log_hz', type=float, default=50.0)
+    p.add_argument('--no_reset', action='store_true', help='skip Kalman reset if you prefer')
+    p.add_argument('--dry_run', action='store_true', help='fit and pack only, no connection')
+    args = p.parse_args()
+
+    if args.csv:
+        traj = Trajectory.from_csv(args.csv)
+    elif args.length is None and args.angle is None:
+        traj = load_trajectory(length=0.35, rate_hz=100.0)
+    else:
+        traj = load_trajectory(length=args.length, angle_deg=args.angle, rate_hz=100.0)
+
+    pp, stats = fit(traj, pos_tol=args.pos_tol_mm / 1000.0, max_pieces=args.max_pieces)
+    print(stats.summary())
+    nbytes, q_err = check_decoded(pp, args.format)
+    print(f'{args.format}: {nbytes} B, onboard decode within {q_err * 1000:.2f} mm of the fit')
+    if args.dry_run:
+        return
+
+    cflib.crtp.init_drivers(enable_debug_driver=False)
+
+    with SyncCrazyflie(args.uri, cf=make_crazyflie()) as scf:
+        cf = scf.cf
+        hl = cf.high_level_commander
+
+        write_params(cf, {'commander.enHighLevel': 1}).check()
+        if not args.no_reset:
+            reset_kalman(scf)
+
+        t0 = time.monotonic()
+        upload(cf, pp, trajectory_id=TRAJECTORY_ID, fmt=args.format)
+        print(f'Uploaded {len(pp)} pieces in {time.monotonic() - t0:.2f} s')
+
+        rows = []                                     # (firmware ms, est xyz, target xyz)
+        lc = LogConfig(name='track', period_in_ms=int(1000 / args.log_hz))
+        for v in MONITOR_VARS:
+            lc.add_variable(v, 'float')
+        lc.data_received_cb.add_callback(
+            lambda ts, data, _: rows.append((ts, *(data[v] for v in MONITOR_VARS))))
+        cf.log.add_config(lc)
+
+        arm(cf)
+        start = traj[0]
+        hl.takeoff(start['z'], args.takeoff_s)
+        time.sleep(args.takeoff_s + 0.2)
+        hl.go_to(start['x'], start['y'], start['z'], math.radians(start['yaw']), args.goto_s)
+        time.sleep(args.goto_s + 0.5)
+
+        lc.start()
+        hl.start_trajectory(TRAJECTORY_ID, time_scale=args.time_scale)
+        # Nothing to stream: the onboard clock runs the trajectory, we just wait and log
+        time.sleep(pp.duration * args.time_scale + 0.5)
+        lc.stop()
+
+        hl.land(0.0, args.land_s)
+        time.sleep(args.land_s + 0.2)
+        hl.stop()
+
+    if rows:
+        r = np.array(rows, dtype=float)
+        err = np.linalg.norm(r[:, 1:4] - r[:, 4:7], axis=1)
+        span = (r[-1, 0] - r[0, 0]) / 1000.0
+        print(f'Tracking over {span:.2f} s firmware time ({len(r)} samples): '
+              f'rms {np.sqrt(np.mean(err ** 2)) * 1000:.1f} mm, max {err.max() * 1000:.1f} mm '
+              f'from the onboard target')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Fly the same kind of world-frame trajectories as test_seq.py on several
+Crazyflies at once, from one setpoint scheduler (cftools.fleet).
+
+- One --uri per vehicle; --csv / --length give one trajectory each, or a
+  single one that every vehicle flies
+- --stagger_s starts vehicle i at i * stagger_s on the shared time base
+- --log_dir writes one CSV per vehicle (t_sec on the shared host clock)
+- Requires: commander.enHighLevel = 0  and  flightmode.posSet = 1 (set here)
+
+Examples:
+    python test_seq_multi.py --uri radio://0/80/2M/E7E7E7E701 --uri radio://0/80/2M/E7E7E7E702 \\
+        --length 0.35 --stagger_s 0.5 --log_dir ../Logs/fleet
+    python test_seq_multi.py --uri radio://0/80/2M/E7E7E7E701 --uri radio://0/80/2M/E7E7E7E702 \\
+        --csv Traj.csv --setpoints fullstate
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # for cftools
+
+import cflib.crtp
+
+from cftools.fleet import FleetRunner
+from cftools.matimport import load_trajectory
+from cftools.scheduler import OVERRUN_POLICIES
+from cftools.spline import SplineTrajectory
+from cftools.trajectory import Trajectory
+
+
+def build_trajectories(args, n):
+    if args.csv:
+        trajs = [Trajectory.from_csv(p) for p in args.csv]
+    else:
+        trajs = [load_trajectory(length=L, rate_hz=100.0) for L in (args.length or [0.35])]
+    if len(trajs) == 1:
+        trajs = trajs * n
+    if len(trajs) != n:
+        raise SystemExit(f'{n} vehicles need 1 or {n} trajectories, got {len(trajs)}')
+    if args.setpoints == 'fullstate':
+        return [SplineTrajectory.from_trajectory(tr) for tr in trajs]
+    # Separate objects: every vehicle keeps its own sampling cursor
+    return [Trajectory(tr.t, tr.x, tr.y, tr.z, tr.yaw, vy=tr.vy, vy_mode=tr.vy_mode) for tr in trajs]
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--uri', action='append', required=True, help='repeat once per vehicle')
+    p.add_argument('--csv', action='append', default=[], help='time_s,x,y,z,yaw_deg CSV (repeatable)')
+    p.add_argument('--length', type=float, action='append', default=[],
+                   help='MATLAB optimal run for this pendulum length (m, repeatable)')
+    p.add_argument('--setpoints', choices=('position', 'fullstate'), default='position')
+    p.add_argument('--stagger_s', type=float, default=0.0, help='start offset between vehicles')
+    p.add_argument('--rate_hz', type=float, default=25.0)
+    p.add_argument('--log_hz', type=float, default=50.0)
+    p.add_argument('--log_dir', default='', help='one CSV per vehicle (no logging if empty)')
+    p.add_argument('--takeoff_s', type=float, default=2.0)
+    p.add_argument('--land_s', type=float, default=2.0)
+    p.add_argument('--no_reset', action='store_true', help='skip Kalman reset if you prefer')
+    p.add_argument('--overrun', choices=OVERRUN_POLICIES, default='skip',
+                   help='what to do with missed setpoint deadlines')
+    args = p.parse_args()
+
+    trajs = build_trajectories(args, len(args.uri))
+    offsets = [i * args.stagger_s for i in range(len(args.uri))]
+
+    cflib.crtp.init_drivers(enable_debug_driver=False)
+
+    runner = FleetRunner(args.uri, trajs, offsets=offsets, rate_hz=args.rate_hz,
+                         log_hz=args.log_hz, log_dir=args.log_dir or None, overrun=args.overrun)
+    if runner.rate_hz < args.rate_hz:
+        print(f'{len(args.uri)} vehicles do not fit one radio at {args.rate_hz:g} Hz; '
+              f'streaming at {runner.rate_hz:.1f} Hz')
+    with runner:
+        report = runner.run(takeoff_s=args.takeoff_s, land_s=args.land_s,
+                            reset_estimator=not args.no_reset)
+    print(report.summary())
+
+
+if __name__ == '__main__':
+    main()
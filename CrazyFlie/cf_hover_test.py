@@ -1,27 +1,31 @@
 #!/usr/bin/env python3
 import argparse, csv, sys, time
 from pathlib import Path
-from threading import Event, Lock
+from threading import Event
 
 import cflib.crtp
-from cflib.crazyflie import Crazyflie
-from cflib.crazyflie.log import LogConfig
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.positioning.motion_commander import MotionCommander
 
-DEFAULT_URI = "radio://0/80/2M/E7E7E7E7E7"
+from cftools.binlog import BINLOG_SUFFIX, BinLogWriter
+from cftools.logplan import load_log_toc, plan_log_blocks
+from cftools.logsink import SINK_POLICIES, LogSink
+from cftools.merge import MERGE_MODES, SampleMerger
+from cftools.toccache import make_crazyflie
 
-def make_log_configs(period_ms: int):
-    lg_est = LogConfig(name='est', period_in_ms=period_ms)
-    for v in ['stateEstimate.x','stateEstimate.y','stateEstimate.z',
-              'stateEstimate.vx','stateEstimate.vy','stateEstimate.vz']:
-        lg_est.add_variable(v, 'float')
+DEFAULT_URI = "radio://0/80/2M/E7E7E7E7E7"
 
-    lg_imu = LogConfig(name='imu', period_in_ms=period_ms)
-    for v in ['acc.x','acc.y','acc.z']:
-        lg_imu.add_variable(v, 'float')
+# CSV column -> log variable
+LOG_COLUMNS = {'x': 'stateEstimate.x', 'y': 'stateEstimate.y', 'z': 'stateEstimate.z',
+               'vx': 'stateEstimate.vx', 'vy': 'stateEstimate.vy', 'vz': 'stateEstimate.vz',
+               'ax': 'acc.x', 'ay': 'acc.y', 'az': 'acc.z'}
 
-    return lg_est, lg_imu
+def make_log_configs(period_ms: int, columns=LOG_COLUMNS, precision=None):
+    # Pack the variables into as few one-packet blocks as fit (types from the TOC cache)
+    toc = load_log_toc() or None
+    plan = plan_log_blocks([(v, 1000.0 / period_ms, precision) for v in columns.values()], toc=toc)
+    print(plan.summary())
+    return plan.log_configs()
 
 def main():
     ap = argparse.ArgumentParser()
@@ -34,92 +38,92 @@ def main():
     ap.add_argument('--hover_s', type=float, default=15.0)
     ap.add_argument('--warmup_s', type=float, default=2.0)
     ap.add_argument('--land_extra_s', type=float, default=1.5)
+    ap.add_argument('--log_policy', choices=SINK_POLICIES, default='drop',
+                    help='what the log sink does when its buffer is full')
+    ap.add_argument('--fp16', action='store_true',
+                    help='fetch float variables as FP16 (half the bytes, ~0.05%% precision)')
+    ap.add_argument('--extra_vars', default='',
+                    help='comma-separated extra log variables, e.g. pm.vbat,stabilizer.roll')
+    ap.add_argument('--merge', choices=MERGE_MODES, default='hold',
+                    help='how values of blocks missing from a sample instant are filled')
     args = ap.parse_args()
 
     period_ms = max(10, int(1000.0 / args.rate_hz))  # cap silly values
 
     cflib.crtp.init_drivers(enable_debug_driver=False)
 
-    headers = ['t_sec','label','x','y','z','vx','vy','vz','ax','ay','az']
+    columns = dict(LOG_COLUMNS)
+    columns.update({v: v for v in args.extra_vars.split(',') if v})
+    # t_sec is firmware time, t_host the host monotonic time the sample arrived
+    headers = ['t_sec','label','t_host'] + list(columns)
     outfile = Path(args.outfile)
 
-    with SyncCrazyflie(args.uri, cf=Crazyflie(rw_cache='./cache')) as scf, \
-         open(outfile, 'w', newline='') as f_csv:
+    # A .cflog outfile gets the compact binary format (label/uri/rate stored once in the header)
+    if outfile.suffix == BINLOG_SUFFIX:
+        f_out = BinLogWriter(outfile, [h for h in headers if h != 'label'],
+                             meta={'label': args.label, 'uri': args.uri, 'rate_hz': 1000.0 / period_ms})
+        writer, format_row = f_out, None
+    else:
+        f_out = open(outfile, 'w', newline='')
+        writer = csv.writer(f_out); writer.writerow(headers)
+        format_row = lambda r: [f'{r[0]:.6f}', args.label, f'{r[1]:.6f}', *r[2:]]
+
+    # f_out is entered first so it is closed (a .cflog finalized) even if connecting fails,
+    # and the LogSink block inside drains the ring into it before that
+    with f_out, SyncCrazyflie(args.uri, cf=make_crazyflie()) as scf:
 
         cf = scf.cf
-        writer = csv.writer(f_csv); writer.writerow(headers)
-
-        lg_est, lg_imu = make_log_configs(period_ms)
-
-        # Shared state for merging packets from both log blocks
-        t0 = time.monotonic()
-        latest = {'x': float('nan'),'y': float('nan'),'z': float('nan'),
-                  'vx': float('nan'),'vy': float('nan'),'vz': float('nan'),
-                  'ax': float('nan'),'ay': float('nan'),'az': float('nan')}
-        lock = Lock()
-
-        def write_row():
-            t = time.monotonic() - t0
-            writer.writerow([f'{t:.6f}', args.label,
-                             latest['x'], latest['y'], latest['z'],
-                             latest['vx'], latest['vy'], latest['vz'],
-                             latest['ax'], latest['ay'], latest['az']])
-
-        def on_est(ts, data, name):
-            with lock:
-                latest['x']  = data.get('stateEstimate.x', latest['x'])
-                latest['y']  = data.get('stateEstimate.y', latest['y'])
-                latest['z']  = data.get('stateEstimate.z', latest['z'])
-                latest['vx'] = data.get('stateEstimate.vx', latest['vx'])
-                latest['vy'] = data.get('stateEstimate.vy', latest['vy'])
-                latest['vz'] = data.get('stateEstimate.vz', latest['vz'])
-                write_row()
-
-        def on_imu(ts, data, name):
-            with lock:
-                latest['ax'] = data.get('acc.x', latest['ax'])
-                latest['ay'] = data.get('acc.y', latest['ay'])
-                latest['az'] = data.get('acc.z', latest['az'])
-                write_row()
+        log_configs = make_log_configs(period_ms, columns, precision='fp16' if args.fp16 else None)
 
         def on_err(lc, msg):
             print(f'[log error:{lc.name}] {msg}', file=sys.stderr)
 
-        try:
-            cf.log.add_config(lg_est)
-            cf.log.add_config(lg_imu)
-        except KeyError as e:
-            print("A variable wasn’t found. Ensure firmware exposes stateEstimate.* and acc.*", e)
-            sys.exit(1)
-
-        lg_est.data_received_cb.add_callback(on_est)
-        lg_imu.data_received_cb.add_callback(on_imu)
-        lg_est.error_cb.add_callback(on_err)
-        lg_imu.error_cb.add_callback(on_err)
-
-        print(f'Start logging at ~{1000/period_ms:.1f} Hz (split across two blocks)…')
-        lg_est.start(); lg_imu.start()
-        time.sleep(max(0.0, args.warmup_s))
-
-        if args.do_hover:
-            print("Takeoff / hover / land…")
-            with MotionCommander(scf, default_height=args.height) as mc:
-                # We are already airborne at ~args.height here.
-                print(f"Hovering at ~{args.height:.2f} m for {args.hover_s:.1f} s…")
-                time.sleep(max(0.0, args.hover_s))
-
-                print("Landing…")
-                mc.land(velocity=0.3)
-                time.sleep(max(0.0, args.land_extra_s))
-        else:
-            print('Logging only. Ctrl+C to stop.')
+        # Rows are formatted and written on a background thread, not in the callbacks
+        with LogSink(writer, fileobj=f_out, policy=args.log_policy, format_row=format_row) as sink:
+            # One row per firmware sample instant, merged across all log blocks
+            merger = SampleMerger(columns, emit=sink.put, blocks=[lc.name for lc in log_configs],
+                                  mode=args.merge)
             try:
-                while True: time.sleep(0.2)
-            except KeyboardInterrupt:
-                pass
-
-        print('Stopping logs…')
-        lg_imu.stop(); lg_est.stop()
+                try:
+                    for lc in log_configs:
+                        cf.log.add_config(lc)
+                except KeyError as e:
+                    print("A variable wasn’t found. Ensure firmware exposes stateEstimate.* and acc.*", e)
+                    sys.exit(1)
+
+                for lc in log_configs:
+                    lc.data_received_cb.add_callback(merger.on_packet)
+                    lc.error_cb.add_callback(on_err)
+
+                print(f'Start logging at ~{1000/period_ms:.1f} Hz ({len(log_configs)} blocks)…')
+                for lc in log_configs:
+                    lc.start()
+                time.sleep(max(0.0, args.warmup_s))
+
+                if args.do_hover:
+                    print("Takeoff / hover / land…")
+                    with MotionCommander(scf, default_height=args.height) as mc:
+                        # We are already airborne at ~args.height here.
+                        print(f"Hovering at ~{args.height:.2f} m for {args.hover_s:.1f} s…")
+                        time.sleep(max(0.0, args.hover_s))
+
+                        print("Landing…")
+                        mc.land(velocity=0.3)
+                        time.sleep(max(0.0, args.land_extra_s))
+                else:
+                    print('Logging only. Ctrl+C to stop.')
+                    try:
+                        while True: time.sleep(0.2)
+                    except KeyboardInterrupt:
+                        pass
+
+                print('Stopping logs…')
+                for lc in log_configs:
+                    lc.stop()
+            finally:
+                merger.flush()
+        print(merger.summary())
+        print(sink.summary())
 
     print(f'Saved: {outfile.resolve()}')
 
@@ -0,0 +1,32 @@
+"""
+Shared host-side helpers for the Crazyflie flight scripts.
+
+Scripts in this folder import it directly; scripts in Tests/ and
+BITCRAZE_Tutos/ put the parent folder on sys.path first.
+
+Modules:
+- trajectory : compiled (x, y, z, yaw, vy) trajectory with fast sampling
+- scheduler  : absolute-deadline loop pacing with per-tick timing stats
+- logsink    : ring-buffered background writer for log callbacks
+- binlog     : compact .cflog binary flight-log format and CSV converters
+- logplan    : bin-packs log variables into payload-sized LogConfig blocks
+- merge      : merges log blocks into one row per firmware timestamp
+- pendulum_sim : vectorized drone + pendulum model (RK4 / adaptive DP45)
+- simlink    : sim:// cflib link driver with a simulated vehicle, script launcher
+- bench      : host-side hot-path and end-to-end benchmarks (JSON results)
+- matimport  : MATLAB optimal-trajectory .mat importer with a compiled .npz cache
+- simplify   : error-bounded (RDP) knot reduction of dense trajectories
+- polytraj   : piecewise 7th-order polynomial fit, trajectory-memory packing and upload
+- spline     : C2 cubic-spline trajectory with analytic velocity and acceleration
+- fleet      : multi-vehicle runner streaming all setpoints from one shared scheduler
+- executive  : asyncio flight phases, log streams and abort-to-land safety monitors
+- logstats   : parallel batch hover-log analytics cached by file content hash
+- logplot    : headless min/max or LTTB decimated log plots, batch PNG/SVG export
+- dashboard  : live blitted telemetry/setpoint plots from a lock-free ring, log replay
+- toccache   : shared binary TOC cache keyed by CRC, lazy element lookup, hit/miss timing
+- startup    : startup/connect phase waterfall (imports, link, TOC, configure), JSON output
+- params     : batched parameter writes confirmed by the vehicle echo, per-write latency
+- estimator  : Kalman reset with a variance/position-spread readiness gate (no fixed settle sleep)
+- recorder   : bounded streaming CSV telemetry recorder with periodic fsync and an end-of-run footer
+- latency    : per-axis setpoint-to-estimate lag (xcorr + FOPDT fit, bootstrap CIs), measured vy_ff
+"""
@@ -0,0 +1,400 @@
+"""
+Benchmarks for the host-side streaming and logging paths.
+
+Microbenchmarks (per call, median of 'repeat' runs):
+- trajectory.sample / trajectory.sample_many : setpoint sampling (was interp_sample)
+- load_csv                                   : Trajectory.from_csv on Tests/Traj.csv
+- on_est.inline_csv                          : the original callback (lock, dict updates,
+                                               csv.writerow on the callback thread)
+- on_est.sink                                : same callback handing rows to LogSink
+- on_packet.merger                           : SampleMerger.on_packet (cf_hover_test.py)
+- write_row                                  : LogSink.put
+- writer.csv / writer.binlog                 : rows/s of the CSV and .cflog writers
+- parse.csv / parse.cflog / plot.load        : per file in Logs/ (pandas, .cflog, headless plot)
+
+End-to-end scenarios (default 25, 50 and 100 Hz) connect to the sim:// link
+(cftools.simlink), log the hover columns through planner -> merger -> sink
+and stream position setpoints from Traj.csv on a DeadlineScheduler. They
+report setpoint rate and jitter, callback cost per packet and rows written.
+
+Results are saved as JSON so runs can be compared over time.
+
+CLI (from the CrazyFlie folder):
+    python -m cftools.bench                       # everything, saved to bench_results/
+    python -m cftools.bench --quick --only micro
+    python -m cftools.bench --compare bench_results/bench_20250101-120000.json
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from threading import Lock
+
+ROOT = Path(__file__).resolve().parent.parent
+TRAJ_CSV = ROOT / 'Tests' / 'Traj.csv'
+LOGS_DIR = ROOT / 'Logs'
+RESULTS_DIR = ROOT / 'bench_results'
+E2E_RATES = (25.0, 50.0, 100.0)
+
+# Same columns as cf_hover_test.py
+BENCH_COLUMNS = {'x': 'stateEstimate.x', 'y': 'stateEstimate.y', 'z': 'stateEstimate.z',
+                 'vx': 'stateEstimate.vx', 'vy': 'stateEstimate.vy', 'vz': 'stateEstimate.vz',
+                 'ax': 'acc.x', 'ay': 'acc.y', 'az': 'acc.z'}
+
+
+def _time_calls(fn, number, repeat=5):
+    """Median/best seconds per call of fn() over 'repeat' runs of 'number' calls."""
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - t0) / number)
+    med = statistics.median(runs)
+    return {'per_call_us': med * 1e6, 'best_us': min(runs) * 1e6,
+            'calls_per_s': 1.0 / med if med > 0 else float('inf'), 'number': number, 'repeat': repeat}
+
+
+def _time_once(fn, repeat=3):
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return {'median_ms': statistics.median(runs) * 1e3, 'best_ms': min(runs) * 1e3, 'repeat': repeat}
+
+
+def _percentiles_us(samples_ns):
+    s = sorted(samples_ns)
+    if not s:
+        return {}
+    pick = lambda q: s[min(len(s) - 1, int(q / 100.0 * len(s)))] / 1e3
+    return {'p50_us': pick(50), 'p95_us': pick(95), 'p99_us': pick(99), 'max_us': s[-1] / 1e3, 'n': len(s)}
+
+
+# ---------- microbenchmarks ----------
+
+def bench_trajectory(scale=1.0):
+    import numpy as np
+    from cftools.trajectory import Trajectory
+
+    out = {'load_csv': _time_calls(lambda: Trajectory.from_csv(TRAJ_CSV), max(1, int(200 * scale)))}
+    traj = Trajectory.from_csv(TRAJ_CSV)
+    dt = 0.004
+    state = {'t': traj.t_start}
+
+    def step():
+        state['t'] += dt
+        if state['t'] > traj.t_end:
+            state['t'] = traj.t_start
+        traj.sample(state['t'])
+
+    out['trajectory.sample'] = _time_calls(step, max(1, int(50000 * scale)))
+    times = np.linspace(traj.t_start, traj.t_end, 10000)
+    r = _time_calls(lambda: traj.sample_many(times), max(1, int(50 * scale)))
+    r['per_sample_us'] = r['per_call_us'] / len(times)
+    out['trajectory.sample_many'] = r
+    return out
+
+
+def _legacy_state():
+    nan = float('nan')
+    return {k: nan for k in BENCH_COLUMNS}
+
+
+def bench_callbacks(scale=1.0):
+    from cftools.logsink import LogSink
+    from cftools.merge import SampleMerger
+
+    n = max(1, int(50000 * scale))
+    est = {'stateEstimate.x': 0.1, 'stateEstimate.y': -0.2, 'stateEstimate.z': 0.35,
+           'stateEstimate.vx': 0.01, 'stateEstimate.vy': 0.02, 'stateEstimate.vz': -0.01}
+    imu = {'acc.x': 0.01, 'acc.y': -0.02, 'acc.z': 1.0}
+    out = {}
+
+    # Original pattern: format and write the row while holding the lock
+    latest, lock, t0 = _legacy_state(), Lock(), time.monotonic()
+    buf = io.StringIO()
+    w = csv.writer(buf)
+
+    def on_est_inline():
+        with lock:
+            latest['x'] = est.get('stateEstimate.x', latest['x'])
+            latest['y'] = est.get('stateEstimate.y', latest['y'])
+            latest['z'] = est.get('stateEstimate.z', latest['z'])
+            latest['vx'] = est.get('stateEstimate.vx', latest['vx'])
+            latest['vy'] = est.get('stateEstimate.vy', latest['vy'])
+            latest['vz'] = est.get('stateEstimate.vz', latest['vz'])
+            w.writerow([f'{time.monotonic() - t0:.6f}', 'bench', latest['x'], latest['y'], latest['z'],
+                        latest['vx'], latest['vy'], latest['vz'], latest['ax'], latest['ay'], latest['az']])
+            if buf.tell() > 1 << 20:
+                buf.seek(0)
+                buf.truncate()
+
+    out['on_est.inline_csv'] = _time_calls(on_est_inline, n)
+
+    devnull = open(os.devnull, 'w', newline='')
+    sink = LogSink(csv.writer(devnull), capacity=1 << 16,
+                   format_row=lambda r: [f'{r[0]:.6f}', 'bench', *r[1:]]).start()
+
+    def on_est_sink():
+        with lock:
+            latest['x'] = est.get('stateEstimate.x', latest['x'])
+            latest['y'] = est.get('stateEstimate.y', latest['y'])
+            latest['z'] = est.get('stateEstimate.z', latest['z'])
+            latest['vx'] = est.get('stateEstimate.vx', latest['vx'])
+            latest['vy'] = est.get('stateEstimate.vy', latest['vy'])
+            latest['vz'] = est.get('stateEstimate.vz', latest['vz'])
+            sink.put((time.monotonic() - t0, latest['x'], latest['y'], latest['z'],
+                      latest['vx'], latest['vy'], latest['vz'],
+                      latest['ax'], latest['ay'], latest['az']))
+
+    out['on_est.sink'] = _time_calls(on_est_sink, n)
+    row = (0.0,) + tuple(range(9))
+    out['write_row'] = _time_calls(lambda: sink.put(row), n)
+    sink.close()
+    devnull.close()
+    out['write_row']['dropped'] = sink.dropped
+
+    # Merger: two blocks alternating, 10 ms apart
+    merger = SampleMerger(BENCH_COLUMNS, emit=lambda r: None, blocks=['est', 'imu'])
+    clock = {'ts': 0, 'k': 0}
+
+    def on_packet():
+        k = clock['k'] = clock['k'] + 1
+        if k & 1:
+            clock['ts'] += 10
+            merger.add(clock['ts'], est, 'est')
+        else:
+            merger.add(clock['ts'], imu, 'imu')
+
+    out['on_packet.merger'] = _time_calls(on_packet, n)
+    return out
+
+
+def bench_writers(scale=1.0):
+    from cftools.binlog import BinLogWriter
+
+    rows = [(k * 0.01, 0.1, -0.2, 0.35, 0.01, 0.02, -0.01, 0.01, -0.02, 1.0) for k in range(10000)]
+    names = ['t_sec', 'x', 'y', 'z', 'vx', 'vy', 'vz', 'ax', 'ay', 'az']
+    repeat = max(1, int(5 * scale))
+    out = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        def write_csv():
+            with open(Path(tmp) / 'b.csv', 'w', newline='') as f:
+                w = csv.writer(f)
+                w.writerow(names[:1] + ['label'] + names[1:])
+                w.writerows([f'{r[0]:.6f}', 'bench', *r[1:]] for r in rows)
+
+        def write_bin():
+            with BinLogWriter(Path(tmp) / 'b.cflog', names, meta={'label': 'bench'}) as w:
+                for k in range(0, len(rows), 256):
+                    w.writerows(rows[k:k + 256])
+
+        for name, fn in (('writer.csv', write_csv), ('writer.binlog', write_bin)):
+            r = _time_once(fn, repeat)
+            r['rows_per_s'] = len(rows) / (r['median_ms'] / 1e3)
+            out[name] = r
+    return out
+
+
+def bench_log_files(logs_dir=LOGS_DIR, repeat=3, plots=True):
+    """Parse (and headless plot) timings per log file."""
+    import pandas as pd
+    from cftools.binlog import csv_to_binlog, read_dataframe
+
+    files = sorted(Path(logs_dir).glob('*.csv'))
+    out = {}
+    if plots:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        if str(ROOT) not in sys.path:
+            sys.path.insert(0, str(ROOT))
+        from hover_log_plot import plot_hover_log
+
+        def plot(path):
+            plot_hover_log(str(path))
+            fig = plt.gcf()
+            fig.canvas.draw()
+            plt.close('all')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in files:
+            entry = {'kb': path.stat().st_size / 1024}
+            entry['parse.csv'] = _time_once(lambda: pd.read_csv(path), repeat)
+            binp = csv_to_binlog(path, Path(tmp) / (path.stem + '.cflog'))
+            entry['parse.cflog'] = _time_once(lambda: read_dataframe(binp), repeat)
+            if plots:
+                try:
+                    entry['plot.load'] = _time_once(lambda: plot(path), repeat)
+                except KeyError as e:             # not a hover log layout
+                    entry['plot.load'] = {'skipped': f'missing column {e}'}
+            out[path.name] = entry
+    return out
+
+
+# ---------- end-to-end against the sim link ----------
+
+def run_scenario(rate_hz, duration_s=5.0, uri='sim://0'):
+    """Stream setpoints at rate_hz while logging at rate_hz through the sim link."""
+    from cflib.crazyflie import Crazyflie
+    from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+
+    from cftools import simlink
+    from cftools.logplan import load_log_toc, plan_log_blocks
+    from cftools.logsink import LogSink
+    from cftools.merge import SampleMerger
+    from cftools.scheduler import DeadlineScheduler
+    from cftools.trajectory import Trajectory
+
+    simlink.register()                 # sim:// needs no other drivers
+    traj = Trajectory.from_csv(TRAJ_CSV)
+    cache = str(ROOT / 'cache')
+
+    t_conn = time.perf_counter()
+    with SyncCrazyflie(uri, cf=Crazyflie(rw_cache=cache)) as scf, \
+            tempfile.TemporaryDirectory() as tmp, open(Path(tmp) / 'e2e.csv', 'w', newline='') as f:
+        connect_s = time.perf_counter() - t_conn
+        cf = scf.cf
+        plan = plan_log_blocks([(v, rate_hz) for v in BENCH_COLUMNS.values()], toc=load_log_toc(cache) or None)
+        configs = plan.log_configs()
+        sink = LogSink(csv.writer(f), fileobj=f, format_row=lambda r: [f'{r[0]:.6f}', 'bench', *r[1:]]).start()
+        merger = SampleMerger(BENCH_COLUMNS, emit=sink.put, blocks=[lc.name for lc in configs])
+        cb_ns = []
+
+        def on_packet(ts, data, logconf):
+            t0 = time.perf_counter_ns()
+            merger.on_packet(ts, data, logconf)
+            cb_ns.append(time.perf_counter_ns() - t0)
+
+        for lc in configs:
+            cf.log.add_config(lc)
+            lc.data_received_cb.add_callback(on_packet)
+            lc.start()
+
+        sched = DeadlineScheduler(rate_hz, name=f'e2e_{rate_hz:g}Hz')
+        sched.start()
+        for _ in range(int(duration_s * rate_hz)):
+            t = traj.t_start + sched.elapsed() % traj.duration
+            s = traj.sample(t)
+            cf.commander.send_position_setpoint(s['x'], s['y'], s['z'], s['yaw'])
+            sched.wait()
+        cf.commander.send_stop_setpoint()
+
+        for lc in configs:
+            lc.stop()
+        merger.flush()
+        sink.close()
+
+    return {'rate_hz': rate_hz, 'duration_s': duration_s, 'connect_s': connect_s,
+            'log_blocks': len(configs), 'setpoints': sched.stats.as_dict(),
+            'callback': _percentiles_us(cb_ns), 'packets': merger.packets, 'rows': merger.rows,
+            'rows_per_s': merger.rows / duration_s, 'sink': sink.stats()}
+
+
+# ---------- runner ----------
+
+def _meta():
+    meta = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split()[0],
+            'platform': platform.platform(), 'machine': platform.machine()}
+    try:
+        meta['git'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                     text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        pass
+    for mod in ('numpy', 'pandas', 'cflib'):
+        try:
+            meta[mod] = __import__(mod).__version__
+        except (ImportError, AttributeError):
+            pass
+    return meta
+
+
+def run_all(only=None, quick=False, rates=E2E_RATES, duration_s=5.0, plots=True):
+    scale = 0.1 if quick else 1.0
+    results = {'meta': _meta()}
+    if only in (None, 'micro'):
+        micro = {}
+        micro.update(bench_trajectory(scale))
+        micro.update(bench_callbacks(scale))
+        micro.update(bench_writers(scale))
+        results['micro'] = micro
+        results['logs'] = bench_log_files(repeat=1 if quick else 3, plots=plots)
+    if only in (None, 'e2e'):
+        results['e2e'] = [run_scenario(r, duration_s=min(duration_s, 2.0) if quick else duration_s)
+                          for r in rates]
+    return results
+
+
+def format_report(results, previous=None):
+    lines = []
+    prev_micro = (previous or {}).get('micro', {})
+    if 'micro' in results:
+        lines.append(f"{'microbenchmark':28s} {'us/call':>10s} {'calls/s':>12s}" + ('  vs prev' if previous else ''))
+        for name, r in results['micro'].items():
+            if 'per_call_us' in r:
+                line = f"{name:28s} {r['per_call_us']:10.2f} {r['calls_per_s']:12.0f}"
+                p = prev_micro.get(name, {}).get('per_call_us')
+            else:
+                line = f"{name:28s} {r['median_ms']:8.2f}ms {r['rows_per_s']:10.0f}r/s"
+                p = prev_micro.get(name, {}).get('median_ms')
+                r = {'per_call_us': r['median_ms']}
+            if p:
+                line += f"  x{p / r['per_call_us']:.2f}"
+            lines.append(line)
+    if results.get('logs'):
+        lines.append(f"\n{'log file':28s} {'kB':>7s} {'csv ms':>8s} {'cflog ms':>9s} {'plot ms':>8s}")
+        for name, e in results['logs'].items():
+            plot = e.get('plot.load', {}).get('median_ms', float('nan'))
+            lines.append(f"{name:28s} {e['kb']:7.0f} {e['parse.csv']['median_ms']:8.1f} "
+                         f"{e['parse.cflog']['median_ms']:9.2f} {plot:8.1f}")
+    for s in results.get('e2e', []):
+        sp, cb = s['setpoints'], s['callback']
+        lines.append(f"\n[e2e {s['rate_hz']:g} Hz] setpoints {sp['achieved_hz']:.1f} Hz, jitter p50/p99 "
+                     f"{sp['jitter_p50_ms']:.2f}/{sp['jitter_p99_ms']:.2f} ms, overruns {sp['overruns']}; "
+                     f"callback p50/p99 {cb.get('p50_us', float('nan')):.1f}/{cb.get('p99_us', float('nan')):.1f} us; "
+                     f"{s['packets']} packets -> {s['rows']} rows ({s['rows_per_s']:.1f}/s), "
+                     f"dropped {s['sink']['dropped']}, connect {s['connect_s']:.2f} s")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Host-side streaming/logging benchmarks')
+    ap.add_argument('--only', choices=['micro', 'e2e'], default=None)
+    ap.add_argument('--quick', action='store_true', help='fewer iterations, 2 s scenarios')
+    ap.add_argument('--rates', type=float, nargs='+', default=list(E2E_RATES))
+    ap.add_argument('--duration_s', type=float, default=5.0, help='length of each end-to-end scenario')
+    ap.add_argument('--no_plots', action='store_true', help='skip the headless plot timings')
+    ap.add_argument('--out', default=str(RESULTS_DIR), help='folder for the JSON results')
+    ap.add_argument('--compare', default=None, help='previous results JSON to compare against')
+    args = ap.parse_args(argv)
+
+    results = run_all(only=args.only, quick=args.quick, rates=args.rates,
+                      duration_s=args.duration_s, plots=not args.no_plots)
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)
+    print(format_report(results, previous))
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out = out_dir / f"bench_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f'\nSaved: {out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Compact append-only binary flight log (.cflog) with CSV/pandas converters.
+
+The CSV logs store every float as full-precision repr text and repeat the
+label on every row. A .cflog file is:
+
+    b'CFLOG\\x00\\x01\\x00'            8-byte magic + format version
+    uint32 little-endian              length of the JSON header in bytes
+    JSON header                       {"columns": [[name, dtype], ...], "meta": {...}}
+    padding to an 8-byte boundary
+    fixed-width records               one NumPy structured record per sample
+
+Run metadata (label, uri, rate_hz, ...) lives once in the header. The record
+count is derived from the file size, so the file is valid after every append
+and a partially written last record (crash mid-write) is simply ignored.
+
+Log values arrive from cflib as float32 upcast to Python floats, so storing
+them as float32 is lossless; the time column is kept as float64.
+
+Usage:
+    with BinLogWriter('run.cflog', ['t_sec', 'x', 'y'], meta={'label': 'pidA'}) as w:
+        w.writerows([(0.0, 1.0, 2.0), ...])
+    arr, meta = read_binlog('run.cflog')     # memory-mapped structured array
+    df = read_dataframe('run.cflog')         # pandas, label restored from meta
+
+CLI (run from the CrazyFlie folder):
+    python -m cftools.binlog to-bin Logs/*.csv
+    python -m cftools.binlog to-csv Logs/hover_log_2_3.cflog
+"""
+
+import argparse
+import csv
+import json
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b'CFLOG\x00\x01\x00'
+BINLOG_SUFFIX = '.cflog'
+TIME_COLUMNS = ('t_sec', 't', 'time_s', 't_fw', 't_host')
+
+
+def _record_dtype(columns):
+    return np.dtype([(name, dt) for name, dt in columns])
+
+
+def default_columns(names, float_dtype='<f4', time_dtype='<f8'):
+    """(name, dtype) pairs: time-like columns get time_dtype, everything else float_dtype."""
+    return [(n, time_dtype if n in TIME_COLUMNS else float_dtype) for n in names]
+
+
+class BinLogWriter:
+    """
+    Append-only .cflog writer. Has writerows() so it can stand in for a
+    csv.writer behind cftools.logsink.LogSink.
+    """
+
+    def __init__(self, path, columns, meta=None, float_dtype='<f4'):
+        self.path = Path(path)
+        if columns and isinstance(columns[0], str):
+            columns = default_columns(columns, float_dtype=float_dtype)
+        self.columns = [(str(n), np.dtype(dt).str) for n, dt in columns]
+        self.dtype = _record_dtype(self.columns)
+        self.meta = dict(meta or {})
+        self.rows = 0
+
+        header = json.dumps({'columns': self.columns, 'meta': self.meta}).encode('utf-8')
+        pad = (-(len(MAGIC) + 4 + len(header))) % 8
+        self._f = open(self.path, 'wb')
+        self._f.write(MAGIC + struct.pack('<I', len(header) + pad) + header + b' ' * pad)
+
+    def writerow(self, row):
+        self.writerows([row])
+
+    def writerows(self, rows):
+        arr = np.array([tuple(r) for r in rows], dtype=self.dtype)
+        self._f.write(arr.tobytes())
+        self.rows += len(arr)
+
+    def write_array(self, arr):
+        """Append a structured array (or a 2-D float array with one column per field)."""
+        arr = np.asarray(arr)
+        if arr.dtype.names is None:
+            rec = np.empty(len(arr), dtype=self.dtype)
+            for k, (name, _) in enumerate(self.columns):
+                rec[name] = arr[:, k]
+            arr = rec
+        self._f.write(arr.astype(self.dtype, copy=False).tobytes())
+        self.rows += len(arr)
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_header(path):
+    """Return (columns, meta, data_offset) of a .cflog file."""
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        if magic[:6] != MAGIC[:6]:
+            raise ValueError(f"{path}: not a {BINLOG_SUFFIX} file")
+        if magic != MAGIC:
+            raise ValueError(f"{path}: unsupported {BINLOG_SUFFIX} version {magic[6:]!r}")
+        (hlen,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(hlen).decode('utf-8'))
+    columns = [(n, dt) for n, dt in header['columns']]
+    return columns, header.get('meta', {}), len(MAGIC) + 4 + hlen
+
+
+def read_binlog(path):
+    """
+    Memory-map a .cflog file. Returns (records, meta) where records is a
+    read-only structured array backed by the file (no parsing, no copy).
+    """
+    columns, meta, offset = read_header(path)
+    dtype = _record_dtype(columns)
+    n = (Path(path).stat().st_size - offset) // dtype.itemsize
+    if n <= 0:
+        return np.empty(0, dtype=dtype), meta
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(n,)), meta
+
+
+def read_dataframe(path, with_label=True):
+    """Load a .cflog into pandas; the header label becomes a categorical column."""
+    import pandas as pd
+
+    arr, meta = read_binlog(path)
+    cols = {name: arr[name] for name in arr.dtype.names}
+    df = pd.DataFrame(cols, copy=False)
+    if with_label:
+        labels = meta.get('labels')
+        if labels and 'label_id' in df:
+            df.insert(1, 'label', pd.Categorical.from_codes(df.pop('label_id').astype(int), labels))
+        elif 'label' in meta:
+            df.insert(1, 'label', pd.Categorical([meta['label']] * len(df)))
+    df.attrs['meta'] = meta
+    return df
+
+
+def load_log(path):
+    """pandas DataFrame from either a CSV log or a .cflog file (chosen by suffix)."""
+    if Path(path).suffix == BINLOG_SUFFIX:
+        return read_dataframe(path)
+    import pandas as pd
+    return pd.read_csv(path, comment='#')      # '#' lines: cftools.recorder footer
+
+
+# ---------- converters ----------
+
+def csv_to_binlog(csv_path, out_path=None, float_dtype='<f4', meta=None):
+    """
+    Convert a CSV log to .cflog. A constant 'label' column moves into the header;
+    several labels are stored as a label table plus a small integer label_id column.
+    """
+    csv_path = Path(csv_path)
+    out_path = Path(out_path) if out_path else csv_path.with_suffix(BINLOG_SUFFIX)
+    with open(csv_path, 'r', newline='', encoding='utf-8-sig') as f:
+        r = csv.reader(f)
+        names = next(r)
+        rows = [row for row in r if row and not row[0].startswith('#')]   # cftools.recorder footer
+
+    meta = dict(meta or {})
+    meta.setdefault('source', csv_path.name)
+    label_idx = names.index('label') if 'label' in names else None
+    value_names = [n for k, n in enumerate(names) if k != label_idx]
+    columns = default_columns(value_names, float_dtype=float_dtype)
+
+    label_ids = None
+    if label_idx is not None:
+        labels = list(dict.fromkeys(row[label_idx] for row in rows))
+        if len(labels) == 1:
+            meta.setdefault('label', labels[0])
+        elif labels:
+            meta['labels'] = labels
+            lookup = {lab: k for k, lab in enumerate(labels)}
+            label_ids = [lookup[row[label_idx]] for row in rows]
+            columns.append(('label_id', '<u2'))
+
+    values = [[float(v) if v != '' else float('nan') for k, v in enumerate(row) if k != label_idx]
+              for row in rows]
+    if label_ids is not None:
+        values = [v + [lid] for v, lid in zip(values, label_ids)]
+
+    with BinLogWriter(out_path, columns, meta=meta) as w:
+        if values:
+            w.writerows(values)
+    return out_path
+
+
+def binlog_to_csv(path, out_path=None):
+    """Convert a .cflog back to the CSV layout the plot scripts expect (label column restored)."""
+    path = Path(path)
+    out_path = Path(out_path) if out_path else path.with_suffix('.csv')
+    arr, meta = read_binlog(path)
+    names = [n for n in arr.dtype.names if n != 'label_id']
+    labels = meta.get('labels')
+    const_label = meta.get('label')
+    has_label = bool(labels) or const_label is not None
+    header = names[:1] + ['label'] + names[1:] if has_label else names
+
+    with open(out_path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        # float32 -> Python float reproduces the logged repr; times use the loggers' %.6f
+        cols = [[f'{v:.6f}' for v in arr[n].tolist()] if n in TIME_COLUMNS else arr[n].tolist()
+                for n in names]
+        lab = ([labels[i] for i in arr['label_id'].tolist()] if labels
+               else [const_label] * len(arr) if has_label else None)
+        for k in range(len(arr)):
+            row = [c[k] for c in cols]
+            if has_label:
+                row.insert(1, lab[k])
+            w.writerow(row)
+    return out_path
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Convert flight logs between CSV and .cflog')
+    ap.add_argument('direction', choices=['to-bin', 'to-csv'])
+    ap.add_argument('files', nargs='+')
+    ap.add_argument('--float64', action='store_true', help='store values as float64 instead of float32')
+    args = ap.parse_args(argv)
+
+    for p in args.files:
+        p = Path(p)
+        if args.direction == 'to-bin':
+            out = csv_to_binlog(p, float_dtype='<f8' if args.float64 else '<f4')
+        else:
+            out = binlog_to_csv(p)
+        print(f'{p} ({p.stat().st_size/1024:.0f} kB) -> {out} ({out.stat().st_size/1024:.0f} kB)')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""
+Live telemetry dashboard: position, velocity, acceleration and setpoints over a rolling window.
+
+The log callbacks write each row into a SnapshotRing: a preallocated NumPy
+array and a row counter, with one writer and no lock. The writer fills the
+slot first and bumps the counter after. The reader copies the rows below the
+counter, then drops any the writer may have overwritten meanwhile (it
+re-reads the counter after the copy). So drawing never holds up the cflib
+receive thread, and the receive thread never waits for a frame.
+
+Dashboard draws the last window_s seconds at the full log rate, against
+"seconds before now", so the axes stay fixed and each frame only blits the
+lines onto a cached background. The background is redrawn only when a
+series leaves its y-range. Commanded setpoints (from the flight loop) are
+drawn dashed over the estimate.
+
+The same view replays a recorded CSV/.cflog log (t_sec, x..az and optional
+sp_x/sp_y/sp_z columns) in (scaled) real time.
+
+Usage, live (matplotlib wants the main thread, so fly in a worker thread):
+    dash = Dashboard()
+    dash.attach(cf, rate_hz=100)                 # log blocks -> dash.telemetry
+    ex = FlightExecutive(cf, on_setpoint=dash.on_setpoint)
+    threading.Thread(target=fly, daemon=True).start()
+    dash.show()
+
+CLI (from the CrazyFlie folder):
+    python -m cftools.dashboard --replay Logs/hover_log_2_3.csv --speed 2
+    python -m cftools.dashboard --uri radio://0/80/2M      # watch only, no flight
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+import numpy as np
+
+TELEMETRY_COLUMNS = ('t', 'x', 'y', 'z', 'vx', 'vy', 'vz', 'ax', 'ay', 'az')
+SETPOINT_COLUMNS = ('t', 'x', 'y', 'z')
+LOG_BLOCKS = {'dash_est': ['stateEstimate.x', 'stateEstimate.y', 'stateEstimate.z',
+                           'stateEstimate.vx', 'stateEstimate.vy', 'stateEstimate.vz'],
+              'dash_acc': ['acc.x', 'acc.y', 'acc.z']}
+G = 9.81
+
+# (panel title, y label, columns, setpoint columns)
+PANELS = [('Position', 'm', ('x', 'y', 'z'), ('x', 'y', 'z')),
+          ('Velocity', 'm/s', ('vx', 'vy', 'vz'), ()),
+          ('Acceleration', 'm/s²', ('ax', 'ay', 'az'), ())]
+
+
+class SnapshotRing:
+    """Fixed-size ring of float rows, one writer thread, readers take consistent snapshots."""
+
+    def __init__(self, columns, capacity=1 << 14):
+        self.columns = tuple(columns)
+        self.index = {c: k for k, c in enumerate(self.columns)}
+        self.capacity = capacity
+        self._data = np.full((capacity, len(self.columns)), np.nan)
+        self._n = 0                          # rows ever written; bumped after the slot is filled
+
+    def put(self, *row):
+        n = self._n
+        self._data[n % self.capacity] = row
+        self._n = n + 1
+
+    def __len__(self):
+        return min(self._n, self.capacity)
+
+    def snapshot(self, since=None):
+        """Copy of the committed rows in time order, optionally only those with t >= since."""
+        n = self._n
+        k = min(n, self.capacity)
+        i0 = n - k
+        if since is not None and k:
+            # rows are in time order: bisect the ring by slot instead of copying everything
+            idx = (np.arange(i0, n) % self.capacity)
+            first = int(np.searchsorted(self._data[idx, 0], since))
+            i0 += first
+        rows = self._data[np.arange(i0, n) % self.capacity].copy()
+        # Anything the writer reached during the copy may have been overwritten
+        lost = self._n - self.capacity - i0
+        return rows[lost:] if lost > 0 else rows
+
+
+class Dashboard:
+    def __init__(self, window_s=10.0, fps=30.0, capacity=1 << 14, title='Crazyflie live'):
+        self.window_s = window_s
+        self.fps = fps
+        self.title = title
+        self.telemetry = SnapshotRing(TELEMETRY_COLUMNS, capacity)
+        self.setpoints = SnapshotRing(SETPOINT_COLUMNS, capacity)
+        self.clock = time.monotonic
+        self.frames = 0
+        self.full_redraws = 0
+        self.render_s = 0.0
+        self.fig = None
+        self._latest = dict.fromkeys(TELEMETRY_COLUMNS[1:], np.nan)
+        self._configs = []
+
+    # ---------- feeding ----------
+
+    def attach(self, cf, rate_hz=100.0):
+        """Start the dashboard's log blocks on cf; their callbacks only write the ring."""
+        from cflib.crazyflie.log import LogConfig
+
+        names = {v: c for c, v in zip(TELEMETRY_COLUMNS[1:], sum(LOG_BLOCKS.values(), []))}
+        for name, variables in LOG_BLOCKS.items():
+            lc = LogConfig(name=name, period_in_ms=max(10, int(1000.0 / rate_hz)))
+            for v in variables:
+                lc.add_variable(v, 'float')
+            lc.data_received_cb.add_callback(lambda ts, data, _: self.on_log(data, names))
+            cf.log.add_config(lc)
+            lc.start()
+            self._configs.append(lc)
+        return self
+
+    def detach(self):
+        for lc in self._configs:
+            lc.stop()
+        self._configs = []
+
+    def on_log(self, data, names):
+        """Merge one packet into the latest values and push a full row (acc converted from g)."""
+        latest = self._latest
+        for var, value in data.items():
+            col = names.get(var)
+            if col is not None:
+                latest[col] = value * G if col[0] == 'a' else value
+        self.telemetry.put(self.clock(), *latest.values())
+
+    def on_setpoint(self, x, y, z):
+        self.setpoints.put(self.clock(), x, y, z)
+
+    # ---------- drawing ----------
+
+    def build(self):
+        import matplotlib.pyplot as plt
+
+        self.fig, self.axes = plt.subplots(3, 1, figsize=(10, 8), sharex=True)
+        self.fig.suptitle(self.title)
+        self.lines = []             # (ring, column index, Line2D)
+        for ax, (name, unit, cols, sp_cols) in zip(self.axes, PANELS):
+            for c in cols:
+                (ln,) = ax.plot([], [], label=c, animated=True)
+                self.lines.append((self.telemetry, self.telemetry.index[c], ln))
+            for c in sp_cols:
+                (ln,) = ax.plot([], [], '--', lw=1, label=f'{c} sp', animated=True)
+                self.lines.append((self.setpoints, self.setpoints.index[c], ln))
+            ax.set_xlim(-self.window_s, 0.0)
+            ax.set_ylim(-1.0, 1.0)
+            ax.set_ylabel(f'{name} [{unit}]')
+            ax.grid(True)
+            ax.legend(loc='upper left', ncol=2, fontsize='small')
+        self.axes[-1].set_xlabel('Time before now [s]')
+        self.fig.tight_layout()
+        self.fig.canvas.mpl_connect('draw_event', self._capture)
+        self._background = None
+        return self.fig
+
+    def _capture(self, _event=None):
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+
+    def _rescale(self, data_by_axis):
+        """Widen/narrow an axis' y-range when its data leaves it (or fills < 25 % of it)."""
+        changed = False
+        for ax, ys in zip(self.axes, data_by_axis):
+            ys = ys[np.isfinite(ys)] if ys.size else ys
+            if not ys.size:
+                continue
+            lo, hi = ax.get_ylim()
+            dmin, dmax = float(ys.min()), float(ys.max())
+            span = max(dmax - dmin, 0.05)
+            if dmin < lo or dmax > hi or span < 0.25 * (hi - lo):
+                ax.set_ylim(dmin - 0.2 * span, dmax + 0.2 * span)
+                changed = True
+        return changed
+
+    def render(self):
+        """Draw one frame: blit the lines, or redraw everything when a y-range changed."""
+        t0 = time.perf_counter()
+        now = self.clock()
+        since = now - self.window_s
+        snaps = {id(r): r.snapshot(since) for r in (self.telemetry, self.setpoints)}
+        per_axis = {id(ax): [] for ax in self.axes}
+        for ring, k, ln in self.lines:
+            rows = snaps[id(ring)]
+            ln.set_data(rows[:, 0] - now, rows[:, k])
+            per_axis[id(ln.axes)].append(rows[:, k])
+        data_by_axis = [np.concatenate(per_axis[id(ax)]) for ax in self.axes]
+
+        canvas = self.fig.canvas
+        rescaled = self._rescale(data_by_axis)
+        if not canvas.supports_blit:
+            canvas.draw()                   # e.g. Agg: no blitting, plain redraw
+            self.frames += 1
+            self.render_s += time.perf_counter() - t0
+            return
+        if self._background is None or rescaled:
+            canvas.draw()                   # static parts; _capture stores the background
+            self.full_redraws += 1
+        else:
+            canvas.restore_region(self._background)
+        for _, _, ln in self.lines:
+            ln.axes.draw_artist(ln)
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+        self.frames += 1
+        self.render_s += time.perf_counter() - t0
+
+    def show(self):
+        """Open the window and redraw at fps until it is closed."""
+        import matplotlib.pyplot as plt
+
+        if self.fig is None:
+            self.build()
+        timer = self.fig.canvas.new_timer(interval=int(1000.0 / self.fps))
+        timer.add_callback(self.render)
+        timer.start()
+        plt.show()
+        timer.stop()
+
+    def summary(self):
+        ms = self.render_s / self.frames * 1e3 if self.frames else float('nan')
+        return (f'dashboard: {self.frames} frames ({self.full_redraws} full redraws), '
+                f'{ms:.2f} ms/frame, {len(self.telemetry)} telemetry rows buffered')
+
+
+# ---------- replay ----------
+
+def replay(path, dash, speed=1.0, stop=None):
+    """Feed a recorded log into dash's rings at its own pace (speed x real time)."""
+    from cftools.binlog import load_log
+
+    df = load_log(path)
+    t = df['t_sec'].to_numpy(dtype=float)
+    cols = [df[c].to_numpy(dtype=float) if c in df else np.full(t.size, np.nan)
+            for c in TELEMETRY_COLUMNS[1:]]
+    # Hover logs store acc in g (acc.x..z)
+    for k, c in enumerate(TELEMETRY_COLUMNS[1:]):
+        if c[0] == 'a':
+            cols[k] = cols[k] * G
+    sp = [df[f'sp_{c}'].to_numpy(dtype=float) for c in 'xyz'] if 'sp_x' in df else None
+    rows = np.column_stack(cols)
+    # Unmerged logs fill in one block per row: hold the last value like on_log does
+    rows = _hold_forward(rows)
+
+    wall0, t_first = time.monotonic(), t[0]
+    for i in range(t.size):
+        if stop is not None and stop.is_set():
+            return
+        due = wall0 + (t[i] - t_first) / speed
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        now = dash.clock()
+        dash.telemetry.put(now, *rows[i])
+        if sp is not None:
+            dash.setpoints.put(now, sp[0][i], sp[1][i], sp[2][i])
+
+
+def _hold_forward(rows):
+    ok = np.isfinite(rows)
+    idx = np.where(ok, np.arange(rows.shape[0])[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return rows[idx, np.arange(rows.shape[1])]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Live (or replayed) telemetry dashboard')
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument('--replay', help='CSV/.cflog log to play back')
+    src.add_argument('--uri', help='connect and show live telemetry (no flight)')
+    ap.add_argument('--speed', type=float, default=1.0, help='replay speed factor')
+    ap.add_argument('--rate_hz', type=float, default=100.0, help='live log rate')
+    ap.add_argument('--window_s', type=float, default=10.0)
+    ap.add_argument('--fps', type=float, default=30.0)
+    args = ap.parse_args(argv)
+
+    dash = Dashboard(window_s=args.window_s, fps=args.fps,
+                     title=f'Replay: {args.replay}' if args.replay else f'Live: {args.uri}')
+    if args.replay:
+        stop = threading.Event()
+        feeder = threading.Thread(target=replay, args=(args.replay, dash, args.speed, stop),
+                                  daemon=True)
+        feeder.start()
+        try:
+            dash.show()
+        finally:
+            stop.set()
+    else:
+        import cflib.crtp
+        from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+
+        from cftools.toccache import make_crazyflie
+
+        cflib.crtp.init_drivers(enable_debug_driver=False)
+        with SyncCrazyflie(args.uri, cf=make_crazyflie()) as scf:
+            dash.attach(scf.cf, rate_hz=args.rate_hz)
+            dash.show()
+            dash.detach()
+    print(dash.summary())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
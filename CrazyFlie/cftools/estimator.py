@@ -0,0 +1,178 @@
+"""
+Kalman estimator readiness gate: reset, then wait for convergence instead of a fixed sleep.
+
+reset_kalman() toggled kalman.resetEstimation and slept settle_s (1 s).
+That is too long when the filter settles quickly and not long enough when
+it does not (bad flow surface, no deck, a vehicle that was moving). Here
+the reset is followed by a log of kalman.varPX/Y/Z and the position
+estimate, and the gate opens as soon as, over the last window_s of
+samples:
+
+- every varPX/Y/Z stays below var_max (m^2/s^2). These are the variances
+  of the Kalman filter's PX/PY/PZ velocity states, not of the position
+  (that is varX/Y/Z); they are what Bitcraze's wait_for_position_estimator
+  watches
+- the variances' spread (max - min) stays below var_spread_max, i.e. they
+  have stopped falling (the same example's criterion)
+- the estimate of each axis stays within pos_spread_max (m), i.e. the
+  position itself has stopped moving
+
+or raises EstimatorNotReady after timeout_s. The window is judged on the
+firmware timestamps, and the log starts only once the reset write has
+been confirmed, so no pre-reset sample counts. The returned
+ReadinessReport keeps the convergence time and the final values for the
+flight record.
+
+Usage:
+    report = reset_estimator(cf)                  # cftools.params write + gate
+    print(report.summary())
+    report = await reset_estimator_async(cf)      # in the asyncio executive
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+from cflib.crazyflie.log import LogConfig
+
+from cftools.params import write_params, write_params_async
+
+VAR_VARS = ('kalman.varPX', 'kalman.varPY', 'kalman.varPZ')
+POS_VARS = ('stateEstimate.x', 'stateEstimate.y', 'stateEstimate.z')
+
+
+class EstimatorNotReady(RuntimeError):
+    """The estimator did not converge within the timeout."""
+
+
+class ReadinessReport:
+    def __init__(self, converged, converge_s, samples, last, thresholds):
+        self.converged = converged
+        self.converge_s = converge_s      # host seconds from gate start to open (or to the timeout)
+        self.samples = samples
+        self.last = last                  # window maxima: var_max, var_spread, pos_spread (None if empty)
+        self.thresholds = thresholds
+
+    def as_dict(self):
+        return {'converged': self.converged, 'converge_s': self.converge_s, 'samples': self.samples,
+                'last': self.last, 'thresholds': self.thresholds}
+
+    def summary(self):
+        state = 'converged in' if self.converged else 'NOT converged after'
+        s = f'estimator {state} {self.converge_s:.2f} s ({self.samples} samples)'
+        if self.last:
+            s += (f", velocity var {self.last['var_max']:.2e} m^2/s^2, "
+                  f"var spread {self.last['var_spread']:.1e}, "
+                  f"position spread {self.last['pos_spread'] * 1e3:.1f} mm")
+        return s
+
+
+class ReadinessWindow:
+    """Sliding window of (firmware ms, PX/PY/PZ velocity variances, position) with the convergence test."""
+
+    def __init__(self, var_max=1e-3, var_spread_max=1e-3, pos_spread_max=0.01, window_s=0.3):
+        self.var_max = var_max
+        self.var_spread_max = var_spread_max
+        self.pos_spread_max = pos_spread_max
+        self.window_ms = window_s * 1e3
+        self.rows = deque()
+        self.samples = 0
+        self.last = None
+
+    def thresholds(self):
+        return {'var_max': self.var_max, 'var_spread_max': self.var_spread_max,
+                'pos_spread_max': self.pos_spread_max, 'window_s': self.window_ms / 1e3}
+
+    def add(self, ts, data):
+        """Add one log packet; True once the last window_s of samples meets every threshold."""
+        self.samples += 1
+        self.rows.append((ts, tuple(data[v] for v in VAR_VARS), tuple(data[v] for v in POS_VARS)))
+        while ts - self.rows[0][0] > self.window_ms:
+            self.rows.popleft()
+        var = [max(r[1][i] for r in self.rows) for i in range(3)]
+        var_lo = [min(r[1][i] for r in self.rows) for i in range(3)]
+        pos = [max(r[2][i] for r in self.rows) - min(r[2][i] for r in self.rows) for i in range(3)]
+        self.last = {'var_max': max(var), 'var_spread': max(h - l for h, l in zip(var, var_lo)),
+                     'pos_spread': max(pos)}
+        full = ts - self.rows[0][0] >= 0.9 * self.window_ms
+        return (full and self.last['var_max'] <= self.var_max
+                and self.last['var_spread'] <= self.var_spread_max
+                and self.last['pos_spread'] <= self.pos_spread_max)
+
+
+def _log_config(period_ms):
+    lc = LogConfig(name='readiness', period_in_ms=period_ms)
+    for v in VAR_VARS + POS_VARS:
+        lc.add_variable(v, 'float')
+    return lc
+
+
+def _finish(window, converged, t0):
+    report = ReadinessReport(converged, time.monotonic() - t0, window.samples, window.last,
+                             window.thresholds())
+    if not converged:
+        raise EstimatorNotReady(f'{report.summary()}; thresholds {report.thresholds}')
+    return report
+
+
+def wait_for_estimator(cf, timeout_s=10.0, period_ms=20, **thresholds):
+    """Block until the estimator has converged (ReadinessWindow thresholds); EstimatorNotReady on timeout."""
+    window = ReadinessWindow(**thresholds)
+    ready = threading.Event()
+    lock = threading.Lock()
+
+    def on_data(ts, data, _):
+        with lock:
+            if not ready.is_set() and window.add(ts, data):
+                ready.set()
+
+    lc = _log_config(period_ms)
+    lc.data_received_cb.add_callback(on_data)
+    t0 = time.monotonic()
+    cf.log.add_config(lc)
+    lc.start()
+    try:
+        converged = ready.wait(timeout_s)
+    finally:
+        lc.stop()
+        lc.delete()
+    with lock:
+        return _finish(window, converged, t0)
+
+
+async def wait_for_estimator_async(cf, timeout_s=10.0, period_ms=20, **thresholds):
+    """wait_for_estimator for the asyncio executive."""
+    from cftools.executive import LogStream
+
+    window = ReadinessWindow(**thresholds)
+    stream = LogStream(cf, 'readiness', VAR_VARS + POS_VARS, period_ms=period_ms)
+    t0 = time.monotonic()
+    stream.start()
+
+    async def watch():
+        async for ts, data in stream:
+            if window.add(ts, data):
+                return True
+
+    try:
+        converged = await asyncio.wait_for(watch(), timeout_s)
+    except asyncio.TimeoutError:
+        converged = False
+    finally:
+        stream.stop()
+        stream.config.delete()
+    return _finish(window, converged, t0)
+
+
+def reset_estimator(cf, timeout_s=10.0, **thresholds):
+    """Select the Kalman filter, reset it (confirmed writes) and wait until it has converged."""
+    write_params(cf, {'stabilizer.estimator': 2, 'kalman.resetEstimation': 1}).check()
+    write_params(cf, {'kalman.resetEstimation': 0}).check()
+    return wait_for_estimator(cf, timeout_s=timeout_s, **thresholds)
+
+
+async def reset_estimator_async(cf, timeout_s=10.0, **thresholds):
+    (await write_params_async(cf, {'stabilizer.estimator': 2, 'kalman.resetEstimation': 1})).check()
+    (await write_params_async(cf, {'kalman.resetEstimation': 0})).check()
+    return await wait_for_estimator_async(cf, timeout_s=timeout_s, **thresholds)
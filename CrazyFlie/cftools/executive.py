@@ -0,0 +1,386 @@
+"""
+asyncio flight executive: setpoint phases, log streams and safety monitors in one event loop.
+
+The flight scripts run takeoff, trajectory and landing as blocking loops,
+with time.sleep() between them and the log callbacks writing into shared
+state under a lock. Nothing can watch the flight while a phase runs, and
+every phase boundary restarts the pacing. Here:
+
+- the phases (ramp_takeoff, follow_trajectory_lowlevel / _fullstate,
+  ramp_land) are coroutines paced by ONE DeadlineScheduler through
+  wait_async(), so the next phase sends on the very next tick
+- LogStream bridges a LogConfig's callbacks (cflib thread) into asyncio
+  queues; the callback only hands the packet to the loop, which copies it
+  to every subscriber, so monitors sharing one stream each see every packet
+- monitors (geofence, battery, watch_caller, or any coroutine) run as tasks
+  next to the mission and raise Abort to stop it
+- on Abort, an error or Ctrl-C the mission task is cancelled and the vehicle
+  ramps down from the last commanded setpoint
+
+Every phase is recorded (start, duration, ticks, outcome), so summary()
+shows where the flight time went, including any idle gap between phases.
+
+Usage:
+    async def flight(cf):
+        ex = FlightExecutive(cf, rate_hz=50)
+        await ex.configure()
+        est = LogStream(cf, 'est', ['stateEstimate.x', 'stateEstimate.y', 'stateEstimate.z'])
+        est.start()
+
+        async def mission():
+            await ex.ramp_takeoff(1.0, 1.5)
+            await ex.follow_trajectory_lowlevel(traj)
+            await ex.ramp_land(1.5)
+
+        await ex.run(mission(), monitors=[geofence(est, (-2, -2, -0.1), (2, 2, 2))])
+        print(ex.summary())
+
+    asyncio.run(flight(scf.cf))
+"""
+
+import asyncio
+import time
+
+from cflib.crazyflie.log import LogConfig
+
+from cftools.estimator import reset_estimator_async
+from cftools.params import write_params_async
+from cftools.scheduler import DeadlineScheduler
+from cftools.spline import full_state
+from cftools.trajectory import Trajectory
+
+
+class Abort(Exception):
+    """Raised by a monitor to stop the mission and land."""
+
+
+class LogSubscription:
+    """One consumer of a LogStream: its own bounded queue, oldest packet dropped when it falls behind."""
+
+    def __init__(self, stream, maxsize):
+        self.stream = stream
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def _offer(self, item):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.stream.dropped += 1
+        self.queue.put_nowait(item)
+
+    def close(self):
+        if self in self.stream._subscribers:
+            self.stream._subscribers.remove(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class LogStream:
+    """
+    One LogConfig whose packets arrive as (firmware ms, {name: value}) on
+    asyncio queues. Every subscribe() gets its own queue and sees every
+    packet; iterating the stream itself uses one default subscription. When
+    a consumer falls behind its oldest packet is dropped, so the cflib thread
+    never blocks. 'latest' always holds the newest values, for monitors that
+    only need the current state.
+    """
+
+    def __init__(self, cf, name, variables, period_ms=20, maxsize=256, fetch_as='float'):
+        self.cf = cf
+        self.config = LogConfig(name=name, period_in_ms=period_ms)
+        for v in variables:
+            self.config.add_variable(v, fetch_as)
+        self.maxsize = maxsize
+        self.latest = {}
+        self.received = 0
+        self.dropped = 0                    # over all subscribers
+        self._subscribers = []
+        self._default = None
+        self._loop = asyncio.get_running_loop()
+        self.config.data_received_cb.add_callback(self._on_data)
+
+    def _on_data(self, ts, data, _):
+        # cflib thread: hand over and return
+        self._loop.call_soon_threadsafe(self._put, ts, data)
+
+    def _put(self, ts, data):
+        self.received += 1
+        self.latest = data
+        for sub in self._subscribers:
+            sub._offer((ts, data))
+
+    def subscribe(self, maxsize=None):
+        """A LogSubscription receiving every packet from now on; close() it when done."""
+        sub = LogSubscription(self, maxsize or self.maxsize)
+        self._subscribers.append(sub)
+        return sub
+
+    def start(self):
+        self.cf.log.add_config(self.config)
+        self.config.start()
+        return self
+
+    def stop(self):
+        self.config.stop()
+
+    def __aiter__(self):
+        if self._default is None:
+            self._default = self.subscribe()
+        return self
+
+    async def __anext__(self):
+        return await self._default.queue.get()
+
+
+# ---------- monitors ----------
+
+async def geofence(stream, lo, hi, names=('stateEstimate.x', 'stateEstimate.y', 'stateEstimate.z')):
+    """Abort as soon as the estimate leaves the box lo..hi (m). Checks every packet of 'stream'."""
+    sub = stream.subscribe()
+    try:
+        async for _, data in sub:
+            for name, a, b in zip(names, lo, hi):
+                v = data.get(name)
+                if v is not None and not a <= v <= b:
+                    raise Abort(f'{name} = {v:.2f} m outside [{a:g}, {b:g}]')
+    finally:
+        sub.close()
+
+
+async def battery(stream, v_min=3.3, hold_s=1.0, name='pm.vbat'):
+    """Abort when the battery voltage stays below v_min for hold_s (sag on a punch is ignored)."""
+    low_since = None
+    sub = stream.subscribe()
+    try:
+        async for _, data in sub:
+            v = data.get(name)
+            if v is None:
+                continue
+            if v >= v_min:
+                low_since = None
+            elif low_since is None:
+                low_since = time.monotonic()
+            elif time.monotonic() - low_since >= hold_s:
+                raise Abort(f'battery {v:.2f} V below {v_min:g} V for {hold_s:g} s')
+    finally:
+        sub.close()
+
+
+async def watch_caller(caller, reason):
+    """Abort when a cflib Caller fires, e.g. watch_caller(cf.connection_lost, 'link lost')."""
+    loop = asyncio.get_running_loop()
+    fired = asyncio.Event()
+    cb = lambda *_: loop.call_soon_threadsafe(fired.set)
+    caller.add_callback(cb)
+    try:
+        await fired.wait()
+        raise Abort(reason)
+    finally:
+        caller.remove_callback(cb)
+
+
+# ---------- executive ----------
+
+class FlightExecutive:
+    def __init__(self, cf, rate_hz=25.0, overrun='skip', on_setpoint=None):
+        self.cf = cf
+        self.on_setpoint = on_setpoint        # called with (x, y, z) of every setpoint sent
+        self.rate_hz = rate_hz
+        self.sched = DeadlineScheduler(rate_hz, overrun=overrun, name='flight')
+        self.last = (0.0, 0.0, 0.0, 0.0)      # last commanded x, y, z, yaw
+        self.phases = []                      # dicts: name, start, duration, ticks, outcome
+        self.abort_reason = None
+        self.param_reports = []               # ParamWriteReport of every confirmed write batch
+        self.readiness = None                 # ReadinessReport of the estimator reset
+        self.t_origin = time.monotonic()
+
+    # ---------- plumbing ----------
+
+    def _send(self, x, y, z, yaw):
+        self.cf.commander.send_position_setpoint(x, y, z, yaw)
+        self._sent(x, y, z, yaw)
+
+    def _sent(self, x, y, z, yaw):
+        self.last = (x, y, z, yaw)
+        if self.on_setpoint is not None:
+            self.on_setpoint(x, y, z)
+
+    async def _tick(self):
+        """Next tick of the flight-wide grid; returns its scheduled time (s since the first tick)."""
+        if self.sched.t0 is None:
+            self.sched.start()
+            return 0.0
+        return await self.sched.wait_async()
+
+    def _phase(self, name):
+        return _Phase(self, name)
+
+    # ---------- phases ----------
+
+    async def configure(self, reset_estimator=True, arm=True, readiness=None):
+        """
+        Low-level world-frame mode, Kalman reset and arming. The parameter
+        writes are confirmed by the vehicle (ParamWriteError if one fails)
+        and the reset waits for the filter to converge instead of sleeping
+        ('readiness': cftools.estimator thresholds, EstimatorNotReady on
+        timeout).
+        """
+        with self._phase('configure'):
+            self.param_reports.append((await write_params_async(
+                self.cf, {'commander.enHighLevel': 0, 'flightmode.posSet': 1})).check())
+            if reset_estimator:
+                self.readiness = await reset_estimator_async(self.cf, **(readiness or {}))
+            if arm:
+                self.cf.platform.send_arming_request(True)
+                await asyncio.sleep(0.4)
+
+    async def ramp_takeoff(self, z_target, seconds, x=0.0, y=0.0, yaw=0.0):
+        with self._phase('takeoff'):
+            steps = max(1, int(seconds * self.rate_hz))
+            for k in range(steps):
+                await self._tick()
+                self._send(x, y, (k + 1) / steps * z_target, yaw)
+
+    async def hold(self, seconds):
+        """Keep sending the last setpoint for 'seconds'."""
+        with self._phase('hold'):
+            for _ in range(max(1, int(seconds * self.rate_hz))):
+                await self._tick()
+                self._send(*self.last)
+
+    async def follow_trajectory_lowlevel(self, traj, vy_ff=0.0):
+        """Position setpoints sampled at the scheduled tick times; vy_ff as in test_seq.py."""
+        if not isinstance(traj, Trajectory):
+            traj = Trajectory.from_points(traj)
+        with self._phase('trajectory'):
+            traj.reset()
+            t0 = await self._tick()
+            t, T_end = 0.0, traj.t_end
+            while True:
+                s = traj.sample(t)
+                self._send(s['x'], s['y'] + s['vy'] * vy_ff, s['z'], s['yaw'])
+                if t > T_end + 0.05:
+                    break
+                t = await self._tick() - t0
+
+    async def follow_trajectory_fullstate(self, spline):
+        """Full-state setpoints from a SplineTrajectory at the scheduled tick times."""
+        with self._phase('trajectory'):
+            spline.reset()
+            t0 = await self._tick()
+            t, T_end = 0.0, spline.t_end
+            while True:
+                s = spline.sample(t)
+                self.cf.commander.send_full_state_setpoint(*full_state(s))
+                self._sent(s['x'], s['y'], s['z'], s['yaw'])
+                if t > T_end + 0.05:
+                    break
+                t = await self._tick() - t0
+
+    async def ramp_land(self, seconds):
+        """Ramp z from the last commanded setpoint down to 0, then stop the motors."""
+        with self._phase('land'):
+            x, y, z_start, yaw = self.last
+            steps = max(1, int(seconds * self.rate_hz))
+            for k in range(steps):
+                await self._tick()
+                self._send(x, y, (1.0 - (k + 1) / steps) * z_start, yaw)
+            self.cf.commander.send_stop_setpoint()
+            self.cf.commander.send_notify_setpoint_stop()
+
+    # ---------- supervision ----------
+
+    async def run(self, mission, monitors=(), land_s=1.5):
+        """
+        Run the mission coroutine with the monitor coroutines beside it. A
+        monitor that raises Abort (or any error) cancels the mission and the
+        vehicle lands from where it was; so does an error in the mission or
+        cancelling run() itself (Ctrl-C under asyncio.run). Returns True if
+        the mission completed.
+        """
+        task = asyncio.ensure_future(mission)
+        watchers = [asyncio.ensure_future(m) for m in monitors]
+        failure = None
+        try:
+            pending = {task, *watchers}
+            while not task.done():
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                failure = next((d.exception() for d in done
+                                if d is not task and not d.cancelled() and d.exception()), None)
+                if failure is not None:
+                    break
+            if failure is None:
+                failure = task.exception()
+        except asyncio.CancelledError:
+            failure = Abort('cancelled')
+        finally:
+            for w in watchers:
+                w.cancel()
+            if not task.done():
+                task.cancel()
+            await asyncio.gather(task, *watchers, return_exceptions=True)
+
+        if failure is None:
+            return True
+        self.abort_reason = str(failure) or type(failure).__name__
+        print(f'Abort: {self.abort_reason} -> landing')
+        if self.last[2] > 0.0:
+            await self.ramp_land(land_s)
+        else:
+            self.cf.commander.send_stop_setpoint()
+        if not isinstance(failure, Abort):
+            raise failure
+        return False
+
+    # ---------- reporting ----------
+
+    def as_dict(self):
+        return {'phases': self.phases, 'abort_reason': self.abort_reason,
+                'ticks': self.sched.stats.as_dict(),
+                'readiness': self.readiness.as_dict() if self.readiness is not None else None}
+
+    def summary(self):
+        lines = [self.sched.stats.summary()]
+        prev_end = None
+        for ph in self.phases:
+            gap = '' if prev_end is None else f", gap {(ph['start'] - prev_end) * 1e3:.1f} ms"
+            lines.append(f"  {ph['name']:<10} at {ph['start']:7.3f} s  {ph['duration']:7.3f} s  "
+                         f"{ph['ticks']:4d} ticks  {ph['outcome']}{gap}")
+            prev_end = ph['start'] + ph['duration']
+        if self.abort_reason:
+            lines.append(f"  aborted: {self.abort_reason}")
+        for rep in self.param_reports:
+            lines.append('  ' + rep.summary().replace('\n', '\n  '))
+        if self.readiness is not None:
+            lines.append('  ' + self.readiness.summary())
+        return '\n'.join(lines)
+
+
+class _Phase:
+    """Context manager recording one phase of a FlightExecutive."""
+
+    def __init__(self, ex, name):
+        self.ex = ex
+        self.name = name
+
+    def __enter__(self):
+        self.t = time.monotonic()
+        self.ticks = self.ex.sched.stats.ticks
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            outcome = 'done'
+        elif issubclass(exc_type, asyncio.CancelledError):
+            outcome = 'cancelled'
+        else:
+            outcome = f'failed ({exc_type.__name__})'
+        self.ex.phases.append({'name': self.name, 'start': self.t - self.ex.t_origin,
+                               'duration': time.monotonic() - self.t,
+                               'ticks': self.ex.sched.stats.ticks - self.ticks, 'outcome': outcome})
+        return False
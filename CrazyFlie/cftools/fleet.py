@@ -0,0 +1,365 @@
+"""
+Fly several Crazyflies on one shared clock.
+
+Each flight script opens one SyncCrazyflie and paces its own loop, so two
+scripts flying side by side drift apart by however their connects, Kalman
+resets and schedulers happen to line up. FleetRunner instead:
+
+- connects to all URIs in parallel (a failed link closes the others)
+- configures, resets the estimator and arms every vehicle in parallel
+- streams setpoints for all vehicles from ONE DeadlineScheduler; vehicle i
+  samples its trajectory at t - offset_i, so staggered starts stay locked
+  to the same time base
+- gives every vehicle its own log block and LogSink writer, time-stamped
+  against the same host clock origin as the setpoints
+- reports the achieved setpoint rate of every vehicle and the start skew
+  (how late each vehicle's first trajectory setpoint left, against the
+  scheduled tick it belongs to)
+- on any error or Ctrl-C during the flight, ramps every vehicle down from
+  its last setpoint and stops it before the links close (abort_land)
+
+Vehicles sharing a Crazyradio share its packet budget. plan_rate() checks
+the setpoint + log packet load per dongle and lowers the setpoint rate when
+the fleet would not fit.
+
+Trajectory objects are streamed as position setpoints, SplineTrajectory
+objects as full-state setpoints.
+
+Usage:
+    with FleetRunner(uris, trajs, offsets=[0.0, 0.5], rate_hz=25) as fleet:
+        report = fleet.run()
+    print(report.summary())
+"""
+
+import csv
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from cflib.crazyflie.log import LogConfig
+from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+
+from cftools import estimator
+from cftools.logsink import LogSink
+from cftools.params import write_params
+from cftools.scheduler import DeadlineScheduler
+from cftools.spline import SplineTrajectory, full_state
+from cftools.toccache import make_crazyflie
+
+RADIO_PACKET_BUDGET = 500.0    # packets/s one Crazyradio PA sustains with margin
+LOG_VARS = ('stateEstimate.x', 'stateEstimate.y', 'stateEstimate.z')
+LOG_HEADER = ['t_sec', 'fw_ms', 'x', 'y', 'z']
+
+
+def dongle_of(uri):
+    """Key of the radio a URI goes through ('radio://0'), None for links with no shared radio."""
+    if not uri.startswith('radio://'):
+        return None
+    return 'radio://' + uri[len('radio://'):].split('/')[0]
+
+
+def plan_rate(uris, rate_hz, log_hz, budget=RADIO_PACKET_BUDGET):
+    """
+    Setpoint rate that keeps every dongle within 'budget' packets/s, given one
+    setpoint and log_hz log packets per vehicle. Returns (rate_hz, {dongle: load}).
+    """
+    per_dongle = {}
+    for uri in uris:
+        key = dongle_of(uri)
+        if key is not None:
+            per_dongle[key] = per_dongle.get(key, 0) + 1
+    rate = rate_hz
+    for n in per_dongle.values():
+        rate = min(rate, budget / n - log_hz)
+    if rate <= 0:
+        raise ValueError(f"{max(per_dongle.values())} vehicles logging at {log_hz:g} Hz "
+                         f"exceed one radio's {budget:g} packets/s")
+    load = {k: n * (rate + log_hz) for k, n in per_dongle.items()}
+    return rate, load
+
+
+class FleetVehicle:
+    """One link of the fleet: trajectory, start offset, log pipeline and send times."""
+
+    def __init__(self, index, uri, traj, offset_s=0.0):
+        self.index = index
+        self.uri = uri
+        self.traj = traj
+        self.offset_s = offset_s
+        self.full_state = isinstance(traj, SplineTrajectory)
+        self.scf = None
+        self.sink = None
+        self.log_file = None
+        self.log_config = None
+        self.sent = []              # host time of every trajectory setpoint
+        self.first_tick = None      # scheduled fleet time of the first one
+        self.readiness = None       # ReadinessReport of the estimator reset
+        self.last = None            # last position setpoint sent: (x, y, z, yaw)
+
+    @property
+    def cf(self):
+        return self.scf.cf
+
+    def send(self, t):
+        """Send the setpoint for fleet time t (the trajectory holds its end knots outside)."""
+        s = self.traj.sample(t - self.offset_s)
+        if self.full_state:
+            self.cf.commander.send_full_state_setpoint(*full_state(s))
+        else:
+            self.cf.commander.send_position_setpoint(s['x'], s['y'], s['z'], s['yaw'])
+        self.last = (s['x'], s['y'], s['z'], s['yaw'])
+
+    def achieved_hz(self):
+        if len(self.sent) < 2:
+            return float('nan')
+        span = self.sent[-1] - self.sent[0]
+        return (len(self.sent) - 1) / span if span > 0 else float('nan')
+
+
+class FleetReport:
+    """Per-vehicle rates, start skew and scheduler timing of one fleet run."""
+
+    def __init__(self, vehicles, stats, rate_hz, load, traj_t0):
+        self.rate_hz = rate_hz
+        self.load = load
+        self.stats = stats
+        self.rows = []
+        for v in vehicles:
+            start = v.sent[0] - traj_t0 - v.first_tick if v.sent else float('nan')
+            log = v.sink.stats() if v.sink is not None else {}
+            self.rows.append({'uri': v.uri, 'offset_s': v.offset_s, 'setpoints': len(v.sent),
+                              'achieved_hz': v.achieved_hz(), 'start_late_ms': start * 1e3,
+                              'log_written': log.get('written', 0),
+                              'log_dropped': log.get('dropped', 0),
+                              'converge_s': v.readiness.converge_s if v.readiness else float('nan')})
+
+    @property
+    def start_skew_ms(self):
+        late = [r['start_late_ms'] for r in self.rows]
+        return max(late) - min(late) if late else float('nan')
+
+    def as_dict(self):
+        return {'rate_hz': self.rate_hz, 'radio_load': self.load, 'start_skew_ms': self.start_skew_ms,
+                'vehicles': self.rows, 'scheduler': self.stats.as_dict()}
+
+    def summary(self):
+        lines = [self.stats.summary()]
+        for r in self.rows:
+            lines.append(f"  {r['uri']}: {r['setpoints']} setpoints at {r['achieved_hz']:.1f}/"
+                         f"{self.rate_hz:.1f} Hz, start {r['start_late_ms']:+.2f} ms "
+                         f"(offset {r['offset_s']:.2f} s), log {r['log_written']} rows, "
+                         f"{r['log_dropped']} dropped, estimator ready in {r['converge_s']:.2f} s")
+        load = ', '.join(f'{k} {v:.0f} packets/s' for k, v in self.load.items())
+        lines.append(f"  start skew {self.start_skew_ms:.2f} ms" + (f", radio load {load}" if load else ''))
+        return '\n'.join(lines)
+
+
+class FleetRunner:
+    def __init__(self, uris, trajectories, offsets=None, rate_hz=25.0, log_hz=50.0,
+                 log_dir=None, overrun='skip', toc_cache=None, budget=RADIO_PACKET_BUDGET):
+        if len(uris) != len(trajectories):
+            raise ValueError(f"{len(uris)} URIs for {len(trajectories)} trajectories")
+        if len(set(uris)) != len(uris):
+            raise ValueError("every vehicle needs its own URI")
+        offsets = list(offsets) if offsets is not None else [0.0] * len(uris)
+        if len(offsets) != len(uris):
+            raise ValueError(f"{len(uris)} URIs for {len(offsets)} start offsets")
+        self.vehicles = [FleetVehicle(i, u, tr, o)
+                         for i, (u, tr, o) in enumerate(zip(uris, trajectories, offsets))]
+        self.requested_hz = rate_hz
+        self.rate_hz, self.load = plan_rate(uris, rate_hz, log_hz if log_dir else 0.0, budget)
+        self.log_hz = log_hz
+        self.log_dir = Path(log_dir) if log_dir else None
+        self.overrun = overrun
+        self.toc_cache = toc_cache          # None: the shared TOC cache
+        self.t_origin = time.monotonic()    # shared host clock origin for every log row
+        self.abort_reason = None
+        self._pool = ThreadPoolExecutor(max_workers=len(uris), thread_name_prefix='fleet')
+
+    def _each(self, fn):
+        """Run fn(vehicle) for every vehicle in parallel; re-raises the first failure."""
+        return [f.result() for f in [self._pool.submit(fn, v) for v in self.vehicles]]
+
+    # ---------- links ----------
+
+    def connect(self):
+        def open_one(v):
+            scf = SyncCrazyflie(v.uri, cf=make_crazyflie(self.toc_cache))
+            scf.open_link()
+            v.scf = scf
+        try:
+            self._each(open_one)
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def close(self):
+        self.stop_logging()
+        for v in self.vehicles:
+            if v.scf is not None:
+                v.scf.close_link()
+                v.scf = None
+        self._pool.shutdown(wait=False)
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- preflight ----------
+
+    def prepare(self, reset_estimator=True, readiness=None):
+        """
+        Low-level world-frame mode, Kalman reset and arming on every vehicle
+        at once. Writes are confirmed and each vehicle waits for its own
+        filter to converge ('readiness': cftools.estimator thresholds).
+        """
+        def prep(v):
+            write_params(v.cf, {'commander.enHighLevel': 0, 'flightmode.posSet': 1}).check()
+            if reset_estimator:
+                v.readiness = estimator.reset_estimator(v.cf, **(readiness or {}))
+            v.cf.platform.send_arming_request(True)
+        self._each(prep)
+        time.sleep(0.4)
+
+    # ---------- logging ----------
+
+    def start_logging(self, tag='fleet'):
+        if self.log_dir is None:
+            return
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        for v in self.vehicles:
+            v.log_file = open(self.log_dir / f'{tag}_{v.index}.csv', 'w', newline='')
+            writer = csv.writer(v.log_file)
+            writer.writerow(LOG_HEADER)
+            v.sink = LogSink(writer, fileobj=v.log_file,
+                             format_row=lambda r: [f'{r[0]:.6f}', *r[1:]]).start()
+            lc = LogConfig(name=tag, period_in_ms=max(10, int(1000.0 / self.log_hz)))
+            for name in LOG_VARS:
+                lc.add_variable(name, 'float')
+            sink, origin = v.sink, self.t_origin
+            lc.data_received_cb.add_callback(
+                lambda ts, data, _, sink=sink: sink.put(
+                    (time.monotonic() - origin, ts, *(data[n] for n in LOG_VARS))))
+            v.cf.log.add_config(lc)
+            lc.start()
+            v.log_config = lc
+
+    def stop_logging(self):
+        for v in self.vehicles:
+            if v.log_config is not None:
+                v.log_config.stop()
+                v.log_config = None
+            if v.sink is not None:
+                v.sink.close()
+            if v.log_file is not None:
+                v.log_file.close()
+                v.log_file = None
+
+    # ---------- flight ----------
+
+    def _ramp(self, seconds, z_of, name):
+        """Position setpoints at each vehicle's first/last knot with z = z_of(vehicle, u)."""
+        sched = DeadlineScheduler(self.rate_hz, overrun=self.overrun, name=name)
+        sched.start()
+        steps = max(1, int(seconds * self.rate_hz))
+        for k in sched.ticks(steps):
+            u = (k + 1) / steps
+            for v in self.vehicles:
+                v.last = z_of(v, u)
+                v.cf.commander.send_position_setpoint(*v.last)
+        return sched.stats
+
+    def takeoff(self, seconds=2.0, hold_s=1.0):
+        def at(v, u):
+            p = v.traj[0]
+            return p['x'], p['y'], p['z'] * min(1.0, u * (seconds + hold_s) / seconds), p['yaw']
+        return self._ramp(seconds + hold_s, at, 'takeoff')
+
+    def fly(self):
+        """Stream every trajectory from one scheduler; returns (TickStats, fleet t0)."""
+        for v in self.vehicles:
+            v.traj.reset()
+            v.sent = []
+            v.first_tick = None
+        t_end = max(v.offset_s + v.traj.t_end for v in self.vehicles)
+        sched = DeadlineScheduler(self.rate_hz, overrun=self.overrun, name='fleet')
+        t0 = sched.start()
+        t = 0.0
+        clock = time.monotonic
+        while True:
+            for v in self.vehicles:
+                v.send(t)
+                if t >= v.offset_s:
+                    v.sent.append(clock())
+                    if v.first_tick is None:
+                        v.first_tick = t
+            if t > t_end:
+                break
+            t = sched.wait()
+        return sched.stats, t0
+
+    def land(self, seconds=2.0):
+        def at(v, u):
+            p = v.traj[-1]
+            return p['x'], p['y'], p['z'] * (1.0 - u), p['yaw']
+        stats = self._ramp(seconds, at, 'land')
+        for v in self.vehicles:
+            v.cf.commander.send_stop_setpoint()
+            v.cf.commander.send_notify_setpoint_stop()
+        return stats
+
+    def abort_land(self, seconds=2.0):
+        """
+        Ramp every airborne vehicle down from its last setpoint, then send the
+        stop setpoints. A vehicle whose link fails is dropped from the ramp so
+        the others still land.
+        """
+        flying = [v for v in self.vehicles if v.scf is not None and v.last is not None and v.last[2] > 0.0]
+        start = {v.index: v.last for v in flying}
+        try:
+            sched = DeadlineScheduler(self.rate_hz, overrun=self.overrun, name='abort')
+            sched.start()
+            steps = max(1, int(seconds * self.rate_hz))
+            for k in sched.ticks(steps):
+                u = (k + 1) / steps
+                for v in list(flying):
+                    x, y, z, yaw = start[v.index]
+                    v.last = (x, y, z * (1.0 - u), yaw)
+                    try:
+                        v.cf.commander.send_position_setpoint(*v.last)
+                    except Exception:
+                        flying.remove(v)
+        finally:
+            for v in self.vehicles:
+                if v.scf is None:
+                    continue
+                try:
+                    v.cf.commander.send_stop_setpoint()
+                    v.cf.commander.send_notify_setpoint_stop()
+                except Exception:
+                    pass
+                v.last = None
+
+    def run(self, takeoff_s=2.0, land_s=2.0, reset_estimator=True):
+        """
+        prepare, log, take off, fly, land; returns a FleetReport. An error or
+        Ctrl-C after takeoff starts lands every vehicle (abort_land) and is
+        then re-raised.
+        """
+        self.prepare(reset_estimator=reset_estimator)
+        self.start_logging()
+        try:
+            self.takeoff(takeoff_s)
+            stats, t0 = self.fly()
+            self.land(land_s)
+        except BaseException as e:
+            self.abort_reason = str(e) or type(e).__name__
+            print(f'Abort: {self.abort_reason} -> landing every vehicle')
+            self.abort_land(land_s)
+            raise
+        finally:
+            self.stop_logging()
+        return FleetReport(self.vehicles, stats, self.rate_hz, self.load, t0)
@@ -0,0 +1,295 @@
+"""
+Command-to-response latency from logs holding setpoints and estimates on one clock.
+
+--vy_ff (the y look-ahead in follow_trajectory_lowlevel) was tuned by
+guesswork. This measures it instead, per axis, from any log with a
+commanded and an estimated column on the same t_sec clock: x_cmd/x_est
+(cftools.recorder, test_seq_Wlog.py) or sp_x/x (the dashboard replay
+format). Both signals are resampled onto a uniform grid, then:
+
+- xcorr_lag_ms : lag of the peak of the cross-correlation of the command
+                 and estimate increments (FFT, parabolic sub-sample peak);
+                 xcorr_peak is the normalized peak height
+- FOPDT fit    : y[k+1] = a*y[k] + b*u[k-d] + c, i.e. gain K, time constant
+                 tau and dead time theta ~ (d + 1/2)*dt. The least-squares normal
+                 equations of every candidate d are built in one pass and
+                 solved as a stack; the best d is refined to a fraction of a
+                 sample on the residual curve
+- lag_ms       : theta + tau, how far the estimate trails a ramp command
+                 (unit gain). That is the look-ahead that cancels the lag,
+                 i.e. the vy_ff to fly with
+
+lag_ms carries a confidence interval (lag_lo/lag_hi) from a moving-block
+bootstrap of the fit rows: every resample only reweights the per-row
+products, so all of them are one matrix product. dead_ms and tau_ms are
+indicative only and get no interval: the one-step fit regresses on the
+noisy estimate itself, so with millimetres of estimator noise it trades
+dead time against tau (a 140 ms / 250 ms synthetic plant comes out near
+160 / 205 ms) while their sum, the lag, stays put. Axes whose command
+moves less than min_excitation (m) are reported as not excited.
+
+Runs are analyzed in a process pool and cached by file content hash, as in
+cftools.logstats. feedforward_s() turns the rows into one vy_ff; the flight
+scripts call measured_feedforward() for --vy_ff auto --lag_from Logs/,
+where test_seq_Wlog.py records by default. Measure on logs whose command
+column is what was actually sent.
+
+CLI (from the CrazyFlie folder):
+    python -m cftools.latency Logs/
+    python -m cftools.latency Logs/y_log.csv --axes y --boot 500 --csv Logs/latency.csv
+"""
+
+import argparse
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from cftools.logstats import analyze_cached, print_report, write_table_csv
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE = ROOT / 'cache' / 'latency' / 'results.json'
+LAG_LOGS = ROOT / 'Logs'
+ANALYSIS_VERSION = 2
+AXES = ('x', 'y', 'z')
+CMD_COLUMNS = ('{}_cmd', 'sp_{}')
+EST_COLUMNS = ('{}_est', '{}')
+DEFAULTS = {'max_lag_s': 1.0, 'min_excitation': 0.02, 'boot': 200, 'block_s': 1.0, 'ci': 0.95}
+
+# (column, header, width, number format) of the summary table; None = text
+TABLE = [('file', 'file', 24, None), ('label', 'label', 12, None), ('axis', 'ax', 2, None),
+         ('status', 'status', 12, None), ('rate_hz', 'Hz', 5, '.1f'),
+         ('excitation', 'exc m', 6, '.3f'), ('xcorr_lag_ms', 'xcorr ms', 8, '.0f'),
+         ('xcorr_peak', 'peak', 5, '.2f'), ('dead_ms', 'dead ms', 7, '.0f'),
+         ('tau_ms', 'tau ms', 6, '.0f'), ('lag_ms', 'lag ms', 6, '.0f'),
+         ('lag_lo', 'lag lo', 6, '.0f'), ('lag_hi', 'lag hi', 6, '.0f'),
+         ('gain', 'K', 5, '.2f'), ('fit_r2', 'R2', 5, '.3f')]
+
+
+def _cache_key(digest, settings):
+    opts = ':'.join(f'{k}{settings[k]:g}' for k in sorted(settings))
+    return f'{digest}:v{ANALYSIS_VERSION}:{opts}'
+
+
+def resample(t, u, y):
+    """u and y on a uniform grid at the median sample spacing (rows with a NaN dropped)."""
+    ok = np.isfinite(t) & np.isfinite(u) & np.isfinite(y)
+    t, u, y = t[ok], u[ok], y[ok]
+    if t.size < 3:
+        return None, u, y
+    dt = float(np.median(np.diff(t)))
+    if not dt > 0:
+        return None, u, y
+    grid = np.arange(t[0], t[-1], dt)
+    return dt, np.interp(grid, t, u), np.interp(grid, t, y)
+
+
+def _parabola(v, i):
+    """Sub-sample offset of the extremum of v around index i."""
+    if 0 < i < v.size - 1:
+        den = v[i - 1] - 2 * v[i] + v[i + 1]
+        if den != 0:
+            return float(np.clip(0.5 * (v[i - 1] - v[i + 1]) / den, -0.5, 0.5))
+    return 0.0
+
+
+def xcorr_lag(u, y, max_lag):
+    """(lag in samples, normalized peak) of y trailing u, over lags 0..max_lag, from their increments."""
+    du = np.diff(u) - np.mean(np.diff(u))
+    dy = np.diff(y) - np.mean(np.diff(y))
+    norm = math.sqrt(float(du @ du) * float(dy @ dy))
+    if norm == 0:
+        return float('nan'), float('nan')
+    n = 1 << int(np.ceil(np.log2(2 * du.size)))
+    cc = np.fft.irfft(np.conj(np.fft.rfft(du, n)) * np.fft.rfft(dy, n), n)[:max_lag + 1] / norm
+    i = int(np.argmax(cc))
+    return i + _parabola(cc, i), float(cc[i])
+
+
+def _block_weights(n, boot, block, rng):
+    """(boot, n) moving-block bootstrap row counts."""
+    nb = -(-n // block)
+    starts = rng.integers(0, max(1, n - block + 1), size=(boot, nb))
+    idx = (starts[:, :, None] + np.arange(block)).reshape(boot, -1)[:, :n]
+    w = np.zeros((boot, n))
+    np.add.at(w, (np.arange(boot)[:, None], idx), 1.0)
+    return w
+
+
+def fopdt_fit(u, y, dt, max_lag, boot=200, block=25, seed=0):
+    """
+    FOPDT fit for every dead time 0..max_lag samples at once. Returns
+    {'dead', 'tau', 'gain', 'r2'} of the full data plus the 'boot_lag' (dead + tau)
+    array from the block bootstrap (seconds). Only the lag is well determined
+    under noise, see the module docstring.
+    """
+    D = max_lag + 1
+    y0, y1 = y[max_lag:-1], y[max_lag + 1:]
+    n = y1.size
+    # Regressors of every candidate delay: (rows, D, 3) = [y[k], u[k-d], 1]
+    ud = np.lib.stride_tricks.sliding_window_view(u[:-1], D)[:, ::-1]
+    X = np.stack([np.broadcast_to(y0[:, None], (n, D)), ud, np.ones((n, D))], axis=-1)
+    XX = np.einsum('kdi,kdj->kdij', X, X).reshape(n, -1)
+    Xy = (X * y1[:, None, None]).reshape(n, -1)
+    yy = y1 * y1
+
+    rng = np.random.default_rng(seed)
+    w = np.vstack([np.ones((1, n)), _block_weights(n, boot, min(block, n), rng)])
+    G = (w @ XX).reshape(-1, D, 3, 3) + 1e-12 * np.eye(3)
+    h = (w @ Xy).reshape(-1, D, 3)
+    theta = np.linalg.solve(G, h[..., None])[..., 0]          # (1 + boot, D, 3)
+    sse = (w @ yy)[:, None] - np.einsum('bdi,bdi->bd', theta, h)
+
+    best = np.argmin(sse, axis=1)
+    frac = np.array([_parabola(s, i) for s, i in zip(sse, best)])
+    a, b = np.take_along_axis(theta, best[:, None, None], axis=1)[:, 0, :2].T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = np.where((a > 0) & (a < 1), -dt / np.log(a), np.nan)
+        gain = np.where(a < 1, b / (1 - a), np.nan)
+    dead = (best + frac + 0.5) * dt         # the fit holds u[k] over a step: half a sample late
+    var = float(np.var(y1))
+    r2 = 1 - sse[0, best[0]] / (n * var) if var > 0 else float('nan')
+    return {'dead': float(dead[0]), 'tau': float(tau[0]), 'gain': float(gain[0]), 'r2': float(r2),
+            'boot_lag': dead[1:] + tau[1:]}
+
+
+def _interval(samples, ci):
+    s = samples[np.isfinite(samples)]
+    if s.size < 10:
+        return float('nan'), float('nan')
+    q = 50 * (1 - ci)
+    lo, hi = np.percentile(s, [q, 100 - q])
+    return float(lo), float(hi)
+
+
+def analyze_axis(t, u, y, max_lag_s=1.0, min_excitation=0.02, boot=200, block_s=1.0, ci=0.95):
+    """Latency metrics of one axis; t in s, u commanded and y estimated position (m)."""
+    out = {'status': 'ok', 'samples': int(t.size)}
+    for k in ('rate_hz', 'excitation', 'xcorr_lag_ms', 'xcorr_peak', 'dead_ms', 'tau_ms',
+              'lag_ms', 'lag_lo', 'lag_hi', 'gain', 'fit_r2'):
+        out[k] = float('nan')
+    dt, u, y = resample(t, u, y)
+    if dt is None:
+        out['status'] = 'too short'
+        return out
+    out['rate_hz'] = 1.0 / dt
+    out['excitation'] = float(np.std(u))
+    max_lag = max(1, int(round(max_lag_s / dt)))
+    if out['excitation'] < min_excitation:
+        out['status'] = 'not excited'
+        return out
+    if u.size < 4 * max_lag + 10:
+        out['status'] = 'too short'
+        return out
+
+    lag, peak = xcorr_lag(u, y, max_lag)
+    out['xcorr_lag_ms'], out['xcorr_peak'] = lag * dt * 1e3, peak
+
+    fit = fopdt_fit(u, y, dt, max_lag, boot=boot, block=max(1, int(round(block_s / dt))))
+    out['dead_ms'], out['tau_ms'] = fit['dead'] * 1e3, fit['tau'] * 1e3
+    out['lag_ms'] = out['dead_ms'] + out['tau_ms']
+    out['gain'], out['fit_r2'] = fit['gain'], fit['r2']
+    out['lag_lo'], out['lag_hi'] = _interval(fit['boot_lag'] * 1e3, ci)
+    if not math.isfinite(out['tau_ms']):
+        out['status'] = 'no 1st order'
+    return out
+
+
+def _column(df, patterns, axis):
+    for p in patterns:
+        if p.format(axis) in df:
+            return p.format(axis)
+    return None
+
+
+def analyze_file(path, axes=AXES, **settings):
+    """[metrics dict per label and axis] of one log; axes without command+estimate columns are left out."""
+    from cftools.binlog import load_log
+
+    df = load_log(path)
+    if 't_sec' not in df:
+        raise ValueError(f'{path}: no t_sec column')
+    groups = df.groupby('label', sort=False, observed=True) if 'label' in df else [('', df)]
+    runs = []
+    for label, g in groups:
+        t = g['t_sec'].to_numpy(dtype=float)
+        for axis in axes:
+            cu, cy = _column(g, CMD_COLUMNS, axis), _column(g, EST_COLUMNS, axis)
+            if cu is None or cy is None:
+                continue
+            r = analyze_axis(t, g[cu].to_numpy(dtype=float), g[cy].to_numpy(dtype=float), **settings)
+            runs.append({'label': str(label), 'axis': axis, **r})
+    return runs
+
+
+def analyze_dir(paths, cache_path=DEFAULT_CACHE, jobs=None, axes=AXES, rebuild=False, **settings):
+    """
+    Latency of every log under 'paths'; (rows, info) as in
+    cftools.logstats.analyze_cached(). All axes are analyzed and cached,
+    'axes' only filters the rows; logs without a command/estimate pair give none.
+    """
+    settings = {**DEFAULTS, **settings}
+    rows, info = analyze_cached(paths, analyze_file, lambda digest: _cache_key(digest, settings),
+                                cache_path, jobs=jobs, rebuild=rebuild, **settings)
+    return [r for r in rows if r['axis'] in axes], info
+
+
+def feedforward_s(rows, axis='y', min_r2=0.5):
+    """(look-ahead s, runs used): median lag_ms of the good fits on 'axis'; (nan, 0) if there are none."""
+    lags = [r['lag_ms'] for r in rows if r['axis'] == axis and r['status'] == 'ok'
+            and r['fit_r2'] >= min_r2 and math.isfinite(r['lag_ms'])]
+    if not lags:
+        return float('nan'), 0
+    return float(np.median(lags)) / 1e3, len(lags)
+
+
+def measured_feedforward(lag_from, axis='y', **kw):
+    """The feed-forward look-ahead (s) measured from the logs under 'lag_from'; ValueError if none fit."""
+    rows, info = analyze_dir([lag_from], axes=(axis,), **kw)
+    ff, n = feedforward_s(rows, axis=axis)
+    if n == 0:
+        raise ValueError(f'no usable {axis} command/estimate runs under {lag_from} '
+                         f'({info["files"]} logs, {len(info["errors"])} failed); fly '
+                         f'Tests/test_seq_Wlog.py first (it records into {LAG_LOGS})')
+    return ff, n
+
+
+def ff_arg(s):
+    """argparse type of --vy_ff: seconds, or 'auto' to measure it with measured_feedforward()."""
+    return s if s == 'auto' else float(s)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Per-axis command-to-estimate latency over many logs')
+    ap.add_argument('paths', nargs='+', help='log folders and/or files (.csv, .cflog)')
+    ap.add_argument('--axes', nargs='+', choices=AXES, default=list(AXES))
+    ap.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    ap.add_argument('--max_lag_s', type=float, default=DEFAULTS['max_lag_s'])
+    ap.add_argument('--min_excitation', type=float, default=DEFAULTS['min_excitation'],
+                    help='minimum command std to analyze an axis (m)')
+    ap.add_argument('--boot', type=int, default=DEFAULTS['boot'], help='bootstrap resamples')
+    ap.add_argument('--block_s', type=float, default=DEFAULTS['block_s'], help='bootstrap block length')
+    ap.add_argument('--ci', type=float, default=DEFAULTS['ci'], help='confidence level')
+    ap.add_argument('--cache', default=str(DEFAULT_CACHE))
+    ap.add_argument('--rebuild', action='store_true', help='ignore cached results')
+    ap.add_argument('--csv', default='', help='also write the table as CSV')
+    args = ap.parse_args(argv)
+
+    rows, info = analyze_dir(args.paths, cache_path=args.cache, jobs=args.jobs, axes=tuple(args.axes),
+                             rebuild=args.rebuild, max_lag_s=args.max_lag_s,
+                             min_excitation=args.min_excitation, boot=args.boot,
+                             block_s=args.block_s, ci=args.ci)
+    print_report(rows, info, TABLE)
+    for axis in args.axes:
+        ff, n = feedforward_s(rows, axis=axis)
+        if n:
+            print(f'{axis}: feed-forward look-ahead {ff:.3f} s (median lag of {n} runs)')
+    if args.csv:
+        write_table_csv(rows, args.csv, TABLE)
+        print(f'Saved: {args.csv}')
+    return 1 if info['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Pack log variables into the fewest LogConfig blocks that fit the radio payload.
+
+Each log block becomes one CRTP packet per period, and a packet carries at
+most LogConfig.MAX_LEN (26) bytes of variables. The old make_log_configs()
+split nine floats into two hand-made blocks with no size check. Here we:
+
+1. look every variable up in the cached log TOC (the shared TOC cache of
+   cftools.toccache, or a cflib JSON cache folder) to get its stored type,
+2. pick the fetch type from the requested precision (e.g. FP16 for floats
+   that only need ~0.05 % relative precision),
+3. quantize the requested rate to the 10 ms firmware period,
+4. first-fit-decreasing bin-pack the variables, fastest rate first. Slower
+   variables can ride in spare bytes of faster blocks, because a packet that
+   is sent anyway costs nothing extra.
+
+Usage:
+    plan = plan_log_blocks([('stateEstimate.x', 100, 'fp16'),
+                            ('acc.z', 100),
+                            ('pm.vbat', 10)], toc=load_log_toc())
+    print(plan.summary())
+    configs = plan.log_configs()          # cflib LogConfig objects
+
+CLI (from the CrazyFlie folder):
+    python -m cftools.logplan stateEstimate.x@100:fp16 acc.z@100 pm.vbat@10
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+MAX_PAYLOAD = 26          # bytes of variables per log packet (cflib LogConfig.MAX_LEN)
+MAX_BLOCKS = 16           # cflib Log.MAX_BLOCKS
+MAX_VARIABLES = 128       # cflib Log.MAX_VARIABLES
+PERIOD_QUANTUM_MS = 10    # firmware log period unit
+
+TYPE_SIZES = {'uint8_t': 1, 'int8_t': 1, 'uint16_t': 2, 'int16_t': 2,
+              'uint32_t': 4, 'int32_t': 4, 'float': 4, 'FP16': 2}
+PRECISION_ALIASES = {'fp16': 'FP16', 'half': 'FP16', 'float': 'float', 'float32': 'float',
+                     'int16': 'int16_t', 'uint16': 'uint16_t', 'int8': 'int8_t', 'uint8': 'uint8_t',
+                     'int32': 'int32_t', 'uint32': 'uint32_t'}
+FP16_REL_PRECISION = 2.0 ** -11
+
+
+def load_log_toc(cache_dir=None):
+    """
+    {'group.name': ctype} of every cached log TOC variable. cache_dir: a cflib
+    JSON cache folder; None reads the shared TOC cache and its seed folder.
+    """
+    if cache_dir is None:
+        from cftools.toccache import shared_cache
+
+        return shared_cache().ctypes('log')
+    toc = {}
+    for path in sorted(Path(cache_dir).glob('*.json')):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        for group, elems in data.items():
+            for name, e in elems.items():
+                if e.get('__class__') == 'LogTocElement':
+                    toc[f'{group}.{name}'] = e['ctype']
+    return toc
+
+
+def period_ms_for_rate(rate_hz):
+    """Firmware log period for a requested rate (10 ms steps, 10..2540 ms)."""
+    steps = round(1000.0 / rate_hz / PERIOD_QUANTUM_MS)
+    return PERIOD_QUANTUM_MS * min(max(1, steps), 254)
+
+
+def fetch_type(stored, precision=None):
+    """
+    Type to fetch a variable as.
+    precision: None -> stored type, a type name/alias -> that type,
+               a number -> allowed relative error (FP16 for floats if it is coarse enough).
+    """
+    if precision is None:
+        return stored
+    if isinstance(precision, (int, float)):
+        if stored == 'float' and precision >= FP16_REL_PRECISION:
+            return 'FP16'
+        return stored
+    t = PRECISION_ALIASES.get(str(precision).lower(), precision)
+    if t not in TYPE_SIZES:
+        raise ValueError(f"unknown precision/type {precision!r}")
+    return t
+
+
+class LogBlock:
+    def __init__(self, name, period_ms):
+        self.name = name
+        self.period_ms = period_ms
+        self.variables = []       # (name, fetch_as, size)
+
+    @property
+    def size(self):
+        return sum(v[2] for v in self.variables)
+
+    @property
+    def free(self):
+        return MAX_PAYLOAD - self.size
+
+    @property
+    def rate_hz(self):
+        return 1000.0 / self.period_ms
+
+
+class LogPlan:
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    @property
+    def packets_per_s(self):
+        return sum(b.rate_hz for b in self.blocks)
+
+    @property
+    def payload_bytes_per_s(self):
+        return sum(b.rate_hz * b.size for b in self.blocks)
+
+    @property
+    def fill(self):
+        """Fraction of the sent payload bytes that carry variables."""
+        sent = sum(b.rate_hz * MAX_PAYLOAD for b in self.blocks)
+        return self.payload_bytes_per_s / sent if sent else 0.0
+
+    def variable_rates(self):
+        """{var name: achieved rate in Hz}."""
+        return {v[0]: b.rate_hz for b in self.blocks for v in b.variables}
+
+    def log_configs(self):
+        from cflib.crazyflie.log import LogConfig
+
+        configs = []
+        for b in self.blocks:
+            lc = LogConfig(name=b.name, period_in_ms=b.period_ms)
+            for name, fetch_as, _ in b.variables:
+                lc.add_variable(name, fetch_as)
+            configs.append(lc)
+        return configs
+
+    def summary(self):
+        lines = [f"{len(self.blocks)} log blocks, {self.packets_per_s:.0f} packets/s, "
+                 f"{self.payload_bytes_per_s:.0f} B/s payload ({self.fill:.0%} fill)"]
+        for b in self.blocks:
+            vs = ', '.join(f"{n}:{t}" for n, t, _ in b.variables)
+            lines.append(f"  {b.name}: {b.rate_hz:5.1f} Hz {b.size:2d}/{MAX_PAYLOAD} B  {vs}")
+        return '\n'.join(lines)
+
+
+def _normalize(spec):
+    if isinstance(spec, str):
+        return spec, None, None
+    if isinstance(spec, dict):
+        return spec['name'], spec.get('rate_hz'), spec.get('precision')
+    spec = tuple(spec) + (None, None)
+    return spec[0], spec[1], spec[2]
+
+
+def plan_log_blocks(variables, toc=None, default_rate_hz=100.0, share_faster=True, prefix='blk'):
+    """
+    variables: iterable of 'name', (name, rate_hz[, precision]) or
+               {'name', 'rate_hz', 'precision'}.
+    toc: {'group.name': ctype} from load_log_toc(); without it every variable
+         is assumed to be a float.
+    """
+    items = []
+    seen = set()
+    for spec in variables:
+        name, rate, precision = _normalize(spec)
+        if name in seen:
+            continue
+        seen.add(name)
+        if toc is not None and name not in toc:
+            raise KeyError(f"{name} is not in the log TOC")
+        stored = toc[name] if toc is not None else 'float'
+        t = fetch_type(stored, precision)
+        items.append((period_ms_for_rate(rate or default_rate_hz), len(items), name, t, TYPE_SIZES[t]))
+
+    if len(items) > MAX_VARIABLES:
+        raise ValueError(f"{len(items)} variables exceed the firmware limit of {MAX_VARIABLES}")
+
+    # Fastest first; within a rate, biggest first (first-fit decreasing), then request order.
+    items.sort(key=lambda it: (it[0], -it[4], it[1]))
+    blocks = []
+    for period, _, name, t, size in items:
+        target = None
+        for b in blocks:
+            if b.period_ms == period or (share_faster and b.period_ms < period):
+                if b.free >= size:
+                    target = b
+                    break
+        if target is None:
+            target = LogBlock(f'{prefix}{len(blocks)}', period)
+            blocks.append(target)
+        target.variables.append((name, t, size))
+
+    if len(blocks) > MAX_BLOCKS:
+        raise ValueError(f"plan needs {len(blocks)} blocks, firmware allows {MAX_BLOCKS}")
+    return LogPlan(blocks)
+
+
+def _parse_cli_var(s):
+    # name[@rate][:precision]
+    name, _, precision = s.partition(':')
+    name, _, rate = name.partition('@')
+    return name, float(rate) if rate else None, precision or None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Plan log blocks for a set of variables')
+    ap.add_argument('vars', nargs='+', help='name[@rate_hz][:precision], e.g. stateEstimate.x@100:fp16')
+    ap.add_argument('--cache', default=None, help='cflib JSON TOC cache folder (default: the shared TOC cache)')
+    ap.add_argument('--rate_hz', type=float, default=100.0, help='rate for variables without @rate')
+    args = ap.parse_args(argv)
+
+    toc = load_log_toc(args.cache)
+    if not toc:
+        print(f"No log TOC found in {args.cache or 'the shared TOC cache'}", file=sys.stderr)
+        return 1
+    specs = [_parse_cli_var(v) for v in args.vars]
+    plan = plan_log_blocks(specs, toc=toc, default_rate_hz=args.rate_hz)
+    print(plan.summary())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
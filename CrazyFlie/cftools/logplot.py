@@ -0,0 +1,203 @@
+"""
+Headless, decimated rendering of hover logs to PNG/SVG.
+
+plot_hover_log() hands every raw sample to matplotlib and waits on
+plt.show(). A figure is only so many pixels wide, so drawing more points
+than that only costs time. Here each series is first reduced to about the
+pixel width of the axes:
+
+- 'minmax' : per pixel column the min and the max sample, in time order
+             (keeps every spike, 2 points per column)
+- 'lttb'   : Largest-Triangle-Three-Buckets (one point per column, keeps the
+             visual shape, smoother output)
+
+and drawn with the Agg backend, so no display is needed. render_many()
+exports many logs in a process pool. Outputs are named <log stem>.<format>
+in the output folder and skipped while they are newer than their log, so
+regenerating the gallery only redraws what changed.
+
+CLI (from the CrazyFlie folder):
+    python -m cftools.logplot Logs/ --out "CF Log Plots"
+    python -m cftools.logplot Logs/hover_log_2_3.csv --format png svg --method lttb --force
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+DECIMATE_METHODS = ('minmax', 'lttb')
+FORMATS = ('png', 'svg', 'pdf')
+LOG_SUFFIXES = ('.csv', '.cflog')
+
+# (y label, [(column, legend)]) per panel, as in hover_log_plot.py
+PANELS = [('Position [m]', [('x', 'x (m)'), ('y', 'y (m)'), ('z', 'z (m)')]),
+          ('Velocity [m/s]', [('vx', 'vx (m/s)'), ('vy', 'vy (m/s)'), ('vz', 'vz (m/s)')]),
+          ('Acceleration [m/s²]', [('ax', 'ax (m/s^2)'), ('ay', 'ay (m/s^2)'), ('az', 'az (m/s^2)')])]
+
+
+def minmax_decimate(t, y, n_bins):
+    """Min and max sample of each of n_bins equal time bins, in time order (~2*n_bins points)."""
+    if t.size <= 2 * n_bins:
+        return t, y
+    span = t[-1] - t[0]
+    bins = np.minimum(((t - t[0]) / span * n_bins).astype(np.int64), n_bins - 1) if span > 0 \
+        else np.zeros(t.size, dtype=np.int64)
+    order = np.lexsort((y, bins))                   # by bin, then by value
+    starts = np.flatnonzero(np.r_[True, np.diff(bins[order]) != 0])
+    ends = np.r_[starts[1:], order.size] - 1
+    keep = np.unique(np.concatenate([order[starts], order[ends]]))
+    return t[keep], y[keep]
+
+
+def lttb(t, y, n_out):
+    """Largest-Triangle-Three-Buckets down to n_out points (first and last kept)."""
+    n = t.size
+    if n_out >= n or n_out < 3:
+        return t, y
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)    # n_out - 2 inner buckets
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for k in range(n_out - 2):
+        lo, hi = edges[k], edges[k + 1]
+        nlo, nhi = hi, edges[k + 2] if k + 2 < edges.size else n
+        ct, cy = t[nlo:nhi].mean(), y[nlo:nhi].mean()              # next bucket's centroid
+        area = np.abs((t[a] - ct) * (y[lo:hi] - y[a]) - (t[a] - t[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[k + 1] = a
+    return t[keep], y[keep]
+
+
+def decimate(t, y, n, method='minmax'):
+    """Drop NaNs, then reduce (t, y) to about n points with 'method' (None: keep everything)."""
+    ok = np.isfinite(t) & np.isfinite(y)
+    t, y = t[ok], y[ok]
+    if method is None:
+        return t, y
+    if method == 'minmax':
+        return minmax_decimate(t, y, max(1, n // 2))
+    if method == 'lttb':
+        return lttb(t, y, n)
+    raise ValueError(f"method must be one of {DECIMATE_METHODS} or None, got {method!r}")
+
+
+def build_figure(df, title, width_px=1600, method='minmax', dpi=100):
+    """The three-panel hover figure of plot_hover_log, each series decimated to width_px points."""
+    import matplotlib.pyplot as plt
+
+    fig, axs = plt.subplots(3, 1, figsize=(width_px / dpi, 10), dpi=dpi, sharex=True)
+    fig.suptitle(title, fontsize=14)
+    t = df['t_sec'].to_numpy(dtype=float)
+    for ax, (ylabel, series) in zip(axs, PANELS):
+        for col, legend in series:
+            if col in df:
+                ax.plot(*decimate(t, df[col].to_numpy(dtype=float), width_px, method), label=legend)
+        ax.set_ylabel(ylabel)
+        ax.legend()
+        ax.grid(True)
+    axs[-1].set_xlabel('Time [s]')
+    fig.tight_layout()
+    return fig
+
+
+def output_paths(log_path, out_dir, formats):
+    stem = Path(log_path).stem
+    return [Path(out_dir) / f'{stem}.{fmt}' for fmt in formats]
+
+
+def render_log(log_path, out_dir, formats=('png',), width_px=1600, method='minmax', dpi=100):
+    """Render one log headless to out_dir/<stem>.<fmt> for every format; returns the paths."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    from cftools.binlog import load_log
+
+    df = load_log(log_path)
+    fig = build_figure(df, f'Crazyflie Hover Log: {Path(log_path).name}', width_px, method, dpi)
+    outs = output_paths(log_path, out_dir, formats)
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    try:
+        for out in outs:
+            fig.savefig(out, dpi=dpi)
+    finally:
+        plt.close(fig)
+    return outs
+
+
+def _worker(job):
+    path, kw = job
+    t0 = time.perf_counter()
+    try:
+        render_log(path, **kw)
+        return path, time.perf_counter() - t0, None
+    except Exception as e:              # reported per file, the batch goes on
+        return path, time.perf_counter() - t0, f'{type(e).__name__}: {e}'
+
+
+def render_many(paths, out_dir, formats=('png',), width_px=1600, method='minmax', dpi=100,
+                jobs=None, force=False):
+    """
+    Render every log under 'paths' (folders or files) in parallel. Logs
+    whose outputs are all newer than the log are skipped unless force.
+    Returns [(path, seconds or None if skipped, error or None)].
+    """
+    files = []
+    for p in map(Path, paths):
+        files.extend(sorted(q for q in p.iterdir() if q.suffix in LOG_SUFFIXES) if p.is_dir() else [p])
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+
+    def fresh(f):
+        outs = output_paths(f, out_dir, formats)
+        return all(o.exists() and o.stat().st_mtime >= f.stat().st_mtime for o in outs)
+
+    todo = [f for f in files if force or not fresh(f)]
+    kw = {'out_dir': str(out_dir), 'formats': tuple(formats), 'width_px': width_px,
+          'method': method, 'dpi': dpi}
+    jobs_in = [(str(f), kw) for f in todo]
+    workers = min(jobs or os.cpu_count() or 1, max(1, len(todo)))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(_worker, jobs_in))
+    else:
+        done = [_worker(j) for j in jobs_in]
+    skipped = [(str(f), None, None) for f in files if f not in todo]
+    return done + skipped
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Headless decimated hover-log plots (PNG/SVG)')
+    ap.add_argument('paths', nargs='+', help='log folders and/or files (.csv, .cflog)')
+    ap.add_argument('--out', default='CF Log Plots', help='output folder')
+    ap.add_argument('--format', nargs='+', choices=FORMATS, default=['png'])
+    ap.add_argument('--width', type=int, default=1600, help='figure width in pixels')
+    ap.add_argument('--method', choices=DECIMATE_METHODS + ('none',), default='minmax')
+    ap.add_argument('--dpi', type=int, default=100)
+    ap.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    ap.add_argument('--force', action='store_true', help='redraw even if the plot is up to date')
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    results = render_many(args.paths, args.out, formats=args.format, width_px=args.width,
+                          method=None if args.method == 'none' else args.method, dpi=args.dpi,
+                          jobs=args.jobs, force=args.force)
+    failed = 0
+    for path, seconds, err in results:
+        if err is not None:
+            failed += 1
+            print(f'{Path(path).name}: {err}', file=sys.stderr)
+        elif seconds is not None:
+            print(f'{Path(path).name}: {seconds * 1e3:.0f} ms')
+    drawn = sum(1 for _, s, e in results if s is not None and e is None)
+    print(f'{drawn} drawn, {sum(1 for _, s, _ in results if s is None)} up to date, {failed} failed '
+          f'-> {args.out} ({time.perf_counter() - t0:.2f} s)')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Background, batched writer for log rows produced on the cflib callback thread.
+
+The log callbacks used to call csv.writer.writerow() while holding the shared
+lock, so every packet paid for float formatting and file I/O on the radio
+thread. LogSink.put() only stores the raw tuple in a preallocated ring buffer;
+a writer thread formats and writes rows in batches of up to 'batch' rows (or
+whatever has accumulated after 'flush_s' seconds).
+
+When the ring is full the 'policy' decides:
+- 'drop'  : discard the new row immediately (never stalls the callback)
+- 'block' : wait up to block_s for the writer to make room, then drop
+Rows put once close() has started are dropped (and counted) as well.
+
+With fsync_s set, the writer also os.fsync()s fileobj at most every fsync_s
+seconds (and once more on close), so a crash loses at most that much data.
+
+Usage:
+    with LogSink(csv.writer(f), fileobj=f, format_row=fmt) as sink:
+        ...                      # callbacks call sink.put((t, x, y, ...))
+    print(sink.summary())       # queued / written / dropped
+"""
+
+import os
+import threading
+import time
+
+SINK_POLICIES = ('drop', 'block')
+
+
+class LogSink:
+    def __init__(self, writer, fileobj=None, format_row=None, capacity=8192,
+                 batch=256, flush_s=0.25, policy='drop', block_s=0.05, fsync_s=None):
+        if policy not in SINK_POLICIES:
+            raise ValueError(f"policy must be one of {SINK_POLICIES}, got {policy!r}")
+        if capacity < 1 or batch < 1:
+            raise ValueError("capacity and batch must be >= 1")
+        self.writer = writer                # anything with writerows(), e.g. csv.writer
+        self.fileobj = fileobj              # flushed after each batch if given
+        self.format_row = format_row        # raw tuple -> row, runs on the writer thread
+        self.capacity = capacity
+        self.batch = min(batch, capacity)
+        self.flush_s = flush_s
+        self.policy = policy
+        self.block_s = block_s
+        self.fsync_s = fsync_s              # None: flush only, leave syncing to the OS
+        self._synced = time.monotonic()
+
+        self._buf = [None] * capacity
+        self._head = 0                      # next slot to fill
+        self._count = 0                     # rows waiting in the ring
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread = None
+
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.max_fill = 0
+        self.fsyncs = 0
+        self.error = None                   # first exception raised by the writer thread
+
+    # ---------- producer side (callback thread) ----------
+
+    def put(self, row):
+        """Queue one raw row. Returns False if it had to be dropped."""
+        with self._cond:
+            if self._closing:                 # the writer may have drained for the last time
+                self.dropped += 1
+                return False
+            if self._count >= self.capacity:
+                if self.policy == 'block':
+                    self._cond.wait_for(lambda: self._count < self.capacity or self._closing,
+                                        timeout=self.block_s)
+                if self._count >= self.capacity or self._closing:
+                    self.dropped += 1
+                    return False
+            self._buf[self._head] = row
+            self._head = (self._head + 1) % self.capacity
+            self._count += 1
+            self.queued += 1
+            if self._count > self.max_fill:
+                self.max_fill = self._count
+            if self._count == self.batch:
+                self._cond.notify_all()
+        return True
+
+    # ---------- writer thread ----------
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='LogSink', daemon=True)
+            self._thread.start()
+        return self
+
+    def _take(self):
+        """Pop everything currently in the ring (called with the lock held)."""
+        n = self._count
+        tail = (self._head - n) % self.capacity
+        if tail + n <= self.capacity:
+            rows = self._buf[tail:tail + n]
+            self._buf[tail:tail + n] = [None] * n
+        else:
+            k = self.capacity - tail
+            rows = self._buf[tail:] + self._buf[:n - k]
+            self._buf[tail:] = [None] * k
+            self._buf[:n - k] = [None] * (n - k)
+        self._count = 0
+        self._cond.notify_all()             # wake producers blocked on a full ring
+        return rows
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_s
+                while self._count < self.batch and not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._count == 0:
+                    if self._closing:
+                        self._sync(force=True)
+                        return
+                    continue
+                rows = self._take()
+
+            try:
+                if self.format_row is not None:
+                    rows = [self.format_row(r) for r in rows]
+                self.writer.writerows(rows)
+                if self.fileobj is not None:
+                    self.fileobj.flush()
+                    self._sync()
+            except Exception as e:          # keep draining so producers never stall
+                if self.error is None:
+                    self.error = e
+                with self._cond:            # put() counts its drops under the lock too
+                    self.dropped += len(rows)
+                continue
+            self.written += len(rows)
+            self.batches += 1
+
+    def _sync(self, force=False):
+        if self.fsync_s is None or self.fileobj is None:
+            return
+        now = time.monotonic()
+        if force or now - self._synced >= self.fsync_s:
+            try:
+                os.fsync(self.fileobj.fileno())
+            except (OSError, ValueError) as e:
+                if self.error is None:
+                    self.error = e
+            self._synced = now
+            self.fsyncs += 1
+
+    def close(self, timeout=5.0):
+        """Stop accepting rows, write out whatever is buffered and join the thread."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- reporting ----------
+
+    def stats(self):
+        return {'queued': self.queued, 'written': self.written, 'dropped': self.dropped,
+                'batches': self.batches, 'max_fill': self.max_fill, 'capacity': self.capacity,
+                'fsyncs': self.fsyncs}
+
+    def summary(self):
+        s = self.stats()
+        msg = (f"log sink: {s['queued']} queued, {s['written']} written, {s['dropped']} dropped "
+               f"({s['batches']} batches, peak fill {s['max_fill']}/{s['capacity']})")
+        if self.error is not None:
+            msg += f", writer error: {self.error!r}"
+        return msg
@@ -0,0 +1,325 @@
+"""
+Batch hover-log analytics over a folder of flight logs, with a content-hash cache.
+
+hover_log_plot.py looks at one log at a time. analyze_dir() takes every CSV
+(and .cflog) log in a folder, analyzes the ones it has not seen before in a
+process pool and prints one table, one row per run (file and label).
+
+Per run, from the samples where the vehicle is airborne:
+- settle_s     : takeoff to the point after which z stays within settle_tol of
+                 the hover height (median airborne z); z is smoothed by a
+                 smooth_s rolling median first and only excursions lasting
+                 min_excursion_s restart the count
+- hover_s      : length of that settled window, which ends where the final
+                 descent starts
+- rms_mm       : 3-D RMS error of the settled hover against the takeoff x/y
+                 and the hover height (MotionCommander holds x/y where it
+                 took off); rms_z_mm for z alone
+- drift_mm     : x/y shift between the first and the last 0.5 s of the hover,
+                 drift_mm_s the same per hover second
+- vel_noise    : RMS over the axes of the velocity std during the hover (m/s)
+- acc          : mean and std of az and RMS horizontal acceleration during
+                 the hover, peak |a| over the whole log (all in g, as logged)
+
+Results are cached by the SHA-256 of the file contents (plus the analysis
+version and settings), so renamed or touched files are not parsed again and
+edited ones are.
+
+CLI (from the CrazyFlie folder):
+    python -m cftools.logstats Logs/
+    python -m cftools.logstats Logs/ --jobs 8 --csv Logs/summary.csv
+    python -m cftools.logstats Logs/hover_log_2_3.csv --rebuild
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE = ROOT / 'cache' / 'logstats' / 'results.json'
+ANALYSIS_VERSION = 3
+LOG_SUFFIXES = ('.csv', '.cflog')
+
+# (column, header, width, number format) of the summary table; None = text
+TABLE = [('file', 'file', 26, None), ('label', 'label', 16, None),
+         ('duration_s', 'dur s', 6, '.1f'), ('rate_hz', 'Hz', 6, '.1f'),
+         ('hover_z', 'z m', 5, '.2f'), ('settle_s', 'settle s', 8, '.2f'),
+         ('hover_s', 'hover s', 7, '.1f'), ('rms_mm', 'rms mm', 7, '.1f'),
+         ('rms_z_mm', 'rms z mm', 8, '.1f'), ('drift_mm', 'drift mm', 8, '.1f'),
+         ('drift_mm_s', 'mm/s', 6, '.1f'), ('vel_noise', 'v noise', 7, '.3f'),
+         ('az_mean', 'az g', 6, '.3f'), ('az_std', 'az std', 6, '.3f'),
+         ('acc_xy_rms', 'axy rms', 7, '.3f'), ('acc_peak', 'a peak', 6, '.2f')]
+
+
+def file_hash(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _cache_key(digest, settle_tol, smooth_s, min_excursion_s):
+    return f'{digest}:v{ANALYSIS_VERSION}:tol{settle_tol:g}:med{smooth_s:g}:exc{min_excursion_s:g}'
+
+
+def _nan_dict(keys):
+    return {k: float('nan') for k in keys}
+
+
+def _rolling_median(v, n):
+    """Centred rolling median over n samples (made odd), edges padded with the end values."""
+    h = n // 2
+    if h == 0 or v.size < 2:
+        return v.copy()
+    return np.median(np.lib.stride_tricks.sliding_window_view(np.pad(v, h, mode='edge'), 2 * h + 1), axis=1)
+
+
+def analyze_run(t, cols, settle_tol=0.05, smooth_s=0.5, min_excursion_s=0.3):
+    """Metrics of one run; t in s, cols maps x..az to arrays (NaN where a block had no value)."""
+    out = {'samples': int(t.size), 'duration_s': float(t[-1] - t[0]) if t.size else 0.0}
+    out['rate_hz'] = (t.size - 1) / out['duration_s'] if out['duration_s'] > 0 else float('nan')
+    out.update(_nan_dict(['hover_z', 'settle_s', 'hover_s', 'rms_mm', 'rms_z_mm', 'drift_mm',
+                          'drift_mm_s', 'vel_noise', 'az_mean', 'az_std', 'acc_xy_rms', 'acc_peak']))
+
+    acc = np.column_stack([cols[k] for k in ('ax', 'ay', 'az')])
+    amag = np.linalg.norm(acc, axis=1)
+    if np.isfinite(amag).any():
+        out['acc_peak'] = float(np.nanmax(amag))
+
+    # z is smoothed by a rolling median so single noisy samples neither start the flight nor
+    # end the hover. Only rows with a z value count: NaN-z rows (another log block) are
+    # neither in nor out of the band.
+    zi = np.flatnonzero(np.isfinite(cols['z']))
+    if zi.size < 2:
+        return out
+    tz = t[zi]
+    # Samples per smooth_s from the mean interval: the radio delivers packets in bursts
+    n = int(round(smooth_s * (zi.size - 1) / (tz[-1] - tz[0]))) if tz[-1] > tz[0] else 1
+    zs = _rolling_median(cols['z'][zi], n)
+    z_hi = np.percentile(zs, 95)
+    air = np.flatnonzero(zs > max(0.05, 0.5 * z_hi))
+    if air.size < 2:
+        return out
+    zi, tz, zs = zi[air[0]:air[-1] + 1], tz[air[0]:air[-1] + 1], zs[air[0]:air[-1] + 1]
+    i0 = zi[0]
+    z_ref = float(np.median(cols['z'][zi][zs > max(0.05, 0.5 * z_hi)]))
+    out['hover_z'] = z_ref
+
+    # Settled window: ends at the last in-band sample before the final descent and begins
+    # after the last excursion out of the band lasting min_excursion_s.
+    # Final descent: the trailing run of samples from which z drops by more than half the
+    # band within the next smoothing window (slow hover drift does not count)
+    drop = zs - zs[np.minimum(np.arange(zi.size) + max(n, 1), zi.size - 1)]
+    falling = np.flatnonzero(drop > settle_tol / 2)
+    d = falling[-1] if falling.size else zi.size - 1
+    while d > 0 and drop[d - 1] > settle_tol / 2:
+        d -= 1
+    top = zs[d:d + max(n, 1) + 1]
+    d += top.size - 1 - int(np.argmax(top[::-1]))   # the (last) top it falls from
+    within = np.abs(zs[:d + 1] - z_ref) <= settle_tol
+    inside = np.flatnonzero(within)
+    if inside.size == 0:
+        return out
+    e = inside[-1]
+    first = inside[0]
+    # Runs of out-of-band samples between the first and the last in-band one
+    edges = np.flatnonzero(np.diff(within[first:e + 1].astype(np.int8))) + first + 1
+    starts, ends = edges[::2], edges[1::2]          # out-run [start, end): end is back in band
+    long_ = np.flatnonzero(tz[ends] - tz[starts] >= min_excursion_s)
+    s = zi[ends[long_[-1]]] if long_.size else zi[first]
+    j1 = zi[e]
+    out['settle_s'] = float(t[s] - t[i0])
+    out['hover_s'] = float(t[j1] - t[s])
+    w = slice(s, j1 + 1)
+    tw = t[w]
+
+    # Take-off point: the last position sample before leaving the ground
+    pre = np.flatnonzero(np.isfinite(cols['x'][:i0 + 1]) & np.isfinite(cols['y'][:i0 + 1]))
+    x0, y0 = (cols['x'][pre[-1]], cols['y'][pre[-1]]) if pre.size else (np.nan, np.nan)
+    ex, ey, ez = cols['x'][w] - x0, cols['y'][w] - y0, cols['z'][w] - z_ref
+    # Per-axis means: x/y and z may sit on different rows when the blocks are not merged
+    if all(np.isfinite(e).any() for e in (ex, ey, ez)):
+        out['rms_mm'] = float(np.sqrt(sum(np.nanmean(e * e) for e in (ex, ey, ez))) * 1e3)
+        out['rms_z_mm'] = float(np.sqrt(np.nanmean(ez * ez)) * 1e3)
+
+    if out['hover_s'] > 1.0:
+        head, tail = tw <= tw[0] + 0.5, tw >= tw[-1] - 0.5
+        dx = np.nanmean(cols['x'][w][tail]) - np.nanmean(cols['x'][w][head])
+        dy = np.nanmean(cols['y'][w][tail]) - np.nanmean(cols['y'][w][head])
+        out['drift_mm'] = float(math.hypot(dx, dy) * 1e3)
+        out['drift_mm_s'] = out['drift_mm'] / out['hover_s']
+
+    vstd = [np.nanstd(cols[k][w]) for k in ('vx', 'vy', 'vz') if np.isfinite(cols[k][w]).any()]
+    if vstd:
+        out['vel_noise'] = float(np.sqrt(np.mean(np.square(vstd))))
+    if np.isfinite(cols['az'][w]).any():
+        out['az_mean'] = float(np.nanmean(cols['az'][w]))
+        out['az_std'] = float(np.nanstd(cols['az'][w]))
+        out['acc_xy_rms'] = float(np.sqrt(np.nanmean(cols['ax'][w] ** 2 + cols['ay'][w] ** 2)))
+    return out
+
+
+def analyze_file(path, settle_tol=0.05, smooth_s=0.5, min_excursion_s=0.3):
+    """[metrics dict per label] of one CSV/.cflog hover log."""
+    from cftools.binlog import load_log
+
+    df = load_log(path)
+    if 't_sec' not in df:
+        raise ValueError(f"{path}: no t_sec column")
+    groups = df.groupby('label', sort=False, observed=True) if 'label' in df else [('', df)]
+    runs = []
+    for label, g in groups:
+        t = g['t_sec'].to_numpy(dtype=float)
+        cols = {k: (g[k].to_numpy(dtype=float) if k in g else np.full(t.size, np.nan))
+                for k in ('x', 'y', 'z', 'vx', 'vy', 'vz', 'ax', 'ay', 'az')}
+        r = analyze_run(t, cols, settle_tol=settle_tol, smooth_s=smooth_s, min_excursion_s=min_excursion_s)
+        r['label'] = str(label)
+        runs.append(r)
+    return runs
+
+
+def _worker(job):
+    analyze, path, kwargs = job
+    try:
+        return analyze(path, **kwargs), None
+    except Exception as e:              # reported per file, the batch goes on
+        return None, f'{type(e).__name__}: {e}'
+
+
+def load_cache(cache_path):
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, cache_path):
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp, cache_path)
+
+
+def find_logs(paths):
+    files = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            files.extend(sorted(q for q in p.iterdir() if q.suffix in LOG_SUFFIXES))
+        else:
+            files.append(p)
+    return files
+
+
+def analyze_cached(paths, analyze, cache_key, cache_path, jobs=None, rebuild=False, **kwargs):
+    """
+    Run analyze(path, **kwargs) -> [row dict] on every log under 'paths'
+    (folders or files) whose cache_key(content digest) is not cached yet, in
+    a process pool ('analyze' must be a module-level function). Returns
+    (rows, info): rows tagged with 'file', info counts cache hits, parsed
+    files, errors and timings. Shared by logstats and cftools.latency.
+    """
+    t0 = time.perf_counter()
+    files = find_logs(paths)
+    cache = {} if rebuild else load_cache(cache_path)
+    keys = {f: cache_key(file_hash(f)) for f in files}
+    t_hash = time.perf_counter() - t0
+
+    todo = [f for f in files if keys[f] not in cache]
+    errors = {}
+    if todo:
+        workers = min(jobs or os.cpu_count() or 1, len(todo))
+        jobs_in = [(analyze, str(f), kwargs) for f in todo]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_worker, jobs_in))
+        else:
+            results = [_worker(j) for j in jobs_in]
+        for (runs, err), f in zip(results, todo):
+            if err is not None:
+                errors[f.name] = err
+            else:
+                cache[keys[f]] = runs
+        save_cache(cache, cache_path)
+
+    rows = []
+    for f in files:
+        for r in cache.get(keys[f], []):
+            rows.append({'file': f.name, **r})
+    info = {'files': len(files), 'cached': len(files) - len(todo), 'parsed': len(todo) - len(errors),
+            'errors': errors, 'hash_s': t_hash, 'total_s': time.perf_counter() - t0}
+    return rows, info
+
+
+def analyze_dir(paths, cache_path=DEFAULT_CACHE, jobs=None, settle_tol=0.05, smooth_s=0.5,
+                min_excursion_s=0.3, rebuild=False):
+    """Hover metrics of every log under 'paths'; (rows, info) as in analyze_cached()."""
+    return analyze_cached(paths, analyze_file,
+                          lambda digest: _cache_key(digest, settle_tol, smooth_s, min_excursion_s),
+                          cache_path, jobs=jobs, rebuild=rebuild, settle_tol=settle_tol,
+                          smooth_s=smooth_s, min_excursion_s=min_excursion_s)
+
+
+def format_table(rows, table=TABLE):
+    lines = [' '.join(f'{h:<{w}}' if fmt is None else f'{h:>{w}}' for _, h, w, fmt in table)]
+    for r in rows:
+        lines.append(' '.join(f"{str(r.get(k, ''))[:w]:<{w}}" if fmt is None
+                              else f"{r.get(k, float('nan')):{w}{fmt}}" for k, _, w, fmt in table))
+    return '\n'.join(lines)
+
+
+def write_table_csv(rows, path, table=TABLE):
+    first = [k for k, _, _, _ in table]
+    keys = first + sorted({k for r in rows for k in r} - set(first))
+    with open(path, 'w', newline='') as f:
+        w = csv.DictWriter(f, fieldnames=keys)
+        w.writeheader()
+        w.writerows(rows)
+
+
+def print_report(rows, info, table=TABLE):
+    """The table, the per-file errors (stderr) and the cache/timing line."""
+    print(format_table(rows, table))
+    for name, err in info['errors'].items():
+        print(f'{name}: {err}', file=sys.stderr)
+    print(f"\n{info['files']} logs: {info['cached']} cached, {info['parsed']} parsed, "
+          f"{len(info['errors'])} failed ({info['total_s']:.2f} s, hashing {info['hash_s'] * 1e3:.0f} ms)")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Hover-log analytics over many logs (cached by content hash)')
+    ap.add_argument('paths', nargs='+', help='log folders and/or files (.csv, .cflog)')
+    ap.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    ap.add_argument('--settle_tol', type=float, default=0.05, help='hover height band for settling (m)')
+    ap.add_argument('--smooth_s', type=float, default=0.5, help='rolling-median window on z before the band test (s)')
+    ap.add_argument('--min_excursion_s', type=float, default=0.3,
+                    help='shortest time out of the band that restarts the settled window (s)')
+    ap.add_argument('--cache', default=str(DEFAULT_CACHE))
+    ap.add_argument('--rebuild', action='store_true', help='ignore cached results')
+    ap.add_argument('--csv', default='', help='also write the table as CSV')
+    args = ap.parse_args(argv)
+
+    rows, info = analyze_dir(args.paths, cache_path=args.cache, jobs=args.jobs,
+                             settle_tol=args.settle_tol, smooth_s=args.smooth_s,
+                             min_excursion_s=args.min_excursion_s, rebuild=args.rebuild)
+    print_report(rows, info)
+    if args.csv:
+        write_table_csv(rows, args.csv)
+        print(f'Saved: {args.csv}')
+    return 1 if info['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
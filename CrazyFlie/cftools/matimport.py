@@ -0,0 +1,321 @@
+"""
+Import the MATLAB optimal swing-up trajectories into flyable Trajectory objects.
+
+Sources (Matlab Stuff/):
+- STATE_0.15to0.5.mat, FL_/FR_0.15to0.5.mat : length sweep, state (101, 8, n)
+  and forces (100, n), one column per pendulum length
+- data/state_optimal_<tag>.mat               : single runs, state (101, 8)
+- data/fl_opt_<tag>.mat, fr_opt_<tag>.mat    : their forces (100, 1); <tag> is
+  a length ('0.35') or a target angle ('178deg')
+
+The optimizer (swingup .mlx) integrates Dynamics.m with forward Euler over
+N = 100 intervals of T = 4 s, so state[k+1] = state[k] + h * f(state[k], u[k])
+holds to machine precision. That is used twice:
+- the rod length of a sweep column is recovered by fitting that one-step
+  residual, instead of trusting the file name ranges (the bundles hold a
+  duplicated 0.30 and 0.35 column and start at 0.16 m);
+- angle runs that only saved forces (fl_opt_45deg.mat, ...) get their state
+  back by rolling the Euler map forward (all of them were run at L = 0.3 m).
+
+compile_library() writes every run at its native 101 knots to one .npz
+(cache/optimal_trajectories.npz). It is rebuilt only when a source file
+changes, so at flight time load_trajectory() is an np.load plus a resample.
+
+State order is [y, z, phi, theta, y_d, z_d, phi_d, theta_d] in m and rad; the
+returned Trajectory is world-frame m with x = 0, yaw = 0 and vy = y_d.
+
+Usage:
+    traj = load_trajectory(length=0.35, rate_hz=50)
+    traj = load_trajectory(angle_deg=135)
+    seq = to_sequence_mm(traj)            # [(x, y, z, yaw)] like sideways_test.sequence_mm
+
+CLI (from the CrazyFlie folder):
+    python -m cftools.matimport --list
+    python -m cftools.matimport --length 0.35 --rate_hz 50 --csv Tests/Traj_L035.csv
+"""
+
+import argparse
+import hashlib
+import re
+from pathlib import Path
+
+import numpy as np
+
+from cftools.pendulum_sim import STATE, PendulumParams, derivatives
+from cftools.trajectory import Trajectory
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_MAT_DIR = ROOT.parent / 'Matlab Stuff'
+DEFAULT_ARTIFACT = ROOT / 'cache' / 'optimal_trajectories.npz'
+ARTIFACT_VERSION = 1
+
+T_OPT = 4.0                    # optimizer horizon (s)
+N_OPT = 100                    # control intervals (101 states)
+ANGLE_SWEEP_L = 0.3            # rod length used for the fl_opt_<angle>deg runs
+START_STATE = (0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+SWEEP_FILES = ('STATE_0.15to0.5.mat', 'FL_0.15to0.5.mat', 'FR_0.15to0.5.mat')
+STATE_RE = re.compile(r'state_optimal_(?P<tag>[\d.]+)\.mat$')
+FORCE_RE = re.compile(r'(?P<side>fl|fr)_opt_(?P<tag>[\d.]+(?:deg)?)\.mat$')
+
+
+def _loadmat_array(path):
+    """The single data array of a .mat file (keys differ between runs: Fl_opt, FL_opt, fl35, ...)."""
+    from scipy.io import loadmat
+    arrays = [v for k, v in loadmat(str(path)).items() if not k.startswith('__')]
+    if len(arrays) != 1:
+        raise ValueError(f"{path}: expected one array, found {len(arrays)}")
+    return np.asarray(arrays[0], dtype=float)
+
+
+def euler_residual(state, fl, fr, L, h=T_OPT / N_OPT):
+    """Max one-step residual |x[k] + h f(x[k], u[k]) - x[k+1]| for each candidate rod length."""
+    L = np.atleast_1d(np.asarray(L, dtype=float))
+    n, N = L.size, fl.size
+    p = PendulumParams(L=np.repeat(L, N))                    # one system per (length, step)
+    x = np.tile(state[:-1], (n, 1))
+    u = np.tile(np.stack([fl, fr], axis=1), (n, 1))
+    r = np.abs(x + h * derivatives(p, x, u) - np.tile(state[1:], (n, 1)))
+    return r.reshape(n, N * 8).max(axis=1)
+
+
+def fit_length(state, fl, fr, lo=0.05, hi=1.0, step=0.001):
+    """(L, residual) of the rod length that best explains a run (grid search, 1 mm)."""
+    grid = np.round(np.arange(lo, hi + step / 2, step), 6)
+    res = euler_residual(state, fl, fr, grid)
+    i = int(np.argmin(res))
+    return float(grid[i]), float(res[i])
+
+
+def rollout(fl, fr, L, x0=START_STATE, h=T_OPT / N_OPT):
+    """State (N+1, 8) of the optimizer's forward-Euler model driven by the forces."""
+    p = PendulumParams(L=L)
+    X = np.empty((fl.size + 1, 8))
+    X[0] = x0
+    for k in range(fl.size):
+        X[k + 1] = X[k] + h * derivatives(p, X[k:k + 1], np.array([[fl[k], fr[k]]]))[0]
+    return X
+
+
+class OptimalRun:
+    """One optimizer solution: state (101, 8) and forces fl, fr (100,) on the T_OPT grid."""
+
+    def __init__(self, name, length, state, fl, fr, source, residual=0.0):
+        self.name = name
+        self.length = float(length)
+        self.state = np.asarray(state, dtype=float)
+        self.fl = np.asarray(fl, dtype=float).ravel()
+        self.fr = np.asarray(fr, dtype=float).ravel()
+        self.source = source
+        self.residual = float(residual)
+        self.t = np.linspace(0.0, T_OPT, self.state.shape[0])
+
+    @property
+    def angle_deg(self):
+        """Final pendulum angle (the swing-up target), degrees."""
+        return float(np.rad2deg(self.state[-1, 3]))
+
+    def __repr__(self):
+        return f"OptimalRun({self.name!r}, L={self.length:.3f} m, {self.angle_deg:.1f} deg)"
+
+
+# ---------- reading the .mat files ----------
+
+def scan_mat_dir(mat_dir=DEFAULT_MAT_DIR):
+    """Every usable run in the MATLAB folder, single runs first, then the length sweep."""
+    mat_dir = Path(mat_dir)
+    data = mat_dir / 'data'
+    runs = []
+
+    forces = {}
+    for f in sorted(data.glob('f[lr]_opt_*.mat')):
+        m = FORCE_RE.match(f.name)
+        if m:
+            forces.setdefault(m['tag'].replace('deg', ''), {})[m['side']] = _loadmat_array(f).ravel()
+
+    with_state = set()
+    for f in sorted(data.glob('state_optimal_*.mat')):
+        m = STATE_RE.match(f.name)
+        u = forces.get(m['tag']) if m else None
+        if not u or len(u) != 2:
+            continue
+        state = _loadmat_array(f)
+        L, res = fit_length(state, u['fl'], u['fr'])
+        runs.append(OptimalRun(f'state_optimal_{m["tag"]}', L, state, u['fl'], u['fr'],
+                               f'data/{f.name}', res))
+        with_state.add(m['tag'])
+
+    # Angle runs that only saved forces
+    for tag, u in sorted(forces.items(), key=lambda kv: float(kv[0])):
+        if tag in with_state or len(u) != 2 or float(tag) < 10:
+            continue
+        runs.append(OptimalRun(f'opt_{tag}deg', ANGLE_SWEEP_L,
+                               rollout(u['fl'], u['fr'], ANGLE_SWEEP_L), u['fl'], u['fr'],
+                               f'data/fl_opt_{tag}deg.mat'))
+
+    paths = [mat_dir / n for n in SWEEP_FILES]
+    if all(p.exists() for p in paths):
+        S, FL, FR = (_loadmat_array(p) for p in paths)
+        seen = {}
+        for j in range(S.shape[2]):
+            L, res = fit_length(S[:, :, j], FL[:, j], FR[:, j])
+            key = round(L, 3)
+            # Duplicated columns: keep the one the model explains best
+            if key in seen and seen[key].residual <= res:
+                continue
+            seen[key] = OptimalRun(f'sweep_L{key:.2f}', L, S[:, :, j], FL[:, j], FR[:, j],
+                                   f'{SWEEP_FILES[0]}[:, :, {j}]', res)
+        runs.extend(seen[k] for k in sorted(seen))
+    return runs
+
+
+def _source_key(mat_dir):
+    """Fingerprint of the source .mat files (name, size, mtime)."""
+    h = hashlib.sha1(f'v{ARTIFACT_VERSION}'.encode())
+    for f in sorted(Path(mat_dir).glob('*.mat')) + sorted((Path(mat_dir) / 'data').glob('*.mat')):
+        st = f.stat()
+        h.update(f'{f.name}:{st.st_size}:{st.st_mtime_ns};'.encode())
+    return h.hexdigest()
+
+
+# ---------- compiled artifact ----------
+
+def compile_library(mat_dir=DEFAULT_MAT_DIR, artifact=DEFAULT_ARTIFACT):
+    """Read all runs and write them to one .npz; returns the list of runs."""
+    runs = scan_mat_dir(mat_dir)
+    if not runs:
+        raise FileNotFoundError(f"no optimal trajectories found in {mat_dir}")
+    artifact = Path(artifact)
+    artifact.parent.mkdir(parents=True, exist_ok=True)
+    tmp = artifact.with_name(artifact.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        np.savez(f, version=ARTIFACT_VERSION, key=_source_key(mat_dir),
+                 name=np.array([r.name for r in runs]),
+                 source=np.array([r.source for r in runs]),
+                 length=np.array([r.length for r in runs]),
+                 residual=np.array([r.residual for r in runs]),
+                 state=np.stack([r.state for r in runs]),
+                 fl=np.stack([r.fl for r in runs]),
+                 fr=np.stack([r.fr for r in runs]))
+    tmp.replace(artifact)
+    return runs
+
+
+def load_library(artifact=DEFAULT_ARTIFACT, mat_dir=DEFAULT_MAT_DIR, rebuild=False):
+    """
+    Runs from the compiled artifact, recompiling it first if it is missing or
+    older than the .mat files. Without the MATLAB folder (e.g. on the flight
+    laptop) the artifact is used as is.
+    """
+    artifact, mat_dir = Path(artifact), Path(mat_dir)
+    have_src = mat_dir.is_dir()
+    if rebuild or not artifact.exists():
+        return compile_library(mat_dir, artifact)
+    with np.load(artifact) as z:
+        stale = int(z['version']) != ARTIFACT_VERSION or (have_src and str(z['key']) != _source_key(mat_dir))
+        if not stale:
+            return [OptimalRun(str(n), L, s, fl, fr, str(src), res)
+                    for n, L, s, fl, fr, src, res in zip(z['name'], z['length'], z['state'], z['fl'],
+                                                        z['fr'], z['source'], z['residual'])]
+    if not have_src:
+        raise ValueError(f"{artifact} was written by another importer version; recompile it next to {mat_dir}")
+    return compile_library(mat_dir, artifact)
+
+
+def select_run(runs, length=None, angle_deg=None, tol_deg=0.5):
+    """
+    The run closest to the requested rod length and/or final angle. Among equally
+    close runs the first wins, so single runs are preferred over sweep columns.
+    """
+    cands = list(runs)
+    if angle_deg is not None:
+        best = min(abs(r.angle_deg - angle_deg) for r in cands)
+        cands = [r for r in cands if abs(r.angle_deg - angle_deg) <= best + tol_deg]
+    if length is not None:
+        best = min(abs(r.length - length) for r in cands)
+        cands = [r for r in cands if abs(r.length - length) <= best + 1e-9]
+    return cands[0]
+
+
+# ---------- resampling ----------
+
+def resample(run, rate_hz=50.0):
+    """
+    Columns of a run on a uniform rate_hz grid over [0, T_OPT]: states are
+    linearly interpolated, the forces are held (the optimizer applies them as
+    steps). Keys are STATE names plus 't', 'fl', 'fr'.
+    """
+    n = int(round(T_OPT * rate_hz))
+    t = np.linspace(0.0, T_OPT, n + 1)
+    out = {'t': t}
+    for j, k in enumerate(STATE):
+        out[k] = np.interp(t, run.t, run.state[:, j])
+    i = np.minimum((t / (T_OPT / run.fl.size)).astype(int), run.fl.size - 1)
+    out['fl'], out['fr'] = run.fl[i], run.fr[i]
+    return out
+
+
+def to_trajectory(run, rate_hz=50.0, y0=0.0, z0=None, vy_mode='linear'):
+    """World-frame Trajectory of a run (m). y0 / z0 move the start point; x and yaw are 0."""
+    s = resample(run, rate_hz)
+    dz = 0.0 if z0 is None else z0 - s['z'][0]
+    zeros = np.zeros_like(s['t'])
+    return Trajectory(s['t'], zeros, s['y'] - s['y'][0] + y0, s['z'] + dz, zeros,
+                      vy=s['y_d'], vy_mode=vy_mode)
+
+
+def load_trajectory(length=None, angle_deg=None, rate_hz=50.0, y0=0.0, z0=None,
+                    artifact=DEFAULT_ARTIFACT, mat_dir=DEFAULT_MAT_DIR):
+    """Select a run by rod length (m) and/or target angle (deg) and return it as a Trajectory."""
+    if length is None and angle_deg is None:
+        raise ValueError("give a pendulum length and/or a target angle")
+    run = select_run(load_library(artifact, mat_dir), length, angle_deg)
+    return to_trajectory(run, rate_hz, y0=y0, z0=z0)
+
+
+def to_sequence_mm(traj):
+    """[(x, y, z, yaw)] knots in mm, the layout of the hardcoded sequence_mm lists."""
+    return [(x * 1000.0, y * 1000.0, z * 1000.0, yaw)
+            for x, y, z, yaw in zip(traj.x.tolist(), traj.y.tolist(), traj.z.tolist(), traj.yaw.tolist())]
+
+
+def write_csv(traj, path):
+    """time_s,x,y,z,yaw_deg,vy CSV readable by Trajectory.from_csv and the test_seq scripts."""
+    with open(path, 'w', newline='') as f:
+        f.write('time_s,x,y,z,yaw_deg,vy\n')
+        for k in range(len(traj)):
+            f.write(f'{traj.t[k]:.4f},{traj.x[k]:.6f},{traj.y[k]:.6f},{traj.z[k]:.6f},'
+                    f'{traj.yaw[k]:.3f},{traj.vy[k]:.6f}\n')
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Import the MATLAB optimal trajectories')
+    ap.add_argument('--mat_dir', default=str(DEFAULT_MAT_DIR))
+    ap.add_argument('--artifact', default=str(DEFAULT_ARTIFACT))
+    ap.add_argument('--rebuild', action='store_true', help='recompile the artifact even if it is current')
+    ap.add_argument('--list', action='store_true', help='list the available runs')
+    ap.add_argument('--length', type=float, default=None, help='pendulum length (m)')
+    ap.add_argument('--angle', type=float, default=None, help='target pendulum angle (deg)')
+    ap.add_argument('--rate_hz', type=float, default=50.0)
+    ap.add_argument('--z0', type=float, default=None, help='start height (m), default as optimized')
+    ap.add_argument('--csv', default=None, help='write the selected trajectory as a Traj CSV')
+    args = ap.parse_args(argv)
+
+    runs = load_library(args.artifact, args.mat_dir, rebuild=args.rebuild)
+    if args.list or (args.length is None and args.angle is None):
+        for r in runs:
+            print(f'{r.name:<22} L={r.length:.3f} m  final {r.angle_deg:6.1f} deg  '
+                  f'fit {r.residual:.1e}  {r.source}')
+        return
+
+    run = select_run(runs, args.length, args.angle)
+    traj = to_trajectory(run, args.rate_hz, z0=args.z0)
+    print(f'{run}: {len(traj)} knots at {args.rate_hz:g} Hz, '
+          f'y {traj.y.min():+.3f}..{traj.y.max():+.3f} m, z {traj.z.min():.3f}..{traj.z.max():.3f} m')
+    if args.csv:
+        write_csv(traj, args.csv)
+        print(f'Saved: {Path(args.csv).resolve()}')
+
+
+if __name__ == '__main__':
+    main()
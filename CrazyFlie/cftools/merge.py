@@ -0,0 +1,161 @@
+"""
+Merge packets from several log blocks into one row per firmware sample instant.
+
+The hover logger used to write a full row on every packet of every block,
+stamped with the host clock, so a two-block config produced about two rows
+per real sample with half of the values repeated (and NaN-padded first rows).
+SampleMerger instead groups packets by their firmware timestamp (the 'ts'
+argument of the cflib callback, in ms). Blocks started a few ms apart land
+within 'tol_ms' of each other and share a row.
+
+A row is released once every known block has either contributed to it or
+already sent a later packet, or once the newest packet is more than
+max_wait_ms past it. Values of blocks that are missing from a row (e.g.
+slower blocks) are filled in by:
+- 'hold'   : the block's last value at or before the row time
+- 'interp' : linear interpolation between the block's samples around the row time
+
+Rows are emitted as (t_fw, t_host, *columns): firmware time and host
+monotonic time of the first packet of the row, both in seconds from the first
+packet.
+
+Usage:
+    merger = SampleMerger({'x': 'stateEstimate.x', 'az': 'acc.z'}, emit=sink.put,
+                          blocks=[lc.name for lc in log_configs])
+    for lc in log_configs:
+        lc.data_received_cb.add_callback(merger.on_packet)
+    ...
+    merger.flush()
+"""
+
+import time
+from collections import deque
+from threading import Lock
+
+MERGE_MODES = ('hold', 'interp')
+
+
+class _Group:
+    __slots__ = ('ts', 'host', 'values', 'blocks')
+
+    def __init__(self, ts, host):
+        self.ts = ts
+        self.host = host
+        self.values = {}
+        self.blocks = set()
+
+
+class SampleMerger:
+    def __init__(self, columns, emit, blocks=(), mode='hold', tol_ms=3, max_wait_ms=100,
+                 history=8, clock=time.monotonic):
+        if mode not in MERGE_MODES:
+            raise ValueError(f"mode must be one of {MERGE_MODES}, got {mode!r}")
+        self.columns = list(columns.items())      # (column, log variable)
+        self.emit = emit
+        self.mode = mode
+        self.tol_ms = tol_ms
+        self.max_wait_ms = max_wait_ms
+        self.clock = clock
+
+        self._groups = deque()                    # pending rows, ordered by ts
+        self._history = history
+        # block -> deque[(ts, data)]; pre-registering the expected blocks keeps
+        # the first rows from being released before every block has reported
+        self._hist = {b: deque(maxlen=history) for b in blocks}
+        self._newest = None
+        self._ts0 = None
+        self._host0 = None
+        self._lock = Lock()
+
+        self.packets = 0
+        self.rows = 0
+        self.filled = 0                           # values filled by hold/interp
+
+    # ---------- input (cflib callback thread) ----------
+
+    def on_packet(self, ts, data, logconf):
+        """cflib data_received_cb signature: (timestamp_ms, {var: value}, LogConfig)."""
+        self.add(ts, data, getattr(logconf, 'name', logconf))
+
+    def add(self, ts, data, block):
+        host = self.clock()
+        with self._lock:
+            self.packets += 1
+            if self._ts0 is None:
+                self._ts0, self._host0 = ts, host
+            if self._newest is None or ts > self._newest:
+                self._newest = ts
+
+            hist = self._hist.get(block)
+            if hist is None:
+                hist = self._hist[block] = deque(maxlen=self._history)
+            hist.append((ts, data))
+
+            group = None
+            for g in reversed(self._groups):
+                if abs(g.ts - ts) <= self.tol_ms and block not in g.blocks:
+                    group = g
+                    break
+                if g.ts < ts - self.tol_ms:
+                    break
+            if group is None:
+                group = _Group(ts, host)
+                # Packets arrive almost in order; insert from the right.
+                k = len(self._groups)
+                while k > 0 and self._groups[k - 1].ts > ts:
+                    k -= 1
+                self._groups.insert(k, group)
+            group.values.update(data)
+            group.blocks.add(block)
+            self._release(final=False)
+
+    # ---------- output ----------
+
+    def flush(self):
+        """Emit every pending row (call after the log blocks are stopped)."""
+        with self._lock:
+            self._release(final=True)
+
+    def _ready(self, g):
+        if self._newest - g.ts > self.max_wait_ms:
+            return True
+        for block, hist in self._hist.items():
+            if block not in g.blocks and (not hist or hist[-1][0] <= g.ts + self.tol_ms):
+                return False                       # block may still deliver this instant
+        return True
+
+    def _fill(self, var, g):
+        """Value of var at the row time from the history of the block that logs it."""
+        for hist in self._hist.values():
+            if not hist or var not in hist[-1][1]:
+                continue
+            before = after = None
+            for ts, data in hist:
+                if ts <= g.ts:
+                    before = (ts, data[var])
+                elif after is None:
+                    after = (ts, data[var])
+            if before is None:
+                return float('nan')                # nothing logged yet at this time
+            if self.mode == 'interp' and after is not None and after[0] > before[0]:
+                u = (g.ts - before[0]) / (after[0] - before[0])
+                return before[1] + u * (after[1] - before[1])
+            return before[1]
+        return float('nan')
+
+    def _release(self, final):
+        while self._groups and (final or self._ready(self._groups[0])):
+            g = self._groups.popleft()
+            row = [(g.ts - self._ts0) / 1000.0, g.host - self._host0]
+            for _, var in self.columns:
+                v = g.values.get(var)
+                if v is None:
+                    v = self._fill(var, g)
+                    self.filled += 1
+                row.append(v)
+            self.rows += 1
+            self.emit(tuple(row))
+
+    def summary(self):
+        return (f"merger: {self.packets} packets -> {self.rows} rows "
+                f"({self.filled} values filled by '{self.mode}')")
@@ -0,0 +1,193 @@
+"""
+Confirmed batch parameter writes.
+
+The scripts set parameters one at a time through a set_param() that
+swallows every error and never waits for the vehicle, then sleep and hope
+the writes landed. The firmware echoes every write on the param channel
+with the value it stored, so a write can be confirmed instead:
+
+- write_params(cf, {name: value}) checks every name against the TOC
+  (unknown, read-only and unconvertible values fail up front), queues all
+  writes at once (cflib's param thread sends them back-to-back, one in
+  flight at a time) and waits for the echoes with ONE timeout for the batch
+- a write is confirmed when the echoed value equals the requested one
+  after conversion to the parameter's type (float32 rounding included)
+- the ParamWriteReport has per-parameter confirmation, echo and latency
+  from queueing to echo; check() raises ParamWriteError on any failure
+
+write_params_async() is the same for asyncio code (cftools.executive).
+
+Usage:
+    report = write_params(cf, {'commander.enHighLevel': 0, 'flightmode.posSet': 1,
+                               'stabilizer.estimator': 2})
+    report.check()
+    print(report.summary())
+"""
+
+import asyncio
+import struct
+import threading
+import time
+
+from cflib.crazyflie.param import ParamTocElement
+
+FLOAT_TYPES = ('<f', '<d', '<e')
+
+
+class ParamWriteError(RuntimeError):
+    """Raised by ParamWriteReport.check() when a write failed or was not confirmed."""
+
+
+def _packed(pytype, value):
+    """The value as the firmware stores it (comparing packed bytes handles float32 rounding)."""
+    v = float(value) if pytype in FLOAT_TYPES else int(float(value))
+    return struct.pack(pytype, v)
+
+
+class ParamWriteReport:
+    def __init__(self, results, elapsed_s, timeout_s):
+        self.results = results        # name -> dict: value, echo, confirmed, latency_ms, error
+        self.elapsed_s = elapsed_s
+        self.timeout_s = timeout_s
+
+    @property
+    def ok(self):
+        return all(r['confirmed'] for r in self.results.values())
+
+    @property
+    def failed(self):
+        return {n: r['error'] for n, r in self.results.items() if not r['confirmed']}
+
+    def check(self):
+        if not self.ok:
+            raise ParamWriteError('; '.join(f'{n}: {e}' for n, e in self.failed.items()))
+        return self
+
+    def as_dict(self):
+        return {'elapsed_ms': self.elapsed_s * 1e3, 'timeout_s': self.timeout_s, 'ok': self.ok,
+                'params': self.results}
+
+    def summary(self):
+        n_ok = sum(r['confirmed'] for r in self.results.values())
+        lines = [f'params: {n_ok}/{len(self.results)} confirmed in {self.elapsed_s * 1e3:.1f} ms']
+        for n, r in self.results.items():
+            state = f"{r['latency_ms']:7.1f} ms" if r['confirmed'] else f"FAILED ({r['error']})"
+            lines.append(f"  {n:<32} = {r['value']!s:<8} {state}")
+        return '\n'.join(lines)
+
+
+class ParamBatch:
+    """
+    One batch of writes: start() validates and queues them, the cflib
+    update callbacks confirm them, finish() unregisters and builds the
+    report. write_params / write_params_async drive it.
+    """
+
+    def __init__(self, cf, values, on_done=None):
+        self.cf = cf
+        self.values = dict(values)
+        self.on_done = on_done
+        self.results = {n: {'value': v, 'echo': None, 'confirmed': False, 'latency_ms': None,
+                            'error': 'no echo before the timeout'} for n, v in self.values.items()}
+        self._expect = {}             # name -> packed value awaited
+        self._sent = {}               # name -> monotonic s when queued
+        self._callbacks = []          # (group, name, cb) to unregister
+        self._lock = threading.Lock()
+        self.t0 = None
+
+    def _fail(self, name, error):
+        self.results[name]['error'] = error
+
+    def start(self):
+        """Validate and queue every write. Blocks while cflib is still downloading parameter values."""
+        self.t0 = time.monotonic()
+        param = self.cf.param
+        for name, value in self.values.items():
+            elem = param.toc.get_element_by_complete_name(name)
+            if elem is None:
+                self._fail(name, 'not in the param TOC')
+                continue
+            if elem.access == ParamTocElement.RO_ACCESS:
+                self._fail(name, 'read-only')
+                continue
+            try:
+                self._expect[name] = _packed(elem.pytype, value)
+            except (TypeError, ValueError, struct.error) as e:
+                self._fail(name, f'bad value for {elem.ctype}: {e}')
+                continue
+            group, short = name.split('.', 1)
+            cb = lambda full, echo, n=name: self._on_update(n, echo)
+            param.add_update_callback(group=group, name=short, cb=cb)
+            self._callbacks.append((group, short, cb))
+        for name in list(self._expect):
+            with self._lock:
+                self._sent[name] = time.monotonic()
+            try:
+                param.set_value(name, self.values[name])
+            except Exception as e:          # cflib raises plain Exception on a timed-out connect
+                with self._lock:
+                    del self._expect[name]
+                self._fail(name, f'{type(e).__name__}: {e}')
+        self._check_done()
+        return self
+
+    def _on_update(self, name, echo):
+        # cflib thread
+        with self._lock:
+            expect = self._expect.get(name)
+            if expect is None or name not in self._sent:
+                return
+            elem_type = self.cf.param.toc.get_element_by_complete_name(name).pytype
+            self.results[name]['echo'] = echo
+            try:
+                same = _packed(elem_type, echo) == expect
+            except (ValueError, struct.error):
+                same = False
+            if not same:
+                return                      # e.g. the value read before our write; keep waiting
+            r = self.results[name]
+            r['confirmed'], r['error'] = True, None
+            r['latency_ms'] = (time.monotonic() - self._sent[name]) * 1e3
+            del self._expect[name]
+        self._check_done()
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._expect)
+
+    def _check_done(self):
+        if self.pending == 0 and self.on_done is not None:
+            self.on_done()
+
+    def finish(self, timeout_s):
+        for group, short, cb in self._callbacks:
+            self.cf.param.remove_update_callback(group=group, name=short, cb=cb)
+        self._callbacks = []
+        with self._lock:
+            for name in self._expect:
+                echo = self.results[name]['echo']
+                if echo is not None:
+                    self._fail(name, f'vehicle kept {echo}')
+        return ParamWriteReport(self.results, time.monotonic() - self.t0, timeout_s)
+
+
+def write_params(cf, values, timeout=2.0):
+    """Write {name: value} in one batch and wait up to 'timeout' s after queueing for every echo."""
+    done = threading.Event()
+    batch = ParamBatch(cf, values, on_done=done.set).start()
+    done.wait(timeout)
+    return batch.finish(timeout)
+
+
+async def write_params_async(cf, values, timeout=2.0):
+    """write_params for the asyncio executive; queueing runs in a worker thread."""
+    loop = asyncio.get_running_loop()
+    done = asyncio.Event()
+    batch = ParamBatch(cf, values, on_done=lambda: loop.call_soon_threadsafe(done.set))
+    await loop.run_in_executor(None, batch.start)
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return batch.finish(timeout)
@@ -0,0 +1,230 @@
+"""
+Vectorized planar quadrotor + rod + ball simulator (port of Matlab Stuff/Dynamics.m).
+
+State  x = [y, z, phi, theta, y_d, z_d, phi_d, theta_d]   (phi: quad roll,
+       theta: pendulum angle relative to the quad, theta = 0 hanging down)
+Inputs u = [Fl, Fr]                                        (rotor forces, N)
+
+Dynamics.m solves A(x) * [y_dd, z_dd, phi_dd, theta_dd] = B(x, u). The last
+row of A only contains Ixx, so phi_dd = (Fr - Fl) * r / Ixx directly, and the
+remaining 3x3 system is solved in closed form. Every step is plain NumPy over
+a batch of N independent systems, e.g. one per pendulum length / initial
+angle, with no per-system linear solve.
+
+Integrators:
+- 'rk4'  : fixed step
+- 'rk45' : Dormand-Prince 5(4) with one adaptive step size shared by the batch
+
+Usage:
+    p = PendulumParams(L=np.linspace(0.15, 0.5, 36))
+    x0 = initial_state(p.n, theta=np.deg2rad(30))
+    t, X = simulate(p, x0, p.hover_input(), T=10.0, dt=0.002)   # X: (steps+1, N, 8)
+
+CLI (from the CrazyFlie folder):
+    python -m cftools.pendulum_sim --n 36 --T 10
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+STATE = ('y', 'z', 'phi', 'theta', 'y_d', 'z_d', 'phi_d', 'theta_d')
+
+
+class PendulumParams:
+    """Model constants from Dynamics.m. L (rod length, m) may be a scalar or one value per system."""
+
+    def __init__(self, L=0.3, mq=0.029, mb=0.01, ms=0.0025, Ixx=6.410179e-06,
+                 g=9.81, r=0.05665 / 2, n=None):
+        L = np.atleast_1d(np.asarray(L, dtype=float))
+        if n is not None and L.size == 1:
+            L = np.full(n, L[0])
+        self.L = L
+        self.n = L.size
+        self.mq, self.mb, self.ms = mq, mb, ms
+        self.Ixx, self.g, self.r = Ixx, g, r
+
+        self.m_p = ms + mb                                   # pendulum (rod + ball) mass
+        self.M = ms + mb + mq                                # total mass
+        self.Ip = ms * L ** 2 / 3 + mb * L ** 2              # pendulum inertia about the pivot
+        self.Lcg = L * (ms / 2 + mb) / (ms + mb)             # pivot -> pendulum CoG
+        self.a = self.m_p * self.Lcg
+        den = self.Ip - self.a ** 2 / self.M                 # Schur complement of A
+        self._k_psi = -self.a / (self.M * den)
+        self._k_phi = r / Ixx
+        self._inv_M = 1.0 / self.M
+
+    def hover_input(self):
+        """(N, 2) rotor forces that hold the whole system still."""
+        return np.full((self.n, 2), 0.5 * self.M * self.g)
+
+
+def initial_state(n, y=0.0, z=1.0, phi=0.0, theta=0.0):
+    """(N, 8) state at rest; every argument may be a scalar or length-N."""
+    x = np.zeros((n, 8))
+    x[:, 0], x[:, 1], x[:, 2], x[:, 3] = y, z, phi, theta
+    return x
+
+
+def mass_matrix(p, x):
+    """A(x) of Dynamics.m for each system, shape (N, 4, 4). Used for checks and linearization."""
+    psi = x[:, 2] + x[:, 3]
+    c, s = np.cos(psi), np.sin(psi)
+    A = np.zeros((x.shape[0], 4, 4))
+    A[:, 0, 0] = A[:, 1, 1] = p.M
+    A[:, 0, 2] = A[:, 0, 3] = p.a * c
+    A[:, 1, 2] = A[:, 1, 3] = p.a * s
+    A[:, 2, 0] = p.a * c
+    A[:, 2, 1] = p.a * s
+    A[:, 2, 2] = A[:, 2, 3] = p.Ip
+    A[:, 3, 2] = p.Ixx
+    return A
+
+
+def force_vector(p, x, u):
+    """B(x, u) of Dynamics.m, shape (N, 4)."""
+    phi, psi, w = x[:, 2], x[:, 2] + x[:, 3], x[:, 6] + x[:, 7]
+    F = u[:, 0] + u[:, 1]
+    c, s = np.cos(psi), np.sin(psi)
+    return np.stack([
+        -F * np.sin(phi) + p.a * s * w ** 2,
+        F * np.cos(phi) - p.a * c * w ** 2 - p.g * p.M,
+        -p.g * p.a * s,
+        (u[:, 1] - u[:, 0]) * p.r,
+    ], axis=1)
+
+
+def derivatives(p, x, u):
+    """dx/dt for a batch, shape (N, 8)."""
+    phi, theta = x[:, 2], x[:, 3]
+    psi, w = phi + theta, x[:, 6] + x[:, 7]
+    F = u[:, 0] + u[:, 1]
+    c, s = np.cos(psi), np.sin(psi)
+    aw2 = p.a * w * w
+    b1 = s * aw2 - F * np.sin(phi)
+    b2 = F * np.cos(phi) - c * aw2 - p.g * p.M
+
+    # Eliminating y_dd, z_dd from row 3 of A: c*b1 + s*b2 = F*sin(theta) - g*M*s, so the
+    # gravity terms cancel and psi_dd = -a*F*sin(theta) / (M * (Ip - a^2/M)).
+    psi_dd = p._k_psi * F * np.sin(theta)
+    phi_dd = (u[:, 1] - u[:, 0]) * p._k_phi
+
+    dx = np.empty_like(x)
+    dx[:, :4] = x[:, 4:]
+    dx[:, 4] = (b1 - p.a * c * psi_dd) * p._inv_M
+    dx[:, 5] = (b2 - p.a * s * psi_dd) * p._inv_M
+    dx[:, 6] = phi_dd
+    dx[:, 7] = psi_dd - phi_dd
+    return dx
+
+
+def energy(p, x):
+    """Total mechanical energy per system (conserved when u = 0 apart from gravity work)."""
+    y_d, z_d, phi_d, w = x[:, 4], x[:, 5], x[:, 6], x[:, 6] + x[:, 7]
+    psi = x[:, 2] + x[:, 3]
+    T = (0.5 * p.M * (y_d ** 2 + z_d ** 2) + 0.5 * p.Ip * w ** 2
+         + p.a * w * (y_d * np.cos(psi) + z_d * np.sin(psi)) + 0.5 * p.Ixx * phi_d ** 2)
+    V = p.g * (p.M * x[:, 1] - p.a * np.cos(psi))
+    return T + V
+
+
+def _input(u, t, x):
+    return u(t, x) if callable(u) else u
+
+
+def rk4_step(p, x, u, t, dt):
+    k1 = derivatives(p, x, _input(u, t, x))
+    x2 = x + 0.5 * dt * k1
+    k2 = derivatives(p, x2, _input(u, t + 0.5 * dt, x2))
+    x3 = x + 0.5 * dt * k2
+    k3 = derivatives(p, x3, _input(u, t + 0.5 * dt, x3))
+    x4 = x + dt * k3
+    k4 = derivatives(p, x4, _input(u, t + dt, x4))
+    return x + (dt / 6.0) * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+
+
+# Dormand-Prince 5(4) tableau
+_DP_C = (0.0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1.0, 1.0)
+_DP_A = ((),
+         (1 / 5,),
+         (3 / 40, 9 / 40),
+         (44 / 45, -56 / 15, 32 / 9),
+         (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+         (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+         (35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84))
+_DP_E = (71 / 57600, 0.0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)
+
+
+def dp45_step(p, x, u, t, dt):
+    """One Dormand-Prince step. Returns (x_new, err): err is the raw per-system error estimate, same shape as x."""
+    k = []
+    for i in range(7):
+        xi = x
+        for aij, kj in zip(_DP_A[i], k):
+            if aij:
+                xi = xi + dt * aij * kj
+        k.append(derivatives(p, xi, _input(u, t + _DP_C[i] * dt, xi)))
+    x_new = xi                                   # stage 7 is evaluated at the 5th-order solution
+    err = dt * sum(e * kj for e, kj in zip(_DP_E, k) if e)
+    return x_new, err
+
+
+def simulate(p, x0, u, T, dt=0.002, method='rk4', rtol=1e-6, atol=1e-8, dt_max=0.02):
+    """
+    Integrate N systems from x0 (N, 8) over [0, T].
+    u: (N, 2) constant forces or a callable u(t, x) -> (N, 2) (vectorized controller).
+
+    'rk4' returns every step on the fixed grid. 'rk45' adapts one step size for
+    the whole batch and returns the accepted steps (times are then non-uniform).
+    Returns (t, X) with X of shape (len(t), N, 8).
+    """
+    x = np.array(x0, dtype=float)
+    if method == 'rk4':
+        steps = int(round(T / dt))
+        X = np.empty((steps + 1,) + x.shape)
+        X[0] = x
+        for k in range(steps):
+            x = rk4_step(p, x, u, k * dt, dt)
+            X[k + 1] = x
+        return np.arange(steps + 1) * dt, X
+
+    if method != 'rk45':
+        raise ValueError(f"method must be 'rk4' or 'rk45', got {method!r}")
+    t, h = 0.0, min(dt, dt_max)
+    ts, xs = [0.0], [x]
+    while t < T - 1e-12:
+        h = min(h, T - t)
+        x_new, err = dp45_step(p, x, u, t, h)
+        scale = atol + rtol * np.maximum(np.abs(x), np.abs(x_new))
+        e = float(np.sqrt(np.mean((err / scale) ** 2, axis=1)).max())
+        if e <= 1.0:
+            t += h
+            x = x_new
+            ts.append(t)
+            xs.append(x)
+        h = min(dt_max, h * min(5.0, max(0.2, 0.9 * (1.0 / max(e, 1e-12)) ** 0.2)))
+    return np.array(ts), np.stack(xs)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Batch pendulum simulation throughput check')
+    ap.add_argument('--n', type=int, default=36, help='number of systems (lengths 0.15..0.5 m)')
+    ap.add_argument('--T', type=float, default=10.0, help='simulated seconds')
+    ap.add_argument('--dt', type=float, default=0.002)
+    ap.add_argument('--theta_deg', type=float, default=30.0, help='initial pendulum angle')
+    ap.add_argument('--method', choices=['rk4', 'rk45'], default='rk4')
+    args = ap.parse_args(argv)
+
+    p = PendulumParams(L=np.linspace(0.15, 0.5, args.n))
+    x0 = initial_state(p.n, theta=np.deg2rad(args.theta_deg))
+    t0 = time.perf_counter()
+    t, X = simulate(p, x0, p.hover_input(), T=args.T, dt=args.dt, method=args.method)
+    wall = time.perf_counter() - t0
+    print(f'{p.n} systems x {args.T:.1f} s ({len(t) - 1} steps, {args.method}) in {wall:.3f} s wall: '
+          f'{p.n * args.T / wall:.0f} simulated s per wall s')
+    print(f'final |theta| range: {np.abs(X[-1, :, 3]).min():.3f}..{np.abs(X[-1, :, 3]).max():.3f} rad')
+
+
+if __name__ == '__main__':
+    main()
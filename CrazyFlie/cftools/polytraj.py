@@ -0,0 +1,365 @@
+"""
+Piecewise 7th-order polynomial trajectories for the high-level commander.
+
+Instead of streaming a position setpoint per tick, the trajectory is fitted
+once to polynomial pieces, written to the Crazyflie's trajectory memory and
+started with a single start_trajectory command; the onboard clock then does
+the timing and the host only monitors.
+
+Fitting: every axis (x, y, z, yaw) is a C3 spline of degree 7, parametrized
+by position / velocity / acceleration / jerk at the breakpoints (a Hermite
+basis per piece), so continuity holds by construction and the fit to the
+dense trajectory is one linear least-squares solve for all axes. Pieces
+start 'piece_s' long; the piece with the worst error is split until the
+fit is within pos_tol / yaw_tol or 'max_pieces' is reached. Breakpoints sit
+on whole milliseconds, as the compressed format stores durations in ms.
+
+Packing (both are what cflib's TrajectoryMemory uploads):
+- 'poly4d'     : 8 float coefficients per axis + float duration (132 B / piece)
+- 'compressed' : Bezier control points as int16 mm / 0.1 deg, ms durations,
+                 axes that do not move cost nothing (<= 59 B / piece)
+unpack() decodes the memory the way the firmware does, so the quantized
+trajectory can be checked on the host (LocalTrajectoryMemory is a stand-in
+for the real memory with the same interface).
+
+Usage:
+    pp, stats = fit(Trajectory.from_csv('Traj.csv'), pos_tol=0.005)
+    print(stats.summary())
+    upload(cf, pp, trajectory_id=1)                  # or mem=LocalTrajectoryMemory()
+    cf.high_level_commander.start_trajectory(1)
+"""
+
+import math
+import struct
+
+import numpy as np
+
+TRAJ_MEMORY_SIZE = 4096          # bytes of trajectory memory in the firmware
+FORMATS = ('compressed', 'poly4d')
+TYPE_IDS = {'poly4d': 0, 'compressed': 1}    # HighLevelCommander.TRAJECTORY_TYPE_*
+_POLY4D = struct.Struct('<33f')
+_POWERS = np.arange(8)
+
+
+def _hermite_inverse():
+    """Power coefficients in s in [0, 1] from [p0, p0', p0'', p0''', p1, p1', p1'', p1''']."""
+    A = np.zeros((8, 8))
+    for d in range(4):
+        for i in range(d, 8):
+            f = math.factorial(i) / math.factorial(i - d)
+            A[d, i] = f if i == d else 0.0
+            A[4 + d, i] = f
+    return np.linalg.inv(A)
+
+
+def _power_to_bezier(n):
+    """b = M @ a for the degree-n Bezier control points of sum a_i s^i."""
+    M = np.zeros((n + 1, n + 1))
+    for k in range(n + 1):
+        for i in range(k + 1):
+            M[k, i] = math.comb(k, i) / math.comb(n, i)
+    return M
+
+
+_HERMITE = _hermite_inverse()
+_P2B = _power_to_bezier(7)
+_B2P = {n: np.linalg.inv(_power_to_bezier(n)) for n in (1, 3, 7)}
+
+
+class PiecewisePoly:
+    """
+    Pieces of (x, y, z, yaw) polynomials in local time (s) as the firmware
+    evaluates them: coeffs (n, 4, 8), positions in m, yaw in rad.
+    """
+
+    def __init__(self, durations, coeffs):
+        self.durations = np.asarray(durations, dtype=float)
+        self.coeffs = np.asarray(coeffs, dtype=float).reshape(-1, 4, 8)
+        if self.durations.shape != (self.coeffs.shape[0],) or self.durations.size == 0:
+            raise ValueError("need one duration per piece and at least one piece")
+        self.starts = np.concatenate([[0.0], np.cumsum(self.durations)[:-1]])
+        self.duration = float(self.durations.sum())
+        # Plain lists for evaluate_one (the simulator calls it every physics step)
+        self._startl = self.starts.tolist()
+        self._durl = self.durations.tolist()
+        self._cl = self.coeffs.tolist()
+
+    def __len__(self):
+        return self.durations.size
+
+    @classmethod
+    def hermite(cls, p0, v0, a0, p1, duration):
+        """One piece from (p0, v0, a0) to p1 at rest; the high-level go_to/takeoff/land shape."""
+        T = max(duration, 1e-3)
+        coeffs = []
+        for k in range(4):
+            knots = np.array([p0[k], v0[k] * T, a0[k] * T * T, 0.0, p1[k], 0.0, 0.0, 0.0])
+            coeffs.append((_HERMITE @ knots) / T ** _POWERS)
+        return cls([T], [coeffs])
+
+    def evaluate(self, times):
+        """Vectorized (pos, vel, acc), each (len(times), 4); held at the ends."""
+        t = np.clip(np.asarray(times, dtype=float), 0.0, self.duration)
+        i = np.clip(np.searchsorted(self.starts, t, side='right') - 1, 0, len(self) - 1)
+        h = (t - self.starts[i])[:, None]
+        c = self.coeffs[i]                                       # (m, 4, 8)
+        hp = h[:, :, None] ** _POWERS                            # (m, 1, 8)
+        pos = (c * hp).sum(axis=2)
+        vel = (c[:, :, 1:] * _POWERS[1:] * hp[:, :, :-1]).sum(axis=2)
+        acc = (c[:, :, 2:] * (_POWERS[2:] * _POWERS[1:-1]) * hp[:, :, :-2]).sum(axis=2)
+        outside = (np.asarray(times) <= 0.0) | (np.asarray(times) >= self.duration)
+        vel[outside] = 0.0
+        acc[outside] = 0.0
+        return pos, vel, acc
+
+    def evaluate_one(self, t):
+        """(pos, vel, acc) at one time as lists of 4; held at the ends."""
+        n = len(self._durl)
+        if t <= 0.0:
+            i, h, still = 0, 0.0, True
+        elif t >= self.duration:
+            i, h, still = n - 1, self._durl[-1], True
+        else:
+            i = min(max(int(np.searchsorted(self.starts, t, side='right')) - 1, 0), n - 1)
+            h, still = t - self._startl[i], False
+        pos, vel, acc = [], [], []
+        for c in self._cl[i]:
+            p = v = a = 0.0
+            for k in range(7, -1, -1):                           # Horner
+                p = p * h + c[k]
+                if k >= 1:
+                    v = v * h + k * c[k]
+                if k >= 2:
+                    a = a * h + k * (k - 1) * c[k]
+            pos.append(p)
+            vel.append(0.0 if still else v)
+            acc.append(0.0 if still else a)
+        return pos, vel, acc
+
+
+class FitStats:
+    """Size and accuracy of one polynomial fit."""
+
+    def __init__(self, pieces, duration, max_pos_err, max_yaw_err, rms_pos_err, nbytes):
+        self.pieces = pieces
+        self.duration = duration
+        self.max_pos_err = max_pos_err            # m
+        self.max_yaw_err = max_yaw_err            # deg
+        self.rms_pos_err = rms_pos_err            # m
+        self.nbytes = nbytes                      # {format: packed size}
+
+    def as_dict(self):
+        return {'pieces': self.pieces, 'duration_s': self.duration,
+                'max_pos_err_mm': self.max_pos_err * 1e3, 'rms_pos_err_mm': self.rms_pos_err * 1e3,
+                'max_yaw_err_deg': self.max_yaw_err,
+                **{f'bytes_{k}': v for k, v in self.nbytes.items()}}
+
+    def summary(self):
+        sizes = ', '.join(f'{k} {v} B' for k, v in self.nbytes.items())
+        return (f"polytraj: {self.pieces} pieces over {self.duration:.2f} s, worst error "
+                f"{self.max_pos_err * 1e3:.2f} mm / {self.max_yaw_err:.2f} deg "
+                f"(rms {self.rms_pos_err * 1e3:.2f} mm), {sizes} of {TRAJ_MEMORY_SIZE}")
+
+
+# ---------- fitting ----------
+
+def _solve(bp_ms, t, Y, rest_ends):
+    """Least-squares C3 spline on breakpoints bp_ms (int ms) through samples (t, Y (m, 4))."""
+    bp = bp_ms / 1000.0
+    n = bp.size - 1
+    T = np.diff(bp)
+    i = np.clip(np.searchsorted(bp, t, side='right') - 1, 0, n - 1)
+    s = (t - bp[i]) / T[i]
+    # Hermite weights of each sample on the 8 knot values of its piece (scaled to real time)
+    W = (s[:, None] ** _POWERS) @ _HERMITE                       # (m, 8)
+    scale = T[i][:, None] ** np.tile(np.arange(4), 2)            # (m, 8)
+    W *= scale
+    D = np.zeros((t.size, 4 * (n + 1)))
+    rows = np.arange(t.size)
+    for j in range(8):
+        D[rows, 4 * (i + j // 4) + j % 4] = W[:, j]
+    cols = np.arange(4 * (n + 1))
+    if rest_ends:
+        # start and end at rest: only the end positions are free at the first/last knot
+        cols = cols[~np.isin(cols, [1, 2, 3, 4 * n + 1, 4 * n + 2, 4 * n + 3])]
+    K = np.zeros((4 * (n + 1), Y.shape[1]))
+    K[cols] = np.linalg.lstsq(D[:, cols], Y, rcond=None)[0]
+    K = K.reshape(n + 1, 4, -1)                                   # knot, derivative, axis
+
+    coeffs = np.empty((n, Y.shape[1], 8))
+    for p in range(n):
+        knots = np.concatenate([K[p], K[p + 1]]) * (T[p] ** np.tile(np.arange(4), 2))[:, None]
+        coeffs[p] = ((_HERMITE @ knots) / T[p] ** _POWERS[:, None]).T
+    return PiecewisePoly(T, coeffs)
+
+
+def fit(traj, pos_tol=0.005, yaw_tol=2.0, piece_s=0.5, min_piece_s=0.1, max_pieces=30,
+        rate_hz=200.0, rest_ends=True):
+    """
+    Fit a Trajectory (or anything with t, x, y, z, yaw-in-degrees arrays and
+    sample_many) with degree-7 pieces. Time starts at 0 on the first knot.
+    Returns (PiecewisePoly, FitStats).
+    """
+    t0 = float(traj.t[0])
+    dur_ms = int(round((float(traj.t[-1]) - t0) * 1000.0))
+    if dur_ms < 2 * int(min_piece_s * 1000):
+        raise ValueError("trajectory is too short for a polynomial fit")
+    times = np.append(np.arange(0.0, dur_ms / 1000.0, 1.0 / rate_hz), dur_ms / 1000.0)
+    S = traj.sample_many(times + t0)
+    yaw = np.unwrap(np.radians(S['yaw']))
+    Y = np.column_stack([S['x'], S['y'], S['z'], yaw])
+
+    n = max(1, int(math.ceil(dur_ms / (piece_s * 1000.0))))
+    bp = np.round(np.linspace(0, dur_ms, n + 1)).astype(int)
+    min_ms = int(round(min_piece_s * 1000))
+    while True:
+        pp = _solve(bp, times, Y, rest_ends)
+        pos, _, _ = pp.evaluate(times)
+        pos_err = np.linalg.norm(pos[:, :3] - Y[:, :3], axis=1)
+        yaw_err = np.degrees(np.abs(pos[:, 3] - Y[:, 3]))
+        score = np.maximum(pos_err / pos_tol, yaw_err / yaw_tol)
+        if score.max() <= 1.0 or len(pp) >= max_pieces:
+            break
+        # split the worst piece that is still long enough
+        piece = np.clip(np.searchsorted(bp / 1000.0, times, side='right') - 1, 0, len(pp) - 1)
+        worst = np.zeros(len(pp))
+        np.maximum.at(worst, piece, score)
+        worst[np.diff(bp) < 2 * min_ms] = 0.0
+        k = int(np.argmax(worst))
+        if worst[k] <= 1.0:
+            break
+        bp = np.insert(bp, k + 1, (bp[k] + bp[k + 1]) // 2)
+
+    stats = FitStats(len(pp), pp.duration, float(pos_err.max()), float(yaw_err.max()),
+                     float(np.sqrt(np.mean(pos_err ** 2))),
+                     {f: len(pack(pp, f)) for f in FORMATS})
+    return pp, stats
+
+
+# ---------- memory format ----------
+
+def _quantize(v, k, scale):
+    q = int(round(v * scale))
+    if not -0x8000 <= q <= 0x7FFF:
+        raise ValueError(f"{'xyzY'[k]} = {v:.3f} does not fit the compressed int16 format")
+    return q
+
+
+_SCALES = (1000.0, 1000.0, 1000.0, 1800.0 / math.pi)            # m -> mm, rad -> 0.1 deg
+
+
+def pack(pp, fmt='compressed'):
+    """Bytes for the trajectory memory in the given format."""
+    if fmt == 'poly4d':
+        return b''.join(_POLY4D.pack(*pp.coeffs[i].ravel(), pp.durations[i]) for i in range(len(pp)))
+    if fmt != 'compressed':
+        raise ValueError(f"fmt must be one of {FORMATS}, got {fmt!r}")
+
+    p0, _, _ = pp.evaluate_one(0.0)
+    prev = [_quantize(p0[k], k, _SCALES[k]) for k in range(4)]
+    out = bytearray(struct.pack('<hhhh', *prev))
+    for i in range(len(pp)):
+        T = pp._durl[i]
+        ms = int(round(T * 1000.0))
+        if not 0 < ms <= 0xFFFF:
+            raise ValueError(f"piece {i} lasts {T:.4f} s, outside the compressed 1..65535 ms range")
+        types, elems = 0, []
+        for k in range(4):
+            b = _P2B @ (pp.coeffs[i, k] * T ** _POWERS)
+            q = [_quantize(v, k, _SCALES[k]) for v in b[1:]]
+            if all(v == prev[k] for v in q):
+                continue                                       # type 0: axis does not move
+            types |= 3 << (2 * k)                              # type 3: 7 control points
+            elems += q
+            prev[k] = q[-1]
+        out += struct.pack('<BH', types, ms) + struct.pack(f'<{len(elems)}h', *elems)
+    return bytes(out)
+
+
+def unpack(data, n_pieces, fmt='compressed', offset=0):
+    """Decode trajectory memory the way the firmware does; returns a PiecewisePoly."""
+    data = bytes(data)
+    if fmt == 'poly4d':
+        vals = [_POLY4D.unpack_from(data, offset + i * _POLY4D.size) for i in range(n_pieces)]
+        return PiecewisePoly([v[32] for v in vals], [np.reshape(v[:32], (4, 8)) for v in vals])
+    if fmt != 'compressed':
+        raise ValueError(f"fmt must be one of {FORMATS}, got {fmt!r}")
+
+    prev = [v / s for v, s in zip(struct.unpack_from('<hhhh', data, offset), _SCALES)]
+    pos = offset + 8
+    durations, coeffs = [], []
+    for _ in range(n_pieces):
+        types, ms = struct.unpack_from('<BH', data, pos)
+        pos += 3
+        if ms == 0:
+            raise ValueError("zero-length piece in compressed trajectory")
+        T = ms / 1000.0
+        piece = []
+        for k in range(4):
+            n = (0, 1, 3, 7)[(types >> (2 * k)) & 3]
+            ctrl = [v / _SCALES[k] for v in struct.unpack_from(f'<{n}h', data, pos)]
+            pos += 2 * n
+            a = np.zeros(8)
+            if n:
+                a[:n + 1] = _B2P[n] @ np.array([prev[k]] + ctrl)
+                prev[k] = ctrl[-1]
+            else:
+                a[0] = prev[k]
+            piece.append(a / T ** _POWERS)
+        durations.append(T)
+        coeffs.append(piece)
+    return PiecewisePoly(durations, coeffs)
+
+
+class _Packed:
+    """Pre-packed bytes with the pack() interface TrajectoryMemory expects of its elements."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def pack(self):
+        return self.data
+
+
+class LocalTrajectoryMemory:
+    """Host-side stand-in for cflib's TrajectoryMemory: same trajectory list and write_data_sync()."""
+
+    def __init__(self, size=TRAJ_MEMORY_SIZE):
+        self.size = size
+        self.data = bytearray(size)
+        self.trajectory = []
+        self.writes = 0
+
+    def write_data_sync(self, start_addr=0x00):
+        data = b''.join(bytes(e.pack()) for e in self.trajectory)
+        if start_addr + len(data) > self.size:
+            return False
+        self.data[start_addr:start_addr + len(data)] = data
+        self.writes += 1
+        return True
+
+    def read_trajectory(self, n_pieces, fmt='compressed', offset=0):
+        return unpack(self.data, n_pieces, fmt, offset)
+
+
+def upload(cf, pp, trajectory_id=1, fmt='compressed', offset=0, mem=None):
+    """
+    Write pp to the trajectory memory (the Crazyflie's, or 'mem', e.g. a
+    LocalTrajectoryMemory) and define it as trajectory_id on the high-level
+    commander (skipped when cf is None). Returns the number of bytes written.
+    """
+    data = pack(pp, fmt)
+    if mem is None:
+        from cflib.crazyflie.mem import MemoryElement
+        mems = cf.mem.get_mems(MemoryElement.TYPE_TRAJ)
+        if not mems:
+            raise RuntimeError("no trajectory memory found (firmware without the high-level commander?)")
+        mem = mems[0]
+    if offset + len(data) > mem.size:
+        raise ValueError(f"trajectory needs {len(data)} B at offset {offset}, memory holds {mem.size} B")
+    mem.trajectory = [_Packed(data)]
+    if not mem.write_data_sync(start_addr=offset):
+        raise RuntimeError("trajectory upload failed")
+    if cf is not None:
+        cf.high_level_commander.define_trajectory(trajectory_id, offset, len(pp), type=TYPE_IDS[fmt])
+    return len(data)
@@ -0,0 +1,121 @@
+"""
+Bounded streaming CSV recorder for per-tick flight telemetry.
+
+test_seq_Wlog.py kept one list per control tick in memory and wrote the
+CSV after landing: memory grew with the flight and a crash lost the whole
+log. TelemetryRecorder writes the header at once and streams the rows
+through a cftools.logsink.LogSink (fixed-size ring, background writer), so
+memory stays constant however long the flight is:
+
+- record(*values) only queues the raw tuple; formatting and I/O run on
+  the writer thread
+- the file is flushed every batch and fsync'd every fsync_s seconds, so a
+  hard crash loses at most that much data
+- close() (also on an exception or Ctrl-C through the with block) drains
+  the ring and appends a '#'-comment footer with the row/drop counts, the
+  duration and the exit status; a file without a footer was cut short
+
+read_footer() returns the footer as a dict, or None for a truncated file.
+Readers skip the footer with pandas.read_csv(path, comment='#') or by
+dropping lines starting with '#'.
+
+Usage:
+    with TelemetryRecorder('y_log.csv', ['t_sec', 'y_cmd', 'y_est', 'y_flow']) as rec:
+        rec.record(t, y_cmd, y_est, y_flow)      # from the control loop
+    print(rec.summary())
+"""
+
+import csv
+import json
+import os
+import time
+from pathlib import Path
+
+from cftools.logsink import LogSink
+
+FOOTER_PREFIX = '# end '
+
+
+def _fmt(v, digits):
+    return f'{v:.{digits}f}' if isinstance(v, float) else v
+
+
+class TelemetryRecorder:
+    def __init__(self, path, columns, digits=4, capacity=4096, fsync_s=1.0, policy='drop'):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.digits = digits
+        self.capacity = capacity
+        self.fsync_s = fsync_s
+        self.policy = policy
+        self.status = None
+        self.t_open = None
+        self.sink = None
+        self._file = None
+
+    def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'w', newline='')
+        writer = csv.writer(self._file)
+        writer.writerow(self.columns)
+        self._file.flush()
+        n = len(self.columns)
+        d = self.digits
+
+        def format_row(row):
+            if len(row) != n:
+                raise ValueError(f'row has {len(row)} values, expected {n}')
+            return [_fmt(v, d) for v in row]
+
+        self.sink = LogSink(writer, fileobj=self._file, format_row=format_row,
+                            capacity=self.capacity, policy=self.policy, fsync_s=self.fsync_s).start()
+        self.t_open = time.monotonic()
+        return self
+
+    def record(self, *values):
+        """Queue one row (same order as columns). False if the ring was full and it was dropped."""
+        return self.sink.put(values)
+
+    def close(self, status='complete'):
+        if self._file is None:
+            return
+        self.sink.close()
+        self.status = status
+        footer = {'status': status, **self.sink.stats(), 'duration_s': round(self.duration_s(), 3)}
+        if self.sink.error is not None:
+            footer['error'] = repr(self.sink.error)
+        self._file.write(FOOTER_PREFIX + json.dumps(footer) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close('complete' if exc_type is None else f'aborted ({exc_type.__name__})')
+        return False
+
+    # ---------- reporting ----------
+
+    def duration_s(self):
+        return 0.0 if self.t_open is None else time.monotonic() - self.t_open
+
+    def summary(self):
+        s = f'recorder {self.path}: ' + self.sink.summary().removeprefix('log sink: ')
+        return s + (f', {self.status}' if self.status else '')
+
+
+def read_footer(path, tail_bytes=4096):
+    """The footer dict of a TelemetryRecorder file, None if it has none (the recording was cut short)."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - tail_bytes))
+        lines = f.read().decode('utf-8', 'replace').splitlines()
+    for line in reversed(lines):
+        if line.startswith(FOOTER_PREFIX):
+            return json.loads(line[len(FOOTER_PREFIX):])
+        if line.strip():
+            return None
+    return None
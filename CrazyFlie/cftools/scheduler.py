@@ -0,0 +1,195 @@
+"""
+Deadline-driven pacing for setpoint loops.
+
+Instead of doing the work and then sleeping a full dt (which drifts below the
+requested rate by however long the work took), ticks are anchored to absolute
+monotonic deadlines t0 + k*period. When a tick overruns, the 'overrun' policy
+decides what happens to the deadlines we missed:
+
+- 'skip'    : drop them and resume on the next grid point after now (default;
+              never bursts setpoints at the vehicle)
+- 'catchup' : fire the missed ticks back-to-back until we are on time again
+
+Every wake-up is recorded so that the achieved rate, jitter percentiles,
+overrun count and worst lateness can be printed after the flight.
+
+Usage:
+    sched = DeadlineScheduler(rate_hz=50)
+    for k in sched.ticks(steps):
+        cf.commander.send_position_setpoint(...)
+    print(sched.stats.summary())
+"""
+
+import asyncio
+import time
+
+OVERRUN_POLICIES = ('skip', 'catchup')
+
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return float('nan')
+    pos = (len(sorted_vals) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (pos - lo) * (sorted_vals[hi] - sorted_vals[lo])
+
+
+class TickStats:
+    """Per-tick timing record of one scheduled loop."""
+
+    def __init__(self, name, period):
+        self.name = name
+        self.period = period
+        self.wake = []        # actual wake-up times (monotonic seconds)
+        self.late = []        # wake - deadline for each tick (seconds, >= 0 normally)
+        self.overruns = 0     # ticks whose work ran past the next deadline
+        self.worst_overrun = 0.0
+        self.skipped = 0      # deadlines dropped by the 'skip' policy
+
+    def record(self, wake, deadline):
+        self.wake.append(wake)
+        self.late.append(wake - deadline)
+
+    def record_overrun(self, by):
+        self.overruns += 1
+        self.worst_overrun = max(self.worst_overrun, by)
+
+    @property
+    def ticks(self):
+        return len(self.wake)
+
+    @property
+    def achieved_hz(self):
+        if len(self.wake) < 2:
+            return float('nan')
+        span = self.wake[-1] - self.wake[0]
+        return (len(self.wake) - 1) / span if span > 0 else float('nan')
+
+    def as_dict(self):
+        """Summary numbers (times in milliseconds)."""
+        intervals = [b - a for a, b in zip(self.wake, self.wake[1:])]
+        jitter = sorted(abs(dt - self.period) * 1e3 for dt in intervals)
+        late = sorted(l * 1e3 for l in self.late)
+        late_max = max(late[-1] if late else 0.0, self.worst_overrun * 1e3)
+        return {
+            'name': self.name,
+            'ticks': self.ticks,
+            'target_hz': 1.0 / self.period,
+            'achieved_hz': self.achieved_hz,
+            'jitter_p50_ms': _percentile(jitter, 50),
+            'jitter_p95_ms': _percentile(jitter, 95),
+            'jitter_p99_ms': _percentile(jitter, 99),
+            'jitter_max_ms': jitter[-1] if jitter else float('nan'),
+            'late_p95_ms': _percentile(late, 95),
+            'late_max_ms': late_max,
+            'overruns': self.overruns,
+            'skipped': self.skipped,
+        }
+
+    def summary(self):
+        d = self.as_dict()
+        return (f"[{d['name'] or 'loop'}] {d['ticks']} ticks, "
+                f"{d['achieved_hz']:.1f}/{d['target_hz']:.1f} Hz, "
+                f"jitter p50/p95/p99 {d['jitter_p50_ms']:.2f}/{d['jitter_p95_ms']:.2f}/"
+                f"{d['jitter_p99_ms']:.2f} ms, worst late {d['late_max_ms']:.2f} ms, "
+                f"overruns {d['overruns']}, skipped {d['skipped']}")
+
+
+class DeadlineScheduler:
+    """
+    Paces a loop on absolute deadlines t0 + k/rate_hz.
+
+    spin_s is the final stretch before each deadline that is busy-waited
+    instead of slept, since time.sleep() can overshoot by a millisecond or
+    more on desktop OSes. Set it to 0 to never spin.
+    """
+
+    def __init__(self, rate_hz, overrun='skip', name='', spin_s=0.0005,
+                 clock=time.monotonic, sleep=time.sleep):
+        if rate_hz <= 0:
+            raise ValueError(f"rate_hz must be > 0, got {rate_hz}")
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(f"overrun must be one of {OVERRUN_POLICIES}, got {overrun!r}")
+        self.period = 1.0 / rate_hz
+        self.overrun = overrun
+        self.spin_s = spin_s
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = TickStats(name, self.period)
+        self.t0 = None
+        self._k = 0
+
+    def start(self, t0=None):
+        """Anchor the deadline grid (defaults to now) and return t0."""
+        self.t0 = self.clock() if t0 is None else t0
+        self._k = 0
+        self.stats.record(self.clock(), self.t0)
+        return self.t0
+
+    def now(self):
+        return self.clock()
+
+    def elapsed(self):
+        return self.clock() - self.t0
+
+    @property
+    def deadline(self):
+        return self.t0 + self._k * self.period
+
+    def _next_deadline(self):
+        """Advance to the next grid point, applying the overrun policy to missed ones."""
+        self._k += 1
+        now = self.clock()
+        late = now - self.deadline
+        if late > 0:
+            self.stats.record_overrun(late)
+            if self.overrun == 'skip':
+                missed = int(late / self.period) + 1    # up to the first grid point after now
+                self._k += missed
+                self.stats.skipped += missed
+        return self.deadline
+
+    def wait(self):
+        """
+        Block until the next deadline and record the tick.
+        Returns the scheduled (not actual) time of the tick relative to t0.
+        """
+        if self.t0 is None:
+            self.start()
+            return 0.0
+
+        deadline = self._next_deadline()
+        remaining = deadline - self.clock()
+        if remaining > self.spin_s:
+            self.sleep(remaining - self.spin_s)
+        while self.clock() < deadline:
+            pass
+
+        self.stats.record(self.clock(), deadline)
+        return deadline - self.t0
+
+    async def wait_async(self):
+        """
+        wait() for asyncio loops: the time to the deadline is spent in
+        asyncio.sleep (never spinning) so other tasks run meanwhile.
+        """
+        if self.t0 is None:
+            self.start()
+            return 0.0
+
+        deadline = self._next_deadline()
+        remaining = deadline - self.clock()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+        self.stats.record(self.clock(), deadline)
+        return deadline - self.t0
+
+    def ticks(self, n=None):
+        """Yield tick indices 0..n-1 (forever if n is None), paced on the deadline grid."""
+        k = 0
+        while n is None or k < n:
+            self.wait()
+            yield k
+            k += 1
@@ -0,0 +1,766 @@
+"""
+Software-in-the-loop stand-in for the Crazyflie radio link (sim:// URIs).
+
+SimDriver is a cflib CRTP link driver that plays the firmware side of the
+protocol in-process, so the flight scripts can connect, configure and fly
+without a drone:
+
+- link/platform handshake (reports CRTP protocol version 12)
+- log and param TOCs, served from the cflib TOC cache JSON files (the same
+  CRC as the real drone, so the shared TOC cache hits and TOC-less scripts download it)
+- param reads and confirmed writes, extended param types
+- log blocks: create/append/start/stop/delete/reset, one packet per block
+  period with a 24-bit firmware millisecond timestamp
+- low-level commander (RPYT, stop, position, velocity, z-distance, hover,
+  full-state, manual) with the firmware setpoint watchdog, supervisor arming
+  and emergency stop
+- one trajectory memory (4 KB, read/write) and the high-level commander:
+  takeoff, land, go_to, stop, define/start trajectory (poly4d and compressed
+  pieces, decoded like the firmware does), timed by the firmware clock
+
+A simple position-controlled point mass (SimVehicle) reacts to the
+setpoints; what the log blocks report is derived from its state. Variables
+the model does not know are logged as 0.
+
+The firmware clock runs in 10 ms ticks (the log period unit) paced against
+wall time, 'speed' times faster than real time.
+
+URI: sim://<anything>?speed=1&latency_ms=0&noise=0&seed=0&toc=<cache dir>
+- speed      : firmware time per wall time (1 = real time)
+- latency_ms : one-way link delay in firmware ms, applied in both directions
+- noise      : std (m) of white noise on the position estimate
+- toc        : folder with the TOC cache JSON (default: CrazyFlie/cache)
+
+Run a script unchanged (radio:// URIs are redirected to the sim as well):
+    python -m cftools.simlink Tests/test_seq.py --rate_hz 50
+    python -m cftools.simlink --speed 4 cf_hover_test.py --do_hover --hover_s 5
+
+Or from code, before connecting:
+    from cftools import simlink
+    simlink.register()
+    with SyncCrazyflie('sim://0?speed=2', cf=make_crazyflie()) as scf: ...   # cftools.toccache
+"""
+
+import argparse
+import errno
+import json
+import math
+import os
+import queue
+import random
+import runpy
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlparse
+
+from cflib.crazyflie.log import LogTocElement
+from cflib.crazyflie.param import ParamTocElement
+from cflib.crtp.crtpdriver import CRTPDriver
+from cflib.crtp.crtpstack import CRTPPacket, CRTPPort
+from cflib.crtp.exceptions import WrongUriType
+
+from cftools.polytraj import TRAJ_MEMORY_SIZE, PiecewisePoly, unpack
+
+SIM_SCHEME = 'sim://'
+PROTOCOL_VERSION = 12
+TICK_MS = 10                     # firmware log period unit
+SUBSTEPS = 5                     # physics steps per tick
+BOOT_MS = 5000                   # firmware uptime when the link opens
+DEFAULT_TOC_DIR = Path(__file__).resolve().parent.parent / 'cache'
+G = 9.81
+
+# Param values the stand-in firmware starts with (everything else is 0)
+PARAM_DEFAULTS = {'deck.bcFlow2': 1, 'stabilizer.estimator': 2, 'stabilizer.controller': 1,
+                  'commander.enHighLevel': 0, 'flightmode.posSet': 0}
+
+WDT_STABILIZE_MS = 500           # firmware commander watchdog: level out
+WDT_SHUTDOWN_MS = 2000           # ... and cut the motors
+MEM_TYPE_TRAJ = 0x12             # MemoryElement.TYPE_TRAJ
+
+_options = {}                    # URI query defaults set by register()
+_capture = ()                    # extra URI prefixes (e.g. radio://) routed to the sim
+
+
+# ---------- vehicle model ----------
+
+def _wrap_deg(a):
+    return (a + 180.0) % 360.0 - 180.0
+
+
+class SimVehicle:
+    """
+    Point mass with a critically damped position loop and a first-order
+    velocity loop per axis, standing in for the onboard controller.
+    Positions in m, angles in degrees, times in firmware ms.
+    """
+
+    def __init__(self, wn=4.0, zeta=1.0, tau_v=0.2, tau_yaw=0.15, a_max=12.0, noise=0.0, seed=0):
+        self.wn, self.zeta, self.tau_v, self.tau_yaw, self.a_max = wn, zeta, tau_v, tau_yaw, a_max
+        self.noise = noise
+        self._rng = random.Random(seed)
+        self.p = [0.0, 0.0, 0.0]
+        self.v = [0.0, 0.0, 0.0]
+        self.a = [0.0, 0.0, 0.0]
+        self.yaw = 0.0
+        self.yaw_rate = 0.0
+        self.target = [0.0, 0.0, 0.0]         # ctrltarget position / velocity
+        self.target_v = [0.0, 0.0, 0.0]
+        self.target_yaw = 0.0
+        self.setpoint = ('stop',)
+        self.last_setpoint_ms = None
+        self.pending = []                     # (apply_ms, setpoint), in arrival order
+        self.armed = False
+        self.locked = False
+        self.flight_s = 0.0
+        self.estimator_reset_ms = 0.0
+
+    @property
+    def flying(self):
+        return self.p[2] > 0.005 or self.setpoint[0] not in ('stop', 'off')
+
+    def command(self, setpoint, t_ms, hold_ms=0):
+        self.pending.append((t_ms, setpoint, hold_ms))
+
+    def _apply_pending(self, t_ms):
+        while self.pending and self.pending[0][0] <= t_ms:
+            at, sp, hold_ms = self.pending.pop(0)
+            if sp[0] == 'notify_stop':
+                # the current setpoint stays valid for hold_ms, then the watchdog takes over
+                if self.last_setpoint_ms is not None:
+                    self.last_setpoint_ms = at + hold_ms - WDT_STABILIZE_MS
+                continue
+            if sp[0] == 'stop' or self.locked:
+                self.setpoint = ('stop',)
+            elif sp[0].startswith('hl_'):
+                self.setpoint = self._hl_plan(sp, at)
+            else:
+                self.setpoint = sp
+            self.last_setpoint_ms = at
+
+    def _hl_state(self, t_ms):
+        """(pos, vel, acc) with yaw in rad, where a new high-level plan starts from."""
+        if self.setpoint[0] == 'hl':
+            p, v, a = self._hl_eval(t_ms)
+            return p, v, a
+        return (self.p + [math.radians(self.yaw)], self.v + [0.0], [0.0] * 4)
+
+    def _hl_plan(self, sp, t_ms):
+        """('hl', poly, t0_ms, time_scale, offset, reversed) for a high-level command."""
+        p0, v0, a0 = self._hl_state(t_ms)
+        if sp[0] == 'hl_goto':
+            _, x, y, z, yaw, duration, relative = sp
+            goal = [p0[k] if g is None else g + (p0[k] if relative else 0.0)
+                    for k, g in enumerate((x, y, z, yaw))]
+            return ('hl', PiecewisePoly.hermite(p0, v0, a0, goal, duration), t_ms, 1.0, [0.0] * 4, False)
+        _, poly, scale, relative, rev = sp
+        start, _, _ = poly.evaluate_one(poly.duration if rev else 0.0)
+        offset = [p0[k] - start[k] for k in range(3)] + [0.0] if relative else [0.0] * 4
+        return ('hl', poly, t_ms, max(scale, 1e-3), offset, rev)
+
+    def _hl_eval(self, t_ms):
+        _, poly, t0, scale, offset, rev = self.setpoint
+        tr = (t_ms - t0) / 1000.0 / scale
+        p, v, a = poly.evaluate_one(poly.duration - tr if rev else tr)
+        sv = (-1.0 if rev else 1.0) / scale
+        return ([p[k] + offset[k] for k in range(4)], [x * sv for x in v], [x / scale ** 2 for x in a])
+
+    def _axis_targets(self, t_ms):
+        """Per-axis ('pos', p, v_ff, a_ff) / ('vel', v) / ('acc', a) targets and the yaw law."""
+        sp = self.setpoint
+        kind = sp[0]
+        age = t_ms - self.last_setpoint_ms if self.last_setpoint_ms is not None else 0.0
+        if kind not in ('stop', 'off', 'hl') and age > WDT_SHUTDOWN_MS:
+            kind = 'off'
+        elif kind not in ('stop', 'off', 'hl') and age > WDT_STABILIZE_MS:
+            # level attitude: horizontal drift dies out, altitude held
+            return [('vel', 0.0), ('vel', 0.0), ('vel', 0.0)], ('rate', 0.0)
+
+        c, s = math.cos(math.radians(self.yaw)), math.sin(math.radians(self.yaw))
+        if kind in ('stop', 'off'):
+            return None, ('rate', 0.0)
+        if kind == 'pos':
+            _, x, y, z, yaw = sp
+            return [('pos', x, 0.0, 0.0), ('pos', y, 0.0, 0.0), ('pos', z, 0.0, 0.0)], ('abs', yaw)
+        if kind == 'full':
+            _, pos, vel, acc, yaw_rate = sp
+            return [('pos', pos[k], vel[k], acc[k]) for k in range(3)], ('rate', yaw_rate)
+        if kind == 'hl':
+            # high-level commander: no watchdog, timed by the firmware clock
+            p, v, a = self._hl_eval(t_ms)
+            return [('pos', p[k], v[k], a[k]) for k in range(3)], ('abs', _wrap_deg(math.degrees(p[3])))
+        if kind == 'vel':
+            _, vx, vy, vz, yaw_rate = sp
+            return [('vel', vx), ('vel', vy), ('vel', vz)], ('rate', yaw_rate)
+        if kind == 'hover':
+            _, vx, vy, yaw_rate, z = sp
+            return [('vel', c * vx - s * vy), ('vel', s * vx + c * vy),
+                    ('pos', z, 0.0, 0.0)], ('rate', yaw_rate)
+        if kind == 'zdist':
+            _, roll, pitch, yaw_rate, z = sp
+            ax, ay = G * math.tan(math.radians(pitch)), -G * math.tan(math.radians(roll))
+            return [('acc', c * ax - s * ay), ('acc', s * ax + c * ay),
+                    ('pos', z, 0.0, 0.0)], ('rate', yaw_rate)
+        if kind == 'att':
+            _, roll, pitch, yaw_rate, thrust = sp
+            ax, ay = G * math.tan(math.radians(pitch)), -G * math.tan(math.radians(roll))
+            # hover at ~55 % thrust
+            return [('acc', c * ax - s * ay), ('acc', s * ax + c * ay),
+                    ('acc', G * (thrust / 0.55 - 1.0))], ('rate', yaw_rate)
+        return None, ('rate', 0.0)
+
+    def step(self, t_ms, dt_ms):
+        self._apply_pending(t_ms)
+        dt = dt_ms / 1000.0
+        axes, yaw_law = self._axis_targets(t_ms)
+        wn2, kd = self.wn ** 2, 2.0 * self.zeta * self.wn
+
+        if axes is None:
+            a = [0.0, 0.0, -G if self.p[2] > 0.0 else 0.0]
+        else:
+            a = []
+            for k, law in enumerate(axes):
+                if law[0] == 'pos':
+                    _, p_sp, v_ff, a_ff = law
+                    self.target[k], self.target_v[k] = p_sp, v_ff
+                    a.append(wn2 * (p_sp - self.p[k]) + kd * (v_ff - self.v[k]) + a_ff)
+                elif law[0] == 'vel':
+                    self.target_v[k] = law[1]
+                    self.target[k] = self.p[k]
+                    a.append((law[1] - self.v[k]) / self.tau_v)
+                else:
+                    a.append(law[1])
+            h = math.hypot(a[0], a[1])
+            if h > self.a_max:
+                a[0], a[1] = a[0] * self.a_max / h, a[1] * self.a_max / h
+            a[2] = min(max(a[2], -G), self.a_max)
+
+        for k in range(3):
+            self.v[k] += a[k] * dt
+            self.p[k] += self.v[k] * dt
+        if self.p[2] <= 0.0:                  # ground contact
+            self.p[2] = 0.0
+            self.v[2] = max(self.v[2], 0.0)
+            a[2] = max(a[2], 0.0)
+            if axes is None or a[2] <= 0.0:
+                self.v[0] = self.v[1] = 0.0
+                a[0] = a[1] = 0.0
+        self.a = a
+
+        if yaw_law[0] == 'abs':
+            self.target_yaw = yaw_law[1]
+            self.yaw_rate = _wrap_deg(yaw_law[1] - self.yaw) / self.tau_yaw
+        else:
+            self.yaw_rate = yaw_law[1] if self.p[2] > 0.0 else 0.0
+            self.target_yaw = self.yaw
+        self.yaw = _wrap_deg(self.yaw + self.yaw_rate * dt)
+        if self.p[2] > 0.0:
+            self.flight_s += dt
+
+    # ---------- telemetry ----------
+
+    def telemetry(self, t_ms):
+        """{log variable: value} for everything the model knows, at firmware time t_ms."""
+        n = self.noise
+        x, y, z = (pk + (self._rng.gauss(0.0, n) if n else 0.0) for pk in self.p)
+        vx, vy, vz = self.v
+        ax, ay, az = self.a
+        c, s = math.cos(math.radians(self.yaw)), math.sin(math.radians(self.yaw))
+        a_fwd, a_left = c * ax + s * ay, -s * ax + c * ay
+        pitch = math.degrees(math.atan2(a_fwd, az + G))
+        roll = -math.degrees(math.atan2(a_left, az + G))
+        spec = math.sqrt(ax * ax + ay * ay + (az + G) ** 2) / G if self.p[2] > 0 or az > 0 else 1.0
+        # kalman.varPX/Y/Z (velocity-state variances) decay after boot / resetEstimation;
+        # one simple exponential stands in for all three
+        var = 1e-6 + 0.05 * math.exp(-(t_ms - self.estimator_reset_ms) / 400.0)
+        vbat = 4.15 - 0.55 * min(1.0, self.flight_s / 420.0)
+        tx, ty, tz = self.target
+        tvx, tvy, tvz = self.target_v
+        return {
+            'stateEstimate.x': x, 'stateEstimate.y': y, 'stateEstimate.z': z,
+            'stateEstimate.vx': vx, 'stateEstimate.vy': vy, 'stateEstimate.vz': vz,
+            'stateEstimate.ax': ax / G, 'stateEstimate.ay': ay / G, 'stateEstimate.az': az / G,
+            'stateEstimate.roll': roll, 'stateEstimate.pitch': pitch, 'stateEstimate.yaw': self.yaw,
+            'stateEstimateZ.x': x * 1000, 'stateEstimateZ.y': y * 1000, 'stateEstimateZ.z': z * 1000,
+            'stateEstimateZ.vx': vx * 1000, 'stateEstimateZ.vy': vy * 1000, 'stateEstimateZ.vz': vz * 1000,
+            'stabilizer.roll': roll, 'stabilizer.pitch': pitch, 'stabilizer.yaw': self.yaw,
+            'stabilizer.thrust': 0.55 * 65535 * spec if self.flying else 0.0,
+            'acc.x': 0.0, 'acc.y': 0.0, 'acc.z': spec,
+            'gyro.x': 0.0, 'gyro.y': 0.0, 'gyro.z': self.yaw_rate,
+            'kalman.stateX': x, 'kalman.stateY': y, 'kalman.stateZ': z,
+            'kalman.varPX': var, 'kalman.varPY': var, 'kalman.varPZ': var,
+            'ctrltarget.x': tx, 'ctrltarget.y': ty, 'ctrltarget.z': tz,
+            'ctrltarget.vx': tvx, 'ctrltarget.vy': tvy, 'ctrltarget.vz': tvz,
+            'ctrltarget.yaw': self.target_yaw,
+            'range.zrange': z * 1000, 'motion.squal': 120,
+            'pm.vbat': vbat, 'pm.vbatMV': vbat * 1000,
+            'pm.batteryLevel': 100 * (vbat - 3.6) / 0.55, 'pm.state': 0,
+        }
+
+
+# ---------- TOC ----------
+
+def load_toc(toc_dir=DEFAULT_TOC_DIR):
+    """
+    Read the cflib TOC cache JSON files. Returns {'log': (crc, elems), 'param': (crc, elems)},
+    elems being the cache entries (dicts) ordered by ident.
+    """
+    tocs = {}
+    for path in sorted(Path(toc_dir).glob('*.json')):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        elems = [e for group in data.values() for e in group.values()]
+        if not elems:
+            continue
+        kind = {'LogTocElement': 'log', 'ParamTocElement': 'param'}.get(elems[0].get('__class__'))
+        if kind and kind not in tocs:
+            tocs[kind] = (int(path.stem, 16), sorted(elems, key=lambda e: e['ident']))
+    missing = {'log', 'param'} - set(tocs)
+    if missing:
+        raise FileNotFoundError(f"no {'/'.join(sorted(missing))} TOC cache in {toc_dir}")
+    return tocs
+
+
+_LOG_TYPE_IDS = {v[0]: k for k, v in LogTocElement.types.items()}
+_PARAM_TYPE_IDS = {v[0]: k for k, v in ParamTocElement.types.items()}
+_INT_RANGES = {'<B': (0, 0xFF), '<b': (-0x80, 0x7F), '<H': (0, 0xFFFF), '<h': (-0x8000, 0x7FFF),
+               '<L': (0, 0xFFFFFFFF), '<I': (0, 0xFFFFFFFF), '<i': (-0x80000000, 0x7FFFFFFF),
+               '<q': (-2 ** 63, 2 ** 63 - 1)}
+
+
+def _coerce(pytype, value):
+    rng = _INT_RANGES.get(pytype)
+    if rng is None:
+        return float(value)
+    return min(max(int(round(value)), rng[0]), rng[1])
+
+
+def _toc_item_payload(elem, type_byte):
+    name = f"{elem['group']}\0{elem['name']}\0".encode('ISO-8859-1')
+    return struct.pack('<BHB', 2, elem['ident'], type_byte) + name
+
+
+class _LogBlock:
+    __slots__ = ('id', 'vars', 'period_ticks', 'next_ms', 'started', 'packer')
+
+    def __init__(self, block_id):
+        self.id = block_id
+        self.vars = []                # (name, fetch pytype)
+        self.period_ticks = 10
+        self.next_ms = None
+        self.started = False
+        self.packer = None
+
+    @property
+    def size(self):
+        return sum(struct.calcsize(t) for _, t in self.vars)
+
+
+# ---------- link driver ----------
+
+class SimDriver(CRTPDriver):
+    """cflib link driver for sim:// URIs (and any prefix passed to register(capture=...))."""
+
+    def __init__(self):
+        CRTPDriver.__init__(self)
+        self.needs_resending = False
+        self.uri = ''
+        self.vehicle = None
+        self._thread = None
+        self._running = False
+        self._in = queue.Queue()
+        self._lock = threading.Lock()
+
+    # ---------- CRTPDriver interface ----------
+
+    def connect(self, uri, radio_link_statistics_callback, link_error_callback):
+        if not uri.startswith(SIM_SCHEME) and not uri.startswith(_capture):
+            raise WrongUriType('Not a sim URI')
+        opts = dict(_options)
+        opts.update(parse_qsl(urlparse(uri).query))
+        self.uri = uri
+        self.speed = float(opts.get('speed', 1.0))
+        if self.speed <= 0:
+            raise ValueError(f"speed must be > 0, got {self.speed}")
+        self.latency_ms = float(opts.get('latency_ms', 0.0))
+        self.vehicle = SimVehicle(noise=float(opts.get('noise', 0.0)), seed=int(opts.get('seed', 0)))
+        self._link_error_callback = link_error_callback
+
+        tocs = load_toc(opts.get('toc', DEFAULT_TOC_DIR))
+        self._log_crc, self._log_toc = tocs['log']
+        self._param_crc, self._param_toc = tocs['param']
+        self._log_names = {e['ident']: f"{e['group']}.{e['name']}" for e in self._log_toc}
+        self._params = {}
+        for e in self._param_toc:
+            name = f"{e['group']}.{e['name']}"
+            self._params[e['ident']] = _coerce(e['pytype'], PARAM_DEFAULTS.get(name, 0))
+        self.param_writes = []        # (firmware ms, name, value)
+        self._blocks = {}
+        self.traj_mem = bytearray(TRAJ_MEMORY_SIZE)
+        self._traj_defs = {}          # trajectory id -> (type, offset, n_pieces)
+
+        self.t_ms = float(BOOT_MS)
+        self._wall0 = time.monotonic()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='SimLinkThread', daemon=True)
+        self._thread.start()
+
+    def send_packet(self, pk):
+        with self._lock:
+            if self._running:
+                self._handle(pk.port, pk.channel, bytes(pk.data))
+
+    def receive_packet(self, wait=0):
+        try:
+            if wait == 0:
+                due, pk = self._in.get(False)
+            else:
+                due, pk = self._in.get(True, None if wait < 0 else wait)
+        except queue.Empty:
+            return None
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return pk
+
+    def close(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def get_status(self):
+        return 'Simulated link'
+
+    def get_name(self):
+        return 'sim'
+
+    def scan_interface(self, address=None):
+        return [[SIM_SCHEME + '0', '']]
+
+    def enum(self):
+        return self.scan_interface()
+
+    def get_help(self):
+        return 'sim://<id>?speed=1&latency_ms=0&noise=0&seed=0&toc=<cache dir>'
+
+    # ---------- firmware clock ----------
+
+    def _run(self):
+        """Advance the firmware clock in 10 ms ticks, paced to speed x wall time."""
+        tick_wall = TICK_MS / 1000.0 / self.speed
+        k = 0
+        while self._running:
+            k += 1
+            remaining = self._wall0 + k * tick_wall - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            with self._lock:
+                if not self._running:
+                    break
+                for _ in range(SUBSTEPS):
+                    self.vehicle.step(self.t_ms, TICK_MS / SUBSTEPS)
+                    self.t_ms += TICK_MS / SUBSTEPS
+                self._emit_logs()
+
+    def _emit_logs(self):
+        due = [b for b in self._blocks.values() if b.started and b.next_ms <= self.t_ms]
+        if not due:
+            return
+        values = self.vehicle.telemetry(self.t_ms)
+        ts = int(self.t_ms) & 0xFFFFFF
+        for b in due:
+            b.next_ms += b.period_ticks * TICK_MS
+            data = b.packer.pack(*(_coerce(t, values.get(n, 0.0)) for n, t in b.vars))
+            self._reply(CRTPPort.LOGGING, 2, struct.pack('<BHB', b.id, ts & 0xFFFF, ts >> 16) + data)
+
+    def _reply(self, port, channel, data):
+        pk = CRTPPacket()
+        pk.set_header(port, channel)
+        pk.data = data
+        self._in.put((time.monotonic() + self.latency_ms / 1000.0 / self.speed, pk))
+
+    def _arrival_ms(self):
+        return self.t_ms + self.latency_ms
+
+    # ---------- packet handlers (host -> firmware) ----------
+
+    def _handle(self, port, channel, data):
+        if port == CRTPPort.LINKCTRL:
+            if channel == 1:                       # source: identify as a Crazyflie
+                self._reply(port, 1, b'Bitcraze Crazyflie')
+            elif channel == 0:                     # echo (link statistics ping)
+                self._reply(port, 0, data)
+        elif port == CRTPPort.PLATFORM:
+            if channel == 1 and data[:1] == b'\x00':
+                self._reply(port, 1, bytes((0, PROTOCOL_VERSION)))
+        elif port == CRTPPort.LOGGING:
+            self._handle_log(channel, data)
+        elif port == CRTPPort.PARAM:
+            self._handle_param(channel, data)
+        elif port == CRTPPort.MEM:
+            self._handle_mem(channel, data)
+        elif port == CRTPPort.COMMANDER:
+            roll, pitch, yaw_rate, thrust = struct.unpack('<fffH', data[:14])
+            sp = ('stop',) if thrust == 0 else ('att', roll, -pitch, yaw_rate, thrust / 65535.0)
+            self.vehicle.command(sp, self._arrival_ms())
+        elif port == CRTPPort.COMMANDER_GENERIC:
+            self._handle_setpoint(channel, data)
+        elif port == CRTPPort.SETPOINT_HL and data:
+            self._handle_high_level(data)
+        elif port == CRTPPort.SUPERVISOR and channel == 1 and data:
+            self._handle_supervisor(data)
+        elif port == CRTPPort.SUPERVISOR and channel == 0 and data[:1] == b'\x0c':
+            self._reply(port, 0, struct.pack('<BH', 0x8c, self._supervisor_bits()))
+        elif port == CRTPPort.LOCALIZATION and data[:1] in (b'\x03', b'\x04'):
+            self._emergency_stop()
+
+    def _handle_log(self, channel, data):
+        if channel == 0:
+            if data[0] == 3:                       # TOC info V2
+                self._reply(CRTPPort.LOGGING, 0, struct.pack('<BHI', 3, len(self._log_toc), self._log_crc))
+            elif data[0] == 2:                     # TOC item V2
+                e = self._log_toc[struct.unpack('<H', data[1:3])[0]]
+                self._reply(CRTPPort.LOGGING, 0,
+                            _toc_item_payload(e, _LOG_TYPE_IDS[e['ctype']] | (e['access'] & 0x10)))
+            return
+        if channel != 1:
+            return
+        cmd = data[0]
+        block_id = data[1] if len(data) > 1 else 0
+        err = 0
+        if cmd in (6, 7):                          # create / append block V2
+            block = self._blocks.get(block_id)
+            if cmd == 6 and block is not None:
+                err = errno.EEXIST
+            elif cmd == 7 and block is None:
+                err = errno.ENOENT
+            elif cmd == 6 and len(self._blocks) >= 16:
+                err = errno.ENOMEM
+            else:
+                new = block or _LogBlock(block_id)
+                items, ok = [], True
+                for k in range(2, len(data) - 2, 3):
+                    ident = struct.unpack('<H', data[k + 1:k + 3])[0]
+                    if ident not in self._log_names:
+                        ok = False
+                        break
+                    items.append((self._log_names[ident], LogTocElement.types[data[k] & 0x0F][1]))
+                if not ok:
+                    err = errno.ENOENT
+                elif sum(struct.calcsize(t) for _, t in new.vars + items) > 26:
+                    err = errno.E2BIG
+                else:
+                    new.vars += items
+                    new.packer = struct.Struct('<' + ''.join(t[1] for _, t in new.vars))
+                    self._blocks[block_id] = new
+        elif cmd == 3:                             # start
+            block = self._blocks.get(block_id)
+            if block is None:
+                err = errno.ENOENT
+            else:
+                block.period_ticks = max(1, data[2])
+                block.next_ms = self._arrival_ms() + block.period_ticks * TICK_MS
+                block.started = True
+        elif cmd == 4:                             # stop
+            block = self._blocks.get(block_id)
+            if block is None:
+                err = errno.ENOENT
+            else:
+                block.started = False
+        elif cmd == 2:                             # delete
+            if self._blocks.pop(block_id, None) is None:
+                err = errno.ENOENT
+        elif cmd == 5:                             # reset
+            self._blocks.clear()
+            block_id = 0
+        else:
+            err = errno.ENOEXEC
+        self._reply(CRTPPort.LOGGING, 1, bytes((cmd, block_id, err)))
+
+    def _param_elem(self, ident):
+        return self._param_toc[ident] if 0 <= ident < len(self._param_toc) else None
+
+    def _handle_param(self, channel, data):
+        port = CRTPPort.PARAM
+        if channel == 0:
+            if data[0] == 3:
+                self._reply(port, 0, struct.pack('<BHI', 3, len(self._param_toc), self._param_crc))
+            elif data[0] == 2:
+                e = self._param_toc[struct.unpack('<H', data[1:3])[0]]
+                meta = _PARAM_TYPE_IDS[e['ctype']] | (0x10 if e.get('extended') else 0) \
+                    | (0x40 if e['access'] == ParamTocElement.RO_ACCESS else 0)
+                self._reply(port, 0, _toc_item_payload(e, meta))
+            return
+
+        ident = struct.unpack('<H', data[1:3] if channel == 3 else data[:2])[0]
+        e = self._param_elem(ident)
+        if channel == 1:                           # read
+            if e is None:
+                self._reply(port, 1, data[:2] + bytes((errno.ENOENT,)))
+            else:
+                self._reply(port, 1, data[:2] + b'\x00' + struct.pack(e['pytype'], self._params[ident]))
+        elif channel == 2 and e is not None:       # write, confirmed by echoing the new value
+            value = struct.unpack(e['pytype'], data[2:2 + struct.calcsize(e['pytype'])])[0]
+            if e['access'] != ParamTocElement.RO_ACCESS:
+                self._set_param(ident, e, value)
+            self._reply(port, 2, data[:2] + struct.pack(e['pytype'], self._params[ident]))
+        elif channel == 3 and data[0] == 7:        # extended type V2: persistent
+            self._reply(port, 3, data[:3] + bytes((0, ParamTocElement.EXTENDED_PERSISTENT)))
+
+    def _set_param(self, ident, e, value):
+        name = f"{e['group']}.{e['name']}"
+        self._params[ident] = value
+        self.param_writes.append((self.t_ms, name, value))
+        if name == 'kalman.resetEstimation' and value:
+            self.vehicle.estimator_reset_ms = self._arrival_ms()
+
+    def _handle_setpoint(self, channel, data):
+        v = self.vehicle
+        t = self._arrival_ms()
+        if channel == 1:                           # meta: notify setpoint stop
+            if data[0] == 0:
+                v.command(('notify_stop',), t, hold_ms=struct.unpack('<I', data[1:5])[0])
+            return
+        kind = data[0]
+        if kind == 0:
+            v.command(('stop',), t)
+        elif kind == 7:
+            x, y, z, yaw = struct.unpack('<ffff', data[1:17])
+            v.command(('pos', x, y, z, yaw), t)
+        elif kind in (1, 8):
+            v.command(('vel',) + struct.unpack('<ffff', data[1:17]), t)
+        elif kind in (2, 9):
+            roll, pitch, yaw_rate, z = struct.unpack('<ffff', data[1:17])
+            v.command(('zdist', roll, pitch, yaw_rate, z), t)
+        elif kind in (5, 10):
+            v.command(('hover',) + struct.unpack('<ffff', data[1:17]), t)
+        elif kind == 6:
+            f = struct.unpack('<hhhhhhhhhIhhh', data[1:29])
+            mm = [x / 1000.0 for x in f[:9]]
+            v.command(('full', mm[0:3], mm[3:6], mm[6:9], f[12] / 1000.0), t)
+        elif kind == 11:
+            roll, pitch, yaw_rate, thrust, _ = struct.unpack('<fffHB', data[1:16])
+            v.command(('stop',) if thrust == 0 else ('att', roll, -pitch, yaw_rate, thrust / 65535.0), t)
+
+    def _handle_mem(self, channel, data):
+        """Memory 0 is the trajectory memory; no other memories are reported."""
+        port = CRTPPort.MEM
+        if channel == 0:
+            if data[:1] == b'\x01':                 # number of memories
+                self._reply(port, 0, bytes((1, 1)))
+            elif data[:2] == b'\x02\x00':          # details of memory 0
+                self._reply(port, 0, struct.pack('<BBBI', 2, 0, MEM_TYPE_TRAJ, len(self.traj_mem)) + bytes(8))
+        elif channel == 1:                          # read
+            mem_id, addr, n = struct.unpack('<BIB', data[:6])
+            ok = mem_id == 0 and addr + n <= len(self.traj_mem)
+            payload = bytes(self.traj_mem[addr:addr + n]) if ok else b''
+            self._reply(port, 1, struct.pack('<BIB', mem_id, addr, 0 if ok else errno.EIO) + payload)
+        elif channel == 2:                          # write
+            mem_id, addr = struct.unpack('<BI', data[:5])
+            chunk = data[5:]
+            ok = mem_id == 0 and addr + len(chunk) <= len(self.traj_mem)
+            if ok:
+                self.traj_mem[addr:addr + len(chunk)] = chunk
+            self._reply(port, 2, struct.pack('<BIB', mem_id, addr, 0 if ok else errno.EIO))
+
+    def _handle_high_level(self, data):
+        v = self.vehicle
+        t = self._arrival_ms()
+        cmd = data[0]
+        if cmd == 3:                                # stop
+            v.command(('stop',), t)
+        elif cmd in (7, 8):                         # takeoff_2 / land_2
+            _, _, height, yaw, use_current_yaw, duration = struct.unpack('<BBff?f', data[:15])
+            v.command(('hl_goto', None, None, height, None if use_current_yaw else yaw, duration, False), t)
+        elif cmd in (4, 12):                        # go_to / go_to_2
+            fmt = '<BBBfffff' if cmd == 4 else '<BBBBfffff'
+            f = struct.unpack(fmt, data[:struct.calcsize(fmt)])
+            x, y, z, yaw, duration = f[-5:]
+            v.command(('hl_goto', x, y, z, yaw, duration, bool(f[2])), t)
+        elif cmd == 6:                              # define trajectory (in memory)
+            _, tid, _, ttype, offset, n_pieces = struct.unpack('<BBBBIB', data[:9])
+            self._traj_defs[tid] = (ttype, offset, n_pieces)
+        elif cmd in (5, 13):                        # start trajectory / start trajectory_2
+            if cmd == 5:
+                _, _, relative, rev, tid, scale = struct.unpack('<BBBBBf', data[:9])
+            else:
+                _, _, relative, _, rev, tid, scale = struct.unpack('<BBBBBBf', data[:10])
+            d = self._traj_defs.get(tid)
+            if d is None:
+                return
+            try:
+                poly = unpack(self.traj_mem, d[2], 'poly4d' if d[0] == 0 else 'compressed', d[1])
+            except (struct.error, ValueError):
+                return                              # garbage in memory: the firmware ignores it too
+            v.command(('hl_traj', poly, scale, bool(relative), bool(rev)), t)
+
+    def _supervisor_bits(self):
+        v = self.vehicle
+        return ((not v.locked) << 0 | v.armed << 1 | (not v.locked) << 3 | v.flying << 4
+                | v.locked << 6 | 1 << 10)
+
+    def _handle_supervisor(self, data):
+        cmd = data[0]
+        v = self.vehicle
+        if cmd == 0x01:                            # arm / disarm
+            ok = not v.locked
+            if ok:
+                v.armed = bool(data[1]) if len(data) > 1 else True
+            self._reply(CRTPPort.SUPERVISOR, 1, bytes((0x81, ok, v.armed)))
+        elif cmd == 0x02:                          # crash recovery
+            self._reply(CRTPPort.SUPERVISOR, 1, bytes((0x82, 1, 1)))
+        elif cmd in (0x03, 0x04):
+            self._emergency_stop()
+
+    def _emergency_stop(self):
+        v = self.vehicle
+        v.locked = True
+        v.armed = False
+        v.command(('stop',), self._arrival_ms())
+
+
+def register(capture=(), **options):
+    """
+    Make cflib route sim:// URIs (and URIs starting with any prefix in
+    'capture', e.g. 'radio://') to SimDriver. Keyword options become the
+    defaults of the URI query (speed, latency_ms, noise, seed, toc).
+    Call it before or after cflib.crtp.init_drivers(); calling it twice is harmless.
+    """
+    import cflib.crtp
+
+    global _capture
+    _capture = tuple(capture)
+    _options.update({k: v for k, v in options.items() if v is not None})
+    if SimDriver not in cflib.crtp.CLASSES:
+        # first, so a captured radio:// URI never reaches the real radio driver
+        cflib.crtp.CLASSES.insert(0, SimDriver)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        description='Run a flight script against the simulated link (sim://, and radio:// by default)')
+    ap.add_argument('--speed', type=float, default=None, help='firmware time per wall time (default 1)')
+    ap.add_argument('--latency_ms', type=float, default=None, help='one-way link delay')
+    ap.add_argument('--noise', type=float, default=None, help='position estimate noise std (m)')
+    ap.add_argument('--seed', type=int, default=None)
+    ap.add_argument('--toc', default=None, help='TOC cache folder served to the host')
+    ap.add_argument('--no-radio', dest='radio', action='store_false',
+                    help='leave radio:// URIs alone (only sim:// goes to the sim)')
+    ap.add_argument('script', help='script to run, e.g. Tests/test_seq.py')
+    ap.add_argument('args', nargs=argparse.REMAINDER, help='arguments for the script')
+    args = ap.parse_args(argv)
+
+    register(capture=('radio://',) if args.radio else (), speed=args.speed,
+             latency_ms=args.latency_ms, noise=args.noise, seed=args.seed, toc=args.toc)
+    script = os.path.abspath(args.script)
+    sys.argv = [script] + args.args
+    sys.path.insert(0, os.path.dirname(script))
+    runpy.run_path(script, run_name='__main__')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Error-bounded knot reduction for dense trajectories (Ramer-Douglas-Peucker).
+
+Keeping every n-th knot spends as many knots on the flat start of a swing as
+on the sharp part near the catch. simplify() instead keeps only the knots
+needed for the piecewise-linear reconstruction to stay within a position
+tolerance (m) and a yaw tolerance (deg) of every dense knot.
+
+The error is time-synchronized: a dense knot at time t is compared with the
+simplified trajectory sampled at the same t, not with the nearest point of
+the path, since the followers interpolate in time. RDP splits a segment at
+its worst knot until every segment is within tolerance; the split is done
+iteratively with one vectorized error evaluation per segment.
+
+Usage:
+    coarse, stats = simplify(traj, pos_tol=0.002, yaw_tol=1.0)
+    print(stats.summary())
+"""
+
+import numpy as np
+
+from cftools.trajectory import Trajectory, _wrap_deg
+
+
+class SimplifyStats:
+    """Knot counts and worst reconstruction errors of one simplification."""
+
+    def __init__(self, knots_in, knots_out, max_pos_err, max_yaw_err, max_vy_err):
+        self.knots_in = knots_in
+        self.knots_out = knots_out
+        self.max_pos_err = max_pos_err        # m
+        self.max_yaw_err = max_yaw_err        # deg
+        self.max_vy_err = max_vy_err          # m/s
+
+    @property
+    def ratio(self):
+        return self.knots_in / self.knots_out if self.knots_out else float('nan')
+
+    def as_dict(self):
+        return {'knots_in': self.knots_in, 'knots_out': self.knots_out, 'ratio': self.ratio,
+                'max_pos_err_mm': self.max_pos_err * 1e3, 'max_yaw_err_deg': self.max_yaw_err,
+                'max_vy_err': self.max_vy_err}
+
+    def summary(self):
+        return (f"simplify: {self.knots_in} -> {self.knots_out} knots ({self.ratio:.1f}x), "
+                f"worst error {self.max_pos_err * 1e3:.2f} mm / {self.max_yaw_err:.2f} deg / "
+                f"vy {self.max_vy_err:.3f} m/s")
+
+
+def _segment_errors(t, P, yaw, vy, i, j):
+    """Errors of knots i+1..j-1 against the straight segment i -> j (pos m, yaw deg, vy)."""
+    u = ((t[i + 1:j] - t[i]) / (t[j] - t[i]))[:, None]
+    pos = np.linalg.norm(P[i + 1:j] - (P[i] + u * (P[j] - P[i])), axis=1)
+    dyaw = _wrap_deg(yaw[j] - yaw[i])
+    yerr = np.abs(_wrap_deg(yaw[i + 1:j] - (yaw[i] + u[:, 0] * dyaw)))
+    verr = np.abs(vy[i + 1:j] - (vy[i] + u[:, 0] * (vy[j] - vy[i])))
+    return pos, yerr, verr
+
+
+def rdp_indices(t, P, yaw, vy, pos_tol, yaw_tol, vy_tol=None):
+    """Sorted indices of the knots kept by time-synchronized RDP."""
+    n = t.size
+    if n <= 2:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        pos, yerr, verr = _segment_errors(t, P, yaw, vy, i, j)
+        # Normalize by the tolerances so one split rule covers every channel
+        score = pos / pos_tol
+        if yaw_tol is not None:
+            score = np.maximum(score, yerr / yaw_tol)
+        if vy_tol is not None:
+            score = np.maximum(score, verr / vy_tol)
+        k = int(np.argmax(score))
+        if score[k] > 1.0:
+            m = i + 1 + k
+            keep[m] = True
+            stack.append((i, m))
+            stack.append((m, j))
+    return np.flatnonzero(keep)
+
+
+def simplify(traj, pos_tol=0.002, yaw_tol=1.0, vy_tol=None):
+    """
+    Reduced Trajectory reproducing traj within pos_tol (m, 3-D distance)
+    and yaw_tol (deg). vy is bounded too when vy_tol (m/s) is given (needs
+    vy_mode 'linear'), else it is only carried on the kept knots.
+    Returns (Trajectory, SimplifyStats).
+    """
+    if pos_tol <= 0:
+        raise ValueError(f"pos_tol must be > 0, got {pos_tol}")
+    if vy_tol is not None and traj.vy_mode != 'linear':
+        raise ValueError("vy_tol needs a trajectory with vy_mode='linear'")
+    P = np.column_stack([traj.x, traj.y, traj.z])
+    idx = rdp_indices(traj.t, P, traj.yaw, traj.vy, pos_tol, yaw_tol, vy_tol)
+    out = Trajectory(traj.t[idx], traj.x[idx], traj.y[idx], traj.z[idx], traj.yaw[idx],
+                     vy=traj.vy[idx], vy_mode=traj.vy_mode)
+
+    # Worst error measured through the follower's own sampling, not the RDP bookkeeping
+    S = out.sample_many(traj.t)
+    pos_err = np.sqrt((S['x'] - traj.x) ** 2 + (S['y'] - traj.y) ** 2 + (S['z'] - traj.z) ** 2)
+    yaw_err = np.abs(_wrap_deg(S['yaw'] - traj.yaw))
+    vy_err = np.abs(S['vy'] - traj.vy)
+    stats = SimplifyStats(len(traj), len(out), float(pos_err.max()), float(yaw_err.max()),
+                          float(vy_err.max()))
+    return out, stats
@@ -0,0 +1,198 @@
+"""
+C2 cubic-spline trajectory with analytic velocity and acceleration.
+
+Trajectory interpolates position linearly, so its velocity is a staircase
+and its acceleration is zero except at the knots; the only feed-forward the
+followers had was the vy column and the --vy_ff look-ahead on y.
+SplineTrajectory interpolates the same knots (x, y, z, yaw_deg) with a cubic
+spline that is continuous up to the acceleration, and differentiates it
+analytically, so one evaluation gives the position, velocity and
+acceleration of every axis for a full-state setpoint.
+
+- Ends are clamped to zero velocity by default ('clamped'), matching the
+  hover at the start and end of a flight; 'natural' leaves them free
+- yaw is unwrapped before fitting; yaw rates are deg/s
+- a CSV vy column is not used: the velocities come from the spline itself
+- the moments come from one tridiagonal solve (Thomas algorithm), no SciPy
+
+Usage:
+    spl = SplineTrajectory.from_csv('Traj.csv')
+    s = spl.sample(t)                    # dict: x, y, z, yaw, vx.., ax.., yaw_rate
+    cf.commander.send_full_state_setpoint(*full_state(s))
+    pos, vel, acc = spl.evaluate(times)  # each (len(times), 4), last column yaw
+"""
+
+import math
+from bisect import bisect_right
+
+import numpy as np
+
+from cftools.trajectory import Trajectory
+
+BOUNDARIES = ('clamped', 'natural')
+MAX_YAW_RATE = 32.0     # deg/s: the full-state packet carries yaw rate as int16 millideg/s
+
+
+def yaw_quaternion(yaw_deg):
+    """(qx, qy, qz, qw) of a pure yaw rotation."""
+    h = math.radians(yaw_deg) / 2.0
+    return (0.0, 0.0, math.sin(h), math.cos(h))
+
+
+def full_state(s):
+    """Arguments of cf.commander.send_full_state_setpoint for one sample() dict."""
+    return ((s['x'], s['y'], s['z']), (s['vx'], s['vy'], s['vz']), (s['ax'], s['ay'], s['az']),
+            yaw_quaternion(s['yaw']), 0.0, 0.0,
+            max(-MAX_YAW_RATE, min(MAX_YAW_RATE, s['yaw_rate'])))
+
+
+def _moments(t, Y, bc):
+    """Second derivatives (n, k) of the interpolating cubic spline through the knots Y (n, k)."""
+    n = t.size
+    h = np.diff(t)
+    slope = np.diff(Y, axis=0) / h[:, None]
+    lower, diag, upper = np.zeros(n), np.ones(n), np.zeros(n)
+    rhs = np.zeros_like(Y)
+    lower[1:-1], diag[1:-1], upper[1:-1] = h[:-1], 2.0 * (h[:-1] + h[1:]), h[1:]
+    rhs[1:-1] = 6.0 * (slope[1:] - slope[:-1])
+    if bc == 'clamped':                     # zero end velocity; natural keeps M = 0 rows
+        diag[0], upper[0], rhs[0] = 2.0 * h[0], h[0], 6.0 * slope[0]
+        lower[-1], diag[-1], rhs[-1] = h[-1], 2.0 * h[-1], -6.0 * slope[-1]
+
+    # Thomas algorithm, vectorized across the axes
+    c, d = np.zeros(n), np.zeros_like(Y)
+    c[0], d[0] = upper[0] / diag[0], rhs[0] / diag[0]
+    for i in range(1, n):
+        m = diag[i] - lower[i] * c[i - 1]
+        c[i] = upper[i] / m
+        d[i] = (rhs[i] - lower[i] * d[i - 1]) / m
+    M = d
+    for i in range(n - 2, -1, -1):
+        M[i] = d[i] - c[i] * M[i + 1]
+    return M
+
+
+class SplineTrajectory:
+    """Cubic pieces between the knots; coeffs[i, axis] are the powers of (t - t_i)."""
+
+    def __init__(self, t, x, y, z, yaw, bc='clamped'):
+        if bc not in BOUNDARIES:
+            raise ValueError(f"bc must be one of {BOUNDARIES}, got {bc!r}")
+        t = np.asarray(t, dtype=float)
+        Y = np.column_stack([np.asarray(c, dtype=float) for c in (x, y, z, yaw)])
+        if t.ndim != 1 or Y.shape[0] != t.size:
+            raise ValueError("all trajectory columns must have the same length")
+        order = np.argsort(t, kind='stable')
+        t, Y = t[order], Y[order]
+        # Repeated time stamps would give zero-length pieces: keep the first knot of each
+        keep = np.concatenate([[True], np.diff(t) > 1e-9])
+        t, Y = t[keep], Y[keep]
+        if t.size < 2:
+            raise ValueError("SplineTrajectory needs at least two distinct knot times")
+        Y[:, 3] = np.degrees(np.unwrap(np.radians(Y[:, 3])))
+
+        self.t = t
+        self.knots = Y                      # (n, 4): x, y, z, unwrapped yaw_deg
+        self.bc = bc
+        h = np.diff(t)[:, None]
+        M = _moments(t, Y, bc)
+        coeffs = np.empty((t.size - 1, 4, 4))
+        coeffs[:, :, 0] = Y[:-1]
+        coeffs[:, :, 1] = np.diff(Y, axis=0) / h - h * (2.0 * M[:-1] + M[1:]) / 6.0
+        coeffs[:, :, 2] = M[:-1] / 2.0
+        coeffs[:, :, 3] = np.diff(M, axis=0) / (6.0 * h)
+        self.coeffs = coeffs
+
+        # Plain lists for the scalar hot path (see Trajectory)
+        self._tl = t.tolist()
+        self._cl = coeffs.tolist()
+        self._ends = (Y[0].tolist(), Y[-1].tolist())
+        self._cursor = 0
+
+    # ---------- constructors ----------
+
+    @classmethod
+    def from_trajectory(cls, traj, bc='clamped'):
+        return cls(traj.t, traj.x, traj.y, traj.z, traj.yaw, bc=bc)
+
+    @classmethod
+    def from_csv(cls, csv_path, bc='clamped'):
+        """Read a time_s,x,y,z,yaw_deg[,vy] CSV (see Trajectory.from_csv)."""
+        return cls.from_trajectory(Trajectory.from_csv(csv_path), bc=bc)
+
+    # ---------- knots ----------
+
+    def __len__(self):
+        return self.t.size
+
+    def __getitem__(self, i):
+        """Knot i as a row dict, like Trajectory."""
+        p = self.knots[i]
+        return {'t': float(self.t[i]), 'x': float(p[0]), 'y': float(p[1]),
+                'z': float(p[2]), 'yaw': float(p[3])}
+
+    @property
+    def t_start(self):
+        return self._tl[0]
+
+    @property
+    def t_end(self):
+        return self._tl[-1]
+
+    @property
+    def duration(self):
+        return self._tl[-1] - self._tl[0]
+
+    # ---------- sampling ----------
+
+    def reset(self):
+        self._cursor = 0
+
+    def segment(self, t):
+        """Index of the piece holding t, with the same cursor walk as Trajectory.segment."""
+        tl = self._tl
+        last = len(tl) - 2
+        i = self._cursor
+        if tl[i] <= t:
+            for _ in range(4):
+                if i >= last or t < tl[i + 1]:
+                    self._cursor = i
+                    return i
+                i += 1
+        i = min(max(bisect_right(tl, t) - 1, 0), last)
+        self._cursor = i
+        return i
+
+    def sample(self, t):
+        """Full-state setpoint at time t as a dict; held (zero rates) outside the knot range."""
+        tl = self._tl
+        if t <= tl[0] or t >= tl[-1]:
+            x, y, z, yaw = self._ends[0] if t <= tl[0] else self._ends[1]
+            return {'t': t, 'x': x, 'y': y, 'z': z, 'yaw': yaw,
+                    'vx': 0.0, 'vy': 0.0, 'vz': 0.0, 'ax': 0.0, 'ay': 0.0, 'az': 0.0,
+                    'yaw_rate': 0.0}
+        i = self.segment(t)
+        h = t - tl[i]
+        pos, vel, acc = [], [], []
+        for c0, c1, c2, c3 in self._cl[i]:
+            pos.append(c0 + h * (c1 + h * (c2 + h * c3)))
+            vel.append(c1 + h * (2.0 * c2 + h * 3.0 * c3))
+            acc.append(2.0 * c2 + 6.0 * h * c3)
+        return {'t': t, 'x': pos[0], 'y': pos[1], 'z': pos[2], 'yaw': pos[3],
+                'vx': vel[0], 'vy': vel[1], 'vz': vel[2],
+                'ax': acc[0], 'ay': acc[1], 'az': acc[2], 'yaw_rate': vel[3]}
+
+    def evaluate(self, times):
+        """Vectorized (pos, vel, acc), each (len(times), 4) with yaw last; held at the ends."""
+        times = np.asarray(times, dtype=float)
+        tc = np.clip(times, self.t[0], self.t[-1])
+        i = np.clip(np.searchsorted(self.t, tc, side='right') - 1, 0, self.t.size - 2)
+        h = (tc - self.t[i])[:, None]
+        c = self.coeffs[i]                                       # (m, 4, 4)
+        pos = c[:, :, 0] + h * (c[:, :, 1] + h * (c[:, :, 2] + h * c[:, :, 3]))
+        vel = c[:, :, 1] + h * (2.0 * c[:, :, 2] + h * 3.0 * c[:, :, 3])
+        acc = 2.0 * c[:, :, 2] + 6.0 * h * c[:, :, 3]
+        outside = (times <= self.t[0]) | (times >= self.t[-1])
+        vel[outside] = 0.0
+        acc[outside] = 0.0
+        return pos, vel, acc
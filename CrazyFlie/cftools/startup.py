@@ -0,0 +1,233 @@
+"""
+Startup and connection phase profiler for the flight scripts.
+
+Before the first setpoint a script goes through imports, init_drivers,
+the SyncCrazyflie connect (link, log/param TOC, parameter values), the
+set_param calls, the Kalman reset sleeps and the arming sleep. The
+profiler timestamps each of them on one monotonic clock:
+
+- phase(name)           : context manager, nests (an indented row per level)
+- mark(name)            : an instant, e.g. 'first setpoint'
+- watch_connection(cf)  : splits the connect into link / TOCs / parameter
+                          values from the Crazyflie callbacks
+- add_toc_events(cache) : TOC cache hits and misses (cftools.toccache)
+- add_phases(phases)    : FlightExecutive phase records (configure, ...)
+
+waterfall() draws every span as a bar on a common time axis, as_dict() /
+save_json() keep it for comparing runs. import_times() measures cold
+import times of heavy modules, each in a fresh interpreter, so they do not
+depend on what the script happened to import first.
+
+Usage:
+    prof = StartupProfiler()
+    with prof.phase('import cflib'):
+        import cflib.crtp
+    with prof.phase('connect'):
+        prof.watch_connection(cf)
+        scf.open_link()
+    prof.mark('first setpoint')
+    print(prof.waterfall())
+    prof.save_json('startup.json')
+
+CLI (from the CrazyFlie folder):
+    python -m cftools.startup                              # cold imports of the heavy modules
+    python -m cftools.startup --imports cflib.crtp pandas --repeat 5 --json imports.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ('numpy', 'pandas', 'matplotlib.pyplot', 'scipy.io', 'cflib.crtp',
+                 'cflib.crazyflie.syncCrazyflie')
+
+# Spans built from the Crazyflie connect callbacks: (name, from, to, depth below the watcher).
+# open_link() returns at 'connected'; the parameter values keep arriving after that.
+_CONNECT_SPANS = (('connect', 'connection_requested', 'connected', 0),
+                  ('link open', 'connection_requested', 'link_established', 1),
+                  ('log + param TOC', 'link_established', 'connected', 1),
+                  ('param values', 'connected', 'fully_connected', 0))
+
+
+class StartupProfiler:
+    def __init__(self, name='startup'):
+        self.name = name
+        self.t0 = time.monotonic()
+        self.spans = []          # dicts: name, start, end (monotonic s), depth, info
+        self.marks = []          # (name, monotonic s)
+        self._depth = 0
+        self._conn = {}          # callback name -> monotonic s
+        self._conn_depth = 0
+
+    # ---------- recording ----------
+
+    def phase(self, name, **info):
+        return _Span(self, name, info)
+
+    def mark(self, name, t=None):
+        self.marks.append((name, time.monotonic() if t is None else t))
+
+    def add_span(self, name, start, end, depth=0, **info):
+        self.spans.append({'name': name, 'start': start, 'end': end, 'depth': depth, 'info': info})
+
+    def watch_connection(self, cf):
+        """Record the Crazyflie connect callbacks; turned into spans when reporting."""
+        for cb_name in {c for _, a, b, _ in _CONNECT_SPANS for c in (a, b)}:
+            getattr(cf, cb_name).add_callback(
+                lambda *_, n=cb_name: self._conn.setdefault(n, time.monotonic()))
+        self._conn_depth = self._depth
+
+    def _finish_connection(self):
+        for name, a, b, depth in _CONNECT_SPANS:
+            if a in self._conn and b in self._conn and not any(s['name'] == name for s in self.spans):
+                self.add_span(name, self._conn[a], self._conn[b], depth=self._conn_depth + depth)
+
+    def add_toc_events(self, cache, depth=None):
+        """The lookups of a cftools.toccache.SharedTocCache, as spans inside the connect."""
+        depth = self._conn_depth + 2 if depth is None else depth
+        for ev in cache.events:
+            if 't' in ev and not any(s['info'].get('toc') is ev for s in self.spans):
+                self.add_span(f"TOC {ev['crc']} {ev['result']}", ev['t'], ev['t'] + ev['ms'] / 1e3,
+                              depth=depth, toc=ev)
+
+    def add_phases(self, phases, origin, until=None, depth=0):
+        """FlightExecutive.phases (start relative to 'origin'), up to the phase named 'until'."""
+        for ph in phases:
+            if ph['name'] == until:
+                break
+            start = origin + ph['start']
+            self.add_span(ph['name'], start, start + ph['duration'], depth=depth, outcome=ph['outcome'])
+
+    def time_imports(self, modules):
+        """Import 'modules' here, one span each (already imported ones cost ~0 and say so)."""
+        import importlib
+
+        for m in modules:
+            cached = m in sys.modules
+            with self.phase(f'import {m}', cached=cached):
+                importlib.import_module(m)
+
+    # ---------- reporting ----------
+
+    def _rows(self):
+        self._finish_connection()
+        return sorted(self.spans, key=lambda s: (s['start'], s['depth']))
+
+    def total_s(self):
+        ends = [s['end'] for s in self.spans] + [t for _, t in self.marks]
+        return (max(ends) - self.t0) if ends else 0.0
+
+    def as_dict(self):
+        rows = self._rows()
+        return {'name': self.name, 'total_ms': self.total_s() * 1e3,
+                'spans': [{'name': s['name'], 'start_ms': (s['start'] - self.t0) * 1e3,
+                           'duration_ms': (s['end'] - s['start']) * 1e3, 'depth': s['depth'],
+                           **{k: v for k, v in s['info'].items() if k != 'toc'}} for s in rows],
+                'marks': [{'name': n, 'at_ms': (t - self.t0) * 1e3} for n, t in self.marks]}
+
+    def save_json(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=1)
+        return path
+
+    def waterfall(self, width=48):
+        rows = self._rows()
+        total = self.total_s()
+        scale = width / total if total > 0 else 0.0
+        lines = [f'{self.name}: {total * 1e3:.1f} ms']
+        for s in rows:
+            a, d = s['start'] - self.t0, s['end'] - s['start']
+            lo = min(width - 1, int(a * scale))
+            bar = ' ' * lo + '#' * max(1, min(width - lo, round(d * scale)))
+            note = ' (cached)' if s['info'].get('cached') else ''
+            label = '  ' * s['depth'] + s['name']
+            lines.append(f'  {label:<30.30} {a * 1e3:8.1f} {d * 1e3:8.1f} ms |{bar:<{width}}|{note}')
+        for n, t in self.marks:
+            lines.append(f"  {'@ ' + n:<30.30} {(t - self.t0) * 1e3:8.1f}")
+        if rows:
+            covered = _union([(s['start'], s['end']) for s in rows if s['depth'] == 0])
+            lines.append(f'  untracked {max(0.0, total - covered) * 1e3:.1f} ms')
+        return '\n'.join(lines)
+
+
+class _Span:
+    """Context manager recording one StartupProfiler phase."""
+
+    def __init__(self, prof, name, info):
+        self.prof = prof
+        self.name = name
+        self.info = info
+
+    def __enter__(self):
+        self.depth = self.prof._depth
+        self.prof._depth += 1
+        self.t = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.prof._depth -= 1
+        if exc_type is not None:
+            self.info['outcome'] = f'failed ({exc_type.__name__})'
+        self.prof.add_span(self.name, self.t, time.monotonic(), depth=self.depth, **self.info)
+        return False
+
+
+def _union(intervals):
+    total, end = 0.0, float('-inf')
+    for a, b in sorted(intervals):
+        if b > end:
+            total += b - max(a, end)
+            end = b
+    return total
+
+
+# ---------- cold import times ----------
+
+_PROBE = ('import sys, time\n'
+          'sys.path.insert(0, sys.argv[2])\n'
+          't = time.perf_counter()\n'
+          '__import__(sys.argv[1])\n'
+          'print(time.perf_counter() - t)\n')
+
+
+def import_times(modules=HEAVY_MODULES, repeat=3):
+    """{module: median cold import seconds or None if it failed}, one fresh interpreter per import."""
+    out = {}
+    for m in modules:
+        runs = []
+        for _ in range(repeat):
+            r = subprocess.run([sys.executable, '-c', _PROBE, m, str(ROOT)],
+                               capture_output=True, text=True)
+            if r.returncode != 0:
+                break
+            runs.append(float(r.stdout.strip().splitlines()[-1]))
+        out[m] = statistics.median(runs) if runs else None
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Cold import times of the modules the flight scripts load')
+    ap.add_argument('--imports', nargs='+', default=list(HEAVY_MODULES), metavar='MODULE')
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--json', default='', help='also save the results as JSON')
+    args = ap.parse_args(argv)
+
+    times = import_times(args.imports, repeat=args.repeat)
+    for m, t in sorted(times.items(), key=lambda kv: -(kv[1] or 0.0)):
+        print(f'  {m:<34} ' + ('not importable' if t is None else f'{t * 1e3:8.1f} ms'))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'repeat': args.repeat,
+                       'import_ms': {m: None if t is None else t * 1e3 for m, t in times.items()}}, f, indent=1)
+        print(f'Saved: {args.json}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
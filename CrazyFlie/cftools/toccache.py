@@ -0,0 +1,385 @@
+"""
+One shared, content-addressed TOC cache for every script, stored in a compact binary form.
+
+The scripts used to pass rw_cache='./cache' to Crazyflie, so the cache
+followed the working directory: the same 774AD95C.json / 4DD2C70C.json
+(70-100 kB of pretty-printed JSON each) sat in cache/, Tests/cache/ and
+BITCRAZE_Tutos/cache/, a script started from anywhere else downloaded the
+TOC again, and every connect parsed the whole JSON and built every
+element with eval().
+
+SharedTocCache is a drop-in for cflib's TocCache (fetch / insert by CRC):
+- one user-level folder shared by all scripts (CFTOOLS_TOC_CACHE, else
+  $XDG_CACHE_HOME/cftools/toc, else ~/.cache/cftools/toc), one <CRC>.toc
+  file per TOC; a TOC is identified by its CRC only, so any firmware
+  build with the same TOC hits
+- a miss falls back to the cflib JSON caches in seed_dirs (by default the
+  repo cache/ folder) and converts the hit, so existing caches are
+  imported on first use; only a TOC found nowhere is downloaded
+- .toc files are a string table plus fixed 12-byte records; fetch() reads
+  one file and returns {group: lazy mapping}, a TocElement is only built
+  when cflib looks it up by group/name
+- every fetch and insert is timed and counted: summary(), as_dict()
+
+Usage:
+    from cftools.toccache import make_crazyflie
+    with SyncCrazyflie(uri, cf=make_crazyflie()) as scf:
+        ...
+    print(shared_cache().summary())
+
+CLI (from the CrazyFlie folder):
+    python -m cftools.toccache --list
+    python -m cftools.toccache --import cache ../old/cache    # convert cflib JSON caches
+    python -m cftools.toccache --bench                      # JSON vs binary load time
+"""
+
+import argparse
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from pathlib import Path
+
+from cflib.crazyflie.log import LogTocElement
+from cflib.crazyflie.param import ParamTocElement
+from cflib.crazyflie.toccache import TocCache
+
+ROOT = Path(__file__).resolve().parent.parent
+SEED_DIRS = (ROOT / 'cache',)
+TOC_SUFFIX = '.toc'
+
+MAGIC = b'CFTC'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sBBHIH')      # magic, version, kind, elements, crc, strings
+RECORD = struct.Struct('<HHHHHBB')      # ident, group, name, ctype, pytype (string ids), access, extended
+KINDS = {0: LogTocElement, 1: ParamTocElement}
+KIND_NAMES = {LogTocElement: 'log', ParamTocElement: 'param'}
+
+logger = logging.getLogger(__name__)
+
+
+def default_dir():
+    env = os.environ.get('CFTOOLS_TOC_CACHE')
+    if env:
+        return Path(env).expanduser()
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'cftools' / 'toc'
+
+
+# ---------- binary format ----------
+
+def encode_toc(crc, toc):
+    """Bytes of a {group: {name: TocElement}} TOC (all elements of one class)."""
+    elems = sorted((e for group in toc.values() for e in group.values()), key=lambda e: e.ident)
+    if not elems:
+        raise ValueError(f'TOC {crc:08X} is empty')
+    kind = next(k for k, cls in KINDS.items() if isinstance(elems[0], cls))
+    strings, ids = [], {}
+
+    def sid(s):
+        if s not in ids:
+            ids[s] = len(strings)
+            strings.append(s)
+        return ids[s]
+
+    records = [RECORD.pack(e.ident, sid(e.group), sid(e.name), sid(e.ctype), sid(e.pytype),
+                           e.access, int(bool(getattr(e, 'extended', False)))) for e in elems]
+    table = bytearray()
+    for s in strings:
+        b = s.encode('utf-8')
+        table += bytes([len(b)]) + b
+    return HEADER.pack(MAGIC, FORMAT_VERSION, kind, len(elems), crc, len(strings)) + bytes(table) \
+        + b''.join(records)
+
+
+def decode_index(data):
+    """(crc, element class, {group: {name: record tuple}}) of .toc bytes; no element is built."""
+    magic, version, kind, count, crc, n_strings = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION or kind not in KINDS:
+        raise ValueError('not a version %d TOC file' % FORMAT_VERSION)
+    strings, pos = [], HEADER.size
+    for _ in range(n_strings):
+        n = data[pos]
+        strings.append(data[pos + 1:pos + 1 + n].decode('utf-8'))
+        pos += 1 + n
+    end = pos + count * RECORD.size
+    if end != len(data):
+        raise ValueError(f'TOC {crc:08X}: {len(data)} bytes, expected {end}')
+    index = {}
+    for ident, g, n, ct, pt, access, ext in RECORD.iter_unpack(data[pos:end]):
+        index.setdefault(strings[g], {})[strings[n]] = (ident, strings[g], strings[n],
+                                                        strings[ct], strings[pt], access, ext)
+    return crc, KINDS[kind], index
+
+
+class _LazyGroup(Mapping):
+    """One TOC group; the TocElement of a name is built on first access."""
+
+    __slots__ = ('_cls', '_records', '_elems')
+
+    def __init__(self, cls, records):
+        self._cls = cls
+        self._records = records
+        self._elems = {}
+
+    def __getitem__(self, name):
+        e = self._elems.get(name)
+        if e is None:
+            ident, group, name, ctype, pytype, access, ext = self._records[name]
+            e = self._cls()
+            e.ident, e.group, e.name, e.ctype, e.pytype, e.access = ident, group, name, ctype, pytype, access
+            if self._cls is ParamTocElement:
+                e.extended = bool(ext)
+            self._elems[name] = e
+        return e
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+
+# ---------- cache ----------
+
+class SharedTocCache:
+    """
+    cflib TocCache replacement: fetch(crc) / insert(crc, toc) against one
+    folder of .toc files, with a JSON fallback in seed_dirs. Decoded
+    indexes are kept per process, so a fleet of vehicles on the same
+    firmware reads each file once. Thread safe (cflib calls fetch from its
+    link thread, one per vehicle).
+    """
+
+    def __init__(self, path=None, seed_dirs=SEED_DIRS):
+        self.path = Path(path) if path else default_dir()
+        self.seed_dirs = [Path(d) for d in seed_dirs]
+        self.events = []                # dicts: crc, kind, result, ms, elements, t (monotonic start)
+        self._index = {}                # crc -> (element class, index)
+        self._lock = threading.Lock()
+
+    def file(self, crc):
+        return self.path / ('%08X%s' % (crc, TOC_SUFFIX))
+
+    def _record(self, crc, cls, result, t0, n):
+        ms = (time.perf_counter() - t0) * 1e3
+        ev = {'crc': '%08X' % crc, 'kind': KIND_NAMES.get(cls, '-'), 'result': result,
+              'ms': ms, 'elements': n, 't': time.monotonic() - ms / 1e3}
+        self.events.append(ev)
+        logger.info('TOC %s (%s): %s in %.2f ms', ev['crc'], ev['kind'], result, ev['ms'])
+
+    def _load(self, crc):
+        """(element class, index) from memory, the .toc file or a seed JSON; None if unknown."""
+        if crc in self._index:
+            return self._index[crc], 'hit (memory)'
+        try:
+            _, cls, index = decode_index(self.file(crc).read_bytes())
+            self._index[crc] = (cls, index)
+            return self._index[crc], 'hit'
+        except FileNotFoundError:
+            pass
+        except (ValueError, struct.error, IndexError, UnicodeDecodeError) as e:
+            logger.warning('Ignoring unreadable TOC cache %s: %s', self.file(crc), e)
+        for d in self.seed_dirs:
+            if (d / ('%08X.json' % crc)).exists():
+                toc = TocCache(ro_cache=str(d)).fetch(crc)
+                if toc:
+                    self._write(crc, toc)
+                    _, cls, index = decode_index(encode_toc(crc, toc))
+                    self._index[crc] = (cls, index)
+                    return self._index[crc], f'imported from {d.name}/'
+        return None, 'miss'
+
+    def fetch(self, crc):
+        """{group: {name: TocElement}} for this CRC, or None (cflib then downloads the TOC)."""
+        t0 = time.perf_counter()
+        with self._lock:
+            found, result = self._load(crc)
+        if found is None:
+            self._record(crc, None, result, t0, 0)
+            return None
+        cls, index = found
+        toc = {g: _LazyGroup(cls, recs) for g, recs in index.items()}
+        self._record(crc, cls, result, t0, sum(len(r) for r in index.values()))
+        return toc
+
+    def insert(self, crc, toc):
+        """Store a downloaded TOC (called by cflib after a miss)."""
+        t0 = time.perf_counter()
+        try:
+            with self._lock:
+                self._write(crc, toc)
+                self._index.pop(crc, None)
+        except (OSError, ValueError) as e:
+            logger.warning('Could not save TOC %08X to %s: %s', crc, self.path, e)
+            return
+        elems = [e for g in toc.values() for e in g.values()]
+        self._record(crc, type(elems[0]) if elems else None, 'stored', t0, len(elems))
+
+    def _write(self, crc, toc):
+        self.path.mkdir(parents=True, exist_ok=True)
+        out = self.file(crc)
+        tmp = out.with_suffix('.tmp')
+        tmp.write_bytes(encode_toc(crc, toc))
+        os.replace(tmp, out)
+
+    def entries(self):
+        """[(crc, kind, elements, bytes)] of every .toc file in the cache folder."""
+        rows = []
+        for f in sorted(self.path.glob('*' + TOC_SUFFIX)):
+            try:
+                data = f.read_bytes()
+                crc, cls, index = decode_index(data)
+            except (ValueError, struct.error):
+                continue
+            rows.append((crc, KIND_NAMES[cls], sum(len(r) for r in index.values()), len(data)))
+        return rows
+
+    def import_json(self, dirs):
+        """Convert every cflib <CRC>.json cache in 'dirs'; returns the CRCs written."""
+        done = []
+        for d in map(Path, dirs):
+            for p in sorted(d.glob('*.json')):
+                try:
+                    crc = int(p.stem, 16)
+                except ValueError:
+                    continue
+                toc = TocCache(ro_cache=str(d)).fetch(crc)
+                if toc:
+                    with self._lock:
+                        self._write(crc, toc)
+                        self._index.pop(crc, None)
+                    done.append(crc)
+        return done
+
+    def ctypes(self, kind='log'):
+        """{'group.name': ctype} of every cached TOC of 'kind' (seed JSON, then .toc files); not a lookup."""
+        out = {}
+        for d in self.seed_dirs:
+            for p in sorted(d.glob('*.json')):
+                try:
+                    crc = int(p.stem, 16)
+                except ValueError:
+                    continue
+                for group, elems in (TocCache(ro_cache=str(d)).fetch(crc) or {}).items():
+                    for name, e in elems.items():
+                        if KIND_NAMES.get(type(e)) == kind:
+                            out[f'{group}.{name}'] = e.ctype
+        for f in sorted(self.path.glob('*' + TOC_SUFFIX)):
+            try:
+                _, cls, index = decode_index(f.read_bytes())
+            except (OSError, ValueError, struct.error):
+                continue
+            if KIND_NAMES[cls] == kind:
+                for group, records in index.items():
+                    for name, rec in records.items():
+                        out[f'{group}.{name}'] = rec[3]
+        return out
+
+    # ---------- reporting ----------
+
+    def as_dict(self):
+        counts = {}
+        for ev in self.events:
+            key = 'hits' if ev['result'].startswith('hit') else \
+                'imports' if ev['result'].startswith('imported') else \
+                'misses' if ev['result'] == 'miss' else 'stores'
+            counts[key] = counts.get(key, 0) + 1
+        return {'path': str(self.path), **counts, 'events': list(self.events)}
+
+    def summary(self):
+        lines = [f'TOC cache {self.path}:']
+        for ev in self.events:
+            lines.append(f"  {ev['crc']} {ev['kind']:<5} {ev['result']:<22} "
+                         f"{ev['ms']:7.2f} ms  {ev['elements']} elements")
+        if not self.events:
+            lines.append('  no lookups')
+        return '\n'.join(lines)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache():
+    """The process-wide SharedTocCache in the default folder."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SharedTocCache()
+        return _shared
+
+
+def make_crazyflie(cache=None, **kwargs):
+    """Crazyflie(**kwargs) whose TOCs come from 'cache' (default: shared_cache())."""
+    from cflib.crazyflie import Crazyflie
+
+    cf = Crazyflie(**kwargs)
+    cf._toc_cache = cache if cache is not None else shared_cache()
+    return cf
+
+
+# ---------- CLI ----------
+
+def _bench(cache, seed_dirs, repeat=20):
+    """Median load time of each seed JSON with cflib vs the same TOC from the .toc file."""
+    import statistics
+
+    rows = []
+    for d in map(Path, seed_dirs):
+        for p in sorted(d.glob('*.json')):
+            try:
+                crc = int(p.stem, 16)
+            except ValueError:
+                continue
+            if not cache.file(crc).exists():
+                cache.import_json([d])
+            t_json, t_bin, t_first = [], [], []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                toc = TocCache(ro_cache=str(d)).fetch(crc)
+                t_json.append(time.perf_counter() - t0)
+                fresh = SharedTocCache(cache.path, seed_dirs=())
+                t0 = time.perf_counter()
+                lazy = fresh.fetch(crc)
+                t_bin.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                g = next(iter(lazy))
+                lazy[g][next(iter(lazy[g]))]
+                t_first.append(time.perf_counter() - t0)
+            n = sum(len(v) for v in toc.values())
+            rows.append((crc, n, p.stat().st_size, cache.file(crc).stat().st_size,
+                         statistics.median(t_json) * 1e3, statistics.median(t_bin) * 1e3,
+                         statistics.median(t_first) * 1e3))
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Shared binary TOC cache')
+    ap.add_argument('--path', default=None, help=f'cache folder (default: {default_dir()})')
+    ap.add_argument('--list', action='store_true', help='list cached TOCs')
+    ap.add_argument('--import', dest='import_dirs', nargs='+', default=[], metavar='DIR',
+                    help='convert the cflib JSON caches in these folders')
+    ap.add_argument('--bench', action='store_true', help='time JSON vs binary loading of the seed caches')
+    args = ap.parse_args(argv)
+
+    cache = SharedTocCache(args.path)
+    if args.import_dirs:
+        crcs = cache.import_json(args.import_dirs)
+        print(f"imported {len(crcs)} TOCs: {', '.join('%08X' % c for c in crcs) or '-'}")
+    if args.bench:
+        print(f"{'crc':<9} {'elems':>5} {'json kB':>8} {'toc kB':>7} {'json ms':>8} {'toc ms':>7} {'1st elem us':>11}")
+        for crc, n, js, bs, tj, tb, tf in _bench(cache, SEED_DIRS):
+            print(f'{crc:08X}  {n:5d} {js / 1024:8.1f} {bs / 1024:7.1f} {tj:8.2f} {tb:7.2f} {tf * 1e3:11.1f}')
+    if args.list or not (args.import_dirs or args.bench):
+        print(f'{cache.path}:')
+        for crc, kind, n, size in cache.entries():
+            print(f'  {crc:08X}  {kind:<5} {n:4d} elements  {size:6d} bytes')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
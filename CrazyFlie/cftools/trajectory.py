@@ -0,0 +1,185 @@
+"""
+Compiled world-frame trajectory (t, x, y, z, yaw_deg, vy) for the setpoint followers.
+
+The old interp_sample() scanned the list of row dicts from the start on every
+control tick. Trajectory stores the columns as NumPy arrays, precomputes the
+per-segment slopes once, and keeps a cursor on the current segment so that a
+monotonic sampling loop costs O(1) per tick. Random access falls back to a
+bisect.
+
+Interpolation matches the old helpers:
+- x, y, z linear in time
+- yaw along the shortest path between the two knots (degrees)
+- vy either step-held at mid-segment ('step', test_seq.py) or linear ('linear')
+
+Usage:
+    traj = Trajectory.from_csv('Traj.csv')
+    s = traj.sample(t)              # dict with t, x, y, z, yaw, vy
+    S = traj.sample_many(times)     # dict of arrays, for offline use
+"""
+
+import csv
+from bisect import bisect_right
+
+import numpy as np
+
+COLUMNS = ('t', 'x', 'y', 'z', 'yaw', 'vy')
+VY_MODES = ('step', 'linear')
+
+
+def _wrap_deg(d):
+    return ((d + 180.0) % 360.0) - 180.0
+
+
+class Trajectory:
+    def __init__(self, t, x, y, z, yaw, vy=None, vy_mode='step'):
+        if vy_mode not in VY_MODES:
+            raise ValueError(f"vy_mode must be one of {VY_MODES}, got {vy_mode!r}")
+        t = np.asarray(t, dtype=float)
+        if t.ndim != 1 or t.size == 0:
+            raise ValueError("Trajectory needs at least one knot")
+        if vy is None:
+            vy = np.zeros_like(t)
+        cols = [np.asarray(c, dtype=float) for c in (x, y, z, yaw, vy)]
+        if any(c.shape != t.shape for c in cols):
+            raise ValueError("all trajectory columns must have the same length")
+
+        order = np.argsort(t, kind='stable')
+        self.t = t[order]
+        self.x, self.y, self.z, self.yaw, self.vy = (c[order] for c in cols)
+        self.vy_mode = vy_mode
+
+        # Per-segment slopes (units per second). Zero-length segments are guarded
+        # the same way interp_sample did (dt >= 1e-9).
+        dt = np.maximum(np.diff(self.t), 1e-9)
+        self._dt = dt
+        self.dx = np.diff(self.x) / dt
+        self.dy = np.diff(self.y) / dt
+        self.dz = np.diff(self.z) / dt
+        self.dyaw = _wrap_deg(np.diff(self.yaw)) / dt   # shortest-path yaw rate
+        self.dvy = np.diff(self.vy) / dt
+
+        # Plain float lists for the scalar hot path: indexing NumPy arrays one
+        # element at a time is several times slower than indexing a list.
+        self._tl = self.t.tolist()
+        self._vyl = self.vy.tolist()
+        self._seg = list(zip(self.x.tolist(), self.y.tolist(), self.z.tolist(),
+                             self.yaw.tolist(), self.vy.tolist(),
+                             self.dx.tolist(), self.dy.tolist(), self.dz.tolist(),
+                             self.dyaw.tolist(), self.dvy.tolist(), dt.tolist()))
+        self._cursor = 0
+
+    # ---------- constructors ----------
+
+    @classmethod
+    def from_points(cls, pts, vy_mode='step'):
+        """Build from the list of {'t','x','y','z','yaw','vy'} dicts used by the scripts."""
+        return cls(*([p.get(k, 0.0) for p in pts] for k in COLUMNS), vy_mode=vy_mode)
+
+    @classmethod
+    def from_csv(cls, csv_path, vy_mode='step', require_vy=False):
+        """Read a time_s,x,y,z,yaw_deg[,vy] CSV (an Excel BOM on the header is tolerated)."""
+        with open(csv_path, 'r', newline='', encoding='utf-8-sig') as f:
+            r = csv.DictReader(f)
+            need = {'time_s', 'x', 'y', 'z', 'yaw_deg'} | ({'vy'} if require_vy else set())
+            if not need.issubset(set(r.fieldnames or [])):
+                raise ValueError(f"CSV must contain columns: {sorted(need)}")
+            has_vy = 'vy' in r.fieldnames
+            cols = {k: [] for k in COLUMNS}
+            for d in r:
+                cols['t'].append(float(d['time_s']))
+                cols['x'].append(float(d['x']))
+                cols['y'].append(float(d['y']))
+                cols['z'].append(float(d['z']))
+                cols['yaw'].append(float(d['yaw_deg']))
+                cols['vy'].append(float(d['vy']) if has_vy and d['vy'] != '' else 0.0)
+        return cls(*(cols[k] for k in COLUMNS), vy_mode=vy_mode)
+
+    # ---------- knots ----------
+
+    def __len__(self):
+        return self.t.size
+
+    def __getitem__(self, i):
+        """Knot i as a row dict, so traj[-1]['z'] keeps working in the scripts."""
+        return {'t': float(self.t[i]), 'x': float(self.x[i]), 'y': float(self.y[i]),
+                'z': float(self.z[i]), 'yaw': float(self.yaw[i]), 'vy': float(self.vy[i])}
+
+    @property
+    def t_start(self):
+        return self._tl[0]
+
+    @property
+    def t_end(self):
+        return self._tl[-1]
+
+    @property
+    def duration(self):
+        return self._tl[-1] - self._tl[0]
+
+    # ---------- sampling ----------
+
+    def reset(self):
+        """Rewind the cursor (e.g. before flying the same trajectory again)."""
+        self._cursor = 0
+
+    def segment(self, t):
+        """Index i of the segment [t_i, t_i+1] holding t (clamped to the valid range)."""
+        tl = self._tl
+        last = len(tl) - 2
+        i = self._cursor
+        if tl[i] <= t:
+            # Monotonic case: walk forward a few segments, bisect if we jumped far.
+            for _ in range(4):
+                if i >= last or t < tl[i + 1]:
+                    self._cursor = i
+                    return i
+                i += 1
+        i = min(max(bisect_right(tl, t) - 1, 0), max(last, 0))
+        self._cursor = i
+        return i
+
+    def sample(self, t):
+        """Setpoint at time t (seconds since trajectory start) as a dict."""
+        tl = self._tl
+        if t <= tl[0]:
+            return self[0]
+        if t >= tl[-1]:
+            return self[-1]
+        i = self.segment(t)
+        x, y, z, yaw, vy, dx, dy, dz, dyaw, dvy, dt = self._seg[i]
+        h = t - tl[i]
+        if self.vy_mode == 'linear':
+            vy = vy + h * dvy
+        elif h >= 0.5 * dt:
+            vy = self._vyl[i + 1]
+        return {'t': t, 'x': x + h * dx, 'y': y + h * dy, 'z': z + h * dz,
+                'yaw': yaw + h * dyaw, 'vy': vy}
+
+    def sample_many(self, times):
+        """Vectorized sample over an array of times; returns a dict of arrays."""
+        times = np.asarray(times, dtype=float)
+        out = {'t': times.copy()}
+        if self.t.size == 1:
+            for k in COLUMNS[1:]:
+                out[k] = np.full(times.shape, getattr(self, k)[0])
+            return out
+
+        tc = np.clip(times, self.t[0], self.t[-1])
+        i = np.clip(np.searchsorted(self.t, tc, side='right') - 1, 0, self.t.size - 2)
+        h = tc - self.t[i]
+        out['x'] = self.x[i] + h * self.dx[i]
+        out['y'] = self.y[i] + h * self.dy[i]
+        out['z'] = self.z[i] + h * self.dz[i]
+        out['yaw'] = self.yaw[i] + h * self.dyaw[i]
+        if self.vy_mode == 'linear':
+            out['vy'] = self.vy[i] + h * self.dvy[i]
+        else:
+            out['vy'] = np.where(h >= 0.5 * self._dt[i], self.vy[i + 1], self.vy[i])
+
+        # Outside the knot range, return the end knots verbatim (as sample() does).
+        for k in COLUMNS[1:]:
+            col = getattr(self, k)
+            out[k] = np.where(times <= self.t[0], col[0],
+                              np.where(times >= self.t[-1], col[-1], out[k]))
+        return out